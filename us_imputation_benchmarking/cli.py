@@ -0,0 +1,401 @@
+"""
+Command-line benchmark runner.
+
+A run is described by a JSON spec, for example:
+
+    {
+        "years": [2016, 2019],
+        "models": {"QRF": {"n_estimators": 100}, "OLS": {}},
+        "quantiles": [0.1, 0.5, 0.9],
+        "n_splits": 5,
+        "sample_frac": 0.1
+    }
+
+and run with `us-imputation-benchmark spec.json`. The stages run as a
+Pipeline, so a second run only re-runs the stages whose spec changed.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from typing import List, Dict, Any, Optional, Tuple, Type
+from us_imputation_benchmarking.comparisons.data import preprocess_data
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.comparisons.quantile_loss import (
+    mean_quantile_loss,
+)
+from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
+from us_imputation_benchmarking.evaluations.cross_validation import (
+    cross_validate_model,
+)
+from us_imputation_benchmarking.pipeline import Pipeline
+
+# Modules of the models a spec can name. Matching needs R, so models are
+# only imported when a spec uses them
+MODEL_MODULES: Dict[str, str] = {
+    "QRF": "us_imputation_benchmarking.models.qrf",
+    "OLS": "us_imputation_benchmarking.models.ols",
+    "QuantReg": "us_imputation_benchmarking.models.quantreg",
+    "Matching": "us_imputation_benchmarking.models.matching",
+}
+
+SPEC_DEFAULTS: Dict[str, Any] = {
+    "years": [2019],
+    "data": None,
+    "models": {"QRF": {}, "OLS": {}, "QuantReg": {}},
+    "quantiles": QUANTILES,
+    "n_splits": 5,
+    "test_size": 0.2,
+    "sample_frac": 1.0,
+    "random_state": RANDOM_STATE,
+    "output_dir": "benchmark_results",
+    "report": True,
+}
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    """Read a run spec and fill in the defaults.
+
+    Besides SCF years, a spec can give its own preprocessed dataset as
+    "data": {"path": "data.csv", "predictors": [...],
+    "imputed_variables": [...]}, which is then used instead of the years.
+
+    Args:
+        path: Path of the JSON spec.
+
+    Returns:
+        Dictionary with every key of SPEC_DEFAULTS.
+
+    Raises:
+        ValueError: If the spec has unknown keys or models.
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    unknown = set(spec) - set(SPEC_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown spec keys: {sorted(unknown)}")
+    spec = {**SPEC_DEFAULTS, **spec}
+    unknown_models = set(spec["models"]) - set(MODEL_MODULES)
+    if unknown_models:
+        raise ValueError(
+            f"Unknown models: {sorted(unknown_models)}. "
+            f"Choose from {list(MODEL_MODULES)}"
+        )
+    return spec
+
+
+def _model_class(name: str) -> Type:
+    """Import a model class by name."""
+    return getattr(importlib.import_module(MODEL_MODULES[name]), name)
+
+
+def _load_stage(
+    params: Dict[str, Any],
+) -> Tuple[pd.DataFrame, List[str], List[str]]:
+    """Load the full dataset of one year, or the spec's own dataset."""
+    if params["data"] is not None:
+        data = pd.read_csv(params["data"]["path"])
+        predictors = params["data"]["predictors"]
+        imputed_variables = params["data"]["imputed_variables"]
+    else:
+        data, predictors, imputed_variables = preprocess_data(
+            full_data=True, years=params["year"]
+        )
+    if params["sample_frac"] < 1:
+        data = data.sample(
+            frac=params["sample_frac"], random_state=params["random_state"]
+        )
+    return data, predictors, imputed_variables
+
+
+def _split_stage(
+    params: Dict[str, Any],
+    loaded: Tuple[pd.DataFrame, List[str], List[str]],
+) -> Tuple[pd.DataFrame, pd.DataFrame, List[str], List[str]]:
+    """Split a dataset into train and test parts."""
+    data, predictors, imputed_variables = loaded
+    X, test_X = train_test_split(
+        data,
+        test_size=params["test_size"],
+        random_state=params["random_state"],
+    )
+    return X, test_X, predictors, imputed_variables
+
+
+def _impute_stage(
+    params: Dict[str, Any],
+    split: Tuple[pd.DataFrame, pd.DataFrame, List[str], List[str]],
+) -> Dict[float, Any]:
+    """Fit one model on the train part and impute the test part."""
+    X, test_X, predictors, imputed_variables = split
+    model = fit_model(
+        _model_class(params["model"]),
+        X,
+        predictors,
+        imputed_variables,
+        params["quantiles"],
+        **params["model_params"],
+    )
+    return model.predict(test_X, params["quantiles"])
+
+
+def _loss_stage(
+    params: Dict[str, Any],
+    split: Tuple[pd.DataFrame, pd.DataFrame, List[str], List[str]],
+    *model_imputations: Dict[float, Any],
+) -> pd.DataFrame:
+    """Compare the test quantile loss of every model's imputations."""
+    _, test_X, _, imputed_variables = split
+    test_y = test_X[imputed_variables]
+    records = []
+    for model_name, imputations in zip(params["models"], model_imputations):
+        for q in params["quantiles"]:
+            records.append(
+                {
+                    "Method": model_name,
+                    "Percentile": str(int(q * 100)) + "th percentile",
+                    "Loss": mean_quantile_loss(q, test_y, imputations[q]),
+                }
+            )
+    return pd.DataFrame(records)
+
+
+def _cv_stage(
+    params: Dict[str, Any],
+    loaded: Tuple[pd.DataFrame, List[str], List[str]],
+) -> pd.DataFrame:
+    """Cross-validate one model."""
+    data, predictors, imputed_variables = loaded
+    return cross_validate_model(
+        _model_class(params["model"]),
+        data,
+        predictors,
+        imputed_variables,
+        params["quantiles"],
+        n_splits=params["n_splits"],
+        random_state=params["random_state"],
+        fit_kwargs=params["model_params"],
+    )
+
+
+def build_pipeline(
+    spec: Dict[str, Any], cache_dir: Optional[str] = None
+) -> Tuple[Pipeline, List[str], List[str]]:
+    """Build the pipeline of a run spec.
+
+    For every year (or the spec's dataset) the graph is: load, then split
+    and one cross-validation node per model; one imputation node per model
+    after the split; and a loss node comparing the imputations. Each model
+    node only depends on its own parameters, so changing them re-runs that
+    model's nodes and the loss node only.
+
+    Args:
+        spec: Run spec, as returned by load_spec.
+        cache_dir: Directory of the result cache.
+
+    Returns:
+        A tuple containing:
+          - The pipeline
+          - Names of the loss nodes
+          - Names of the cross-validation nodes
+    """
+    pipeline = Pipeline(cache_dir)
+    models = spec["models"]
+    shared = {
+        "quantiles": spec["quantiles"],
+        "random_state": spec["random_state"],
+    }
+    data = spec["data"]
+    if data is not None:
+        # The file's modification time invalidates the cache on changes
+        data = {**data, "mtime": os.path.getmtime(data["path"])}
+        labels = [("data", None)]
+    else:
+        labels = [(str(year), year) for year in spec["years"]]
+
+    loss_nodes = []
+    cv_nodes = []
+    for label, year in labels:
+        pipeline.add(
+            f"load/{label}",
+            _load_stage,
+            {
+                "year": year,
+                "data": data,
+                "sample_frac": spec["sample_frac"],
+                "random_state": spec["random_state"],
+            },
+        )
+        pipeline.add(
+            f"split/{label}",
+            _split_stage,
+            {
+                "test_size": spec["test_size"],
+                "random_state": spec["random_state"],
+            },
+            inputs=[f"load/{label}"],
+        )
+        for model_name, model_params in models.items():
+            model_spec = {
+                "model": model_name,
+                "model_params": model_params,
+                **shared,
+            }
+            pipeline.add(
+                f"impute/{label}/{model_name}",
+                _impute_stage,
+                model_spec,
+                inputs=[f"split/{label}"],
+            )
+            if spec["n_splits"]:
+                pipeline.add(
+                    f"cv/{label}/{model_name}",
+                    _cv_stage,
+                    {**model_spec, "n_splits": spec["n_splits"]},
+                    inputs=[f"load/{label}"],
+                )
+                cv_nodes.append(f"cv/{label}/{model_name}")
+        pipeline.add(
+            f"loss/{label}",
+            _loss_stage,
+            {"models": list(models), **shared},
+            inputs=[f"split/{label}"]
+            + [f"impute/{label}/{model_name}" for model_name in models],
+        )
+        loss_nodes.append(f"loss/{label}")
+
+    return pipeline, loss_nodes, cv_nodes
+
+
+def write_results(
+    spec: Dict[str, Any],
+    results: Dict[str, Any],
+    loss_nodes: List[str],
+    cv_nodes: List[str],
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Write the losses, cross-validation results and report of a run.
+
+    Args:
+        spec: Run spec.
+        results: Results of the pipeline nodes.
+        loss_nodes: Names of the loss nodes.
+        cv_nodes: Names of the cross-validation nodes.
+
+    Returns:
+        A tuple of the test losses and cross-validation losses, with the
+        dataset label and model in columns.
+    """
+    output_dir = spec["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    losses = pd.concat(
+        [
+            results[node].assign(dataset=node.split("/")[1])
+            for node in loss_nodes
+        ],
+        ignore_index=True,
+    )
+    losses.to_csv(os.path.join(output_dir, "losses.csv"), index=False)
+
+    cv_results = pd.DataFrame()
+    if cv_nodes:
+        cv_results = pd.concat(
+            [
+                results[node]
+                .rename_axis("split")
+                .reset_index()
+                .assign(dataset=node.split("/")[1], model=node.split("/")[2])
+                for node in cv_nodes
+            ],
+            ignore_index=True,
+        )
+        cv_results.to_csv(
+            os.path.join(output_dir, "cross_validation.csv"), index=False
+        )
+
+    if spec["report"]:
+        from us_imputation_benchmarking.comparisons.plot import (
+            plot_loss_comparison,
+        )
+        from us_imputation_benchmarking.comparisons.report import (
+            FigureReport,
+        )
+        from us_imputation_benchmarking.evaluations.train_test_performance import (
+            plot_train_test_performance,
+        )
+
+        report = FigureReport()
+        for node in loss_nodes:
+            fig = plot_loss_comparison(results[node], spec["quantiles"])
+            fig.update_layout(title=f"Test loss ({node.split('/')[1]})")
+            report.add(fig)
+        for node in cv_nodes:
+            _, label, model_name = node.split("/")
+            plot_train_test_performance(
+                results[node].copy(),
+                title=f"{model_name} train vs test loss ({label})",
+                report=report,
+            )
+        report.export(os.path.join(output_dir, "report.html"), images=False)
+
+    return losses, cv_results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark described by a spec file.
+
+    Args:
+        argv: Command-line arguments. Defaults to sys.argv.
+
+    Returns:
+        Exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="us-imputation-benchmark",
+        description="Run an imputation benchmark from a JSON spec.",
+    )
+    parser.add_argument("spec", help="path of the JSON run spec")
+    parser.add_argument(
+        "--cache-dir",
+        default=".benchmark_cache",
+        help="directory of the stage result cache",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="do not read or write cache"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="re-run cached stages"
+    )
+    parser.add_argument(
+        "--n-jobs", type=int, default=None, help="parallel stages"
+    )
+    parser.add_argument(
+        "--output-dir", default=None, help="overrides the spec's output_dir"
+    )
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    if args.output_dir is not None:
+        spec["output_dir"] = args.output_dir
+
+    pipeline, loss_nodes, cv_nodes = build_pipeline(
+        spec, None if args.no_cache else args.cache_dir
+    )
+    results = pipeline.run(
+        loss_nodes + cv_nodes, n_jobs=args.n_jobs, force=args.force
+    )
+    losses, _ = write_results(spec, results, loss_nodes, cv_nodes)
+
+    print("\nBenchmark Summary:")
+    summary = losses.groupby(["dataset", "Method"])["Loss"].mean()
+    print(summary.unstack().to_string(float_format=lambda x: f"{x:.6f}"))
+    pipeline.summary()
+    print(f"Results saved to {spec['output_dir']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+import itertools
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Tuple, Union
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
+
+
+def _percentile_label(q: float) -> str:
+    """Label of a quantile, as used by compare_quantile_loss."""
+    return str(int(q * 100)) + "th percentile"
+
+
+def bootstrap_replicates(
+    losses: np.ndarray,
+    n_replicates: int = 1000,
+    weights: Optional[np.ndarray] = None,
+    chunk_size: int = 100,
+    random_state: int = RANDOM_STATE,
+) -> np.ndarray:
+    """Compute bootstrap replicates of the mean of several loss columns.
+
+    Each replicate resamples rows with replacement. Resampled indices are
+    turned into a matrix of row counts, so the means of every column for a
+    chunk of replicates take a single matrix product.
+
+    Args:
+        losses: Array of shape (n_rows, n_columns) of per-row losses.
+        n_replicates: Number of bootstrap replicates.
+        weights: Weight of each row. If None, rows are weighted equally.
+        chunk_size: Number of replicates resampled at once, which bounds
+            memory to chunk_size x n_rows counts.
+        random_state: Random seed for reproducibility.
+
+    Returns:
+        Array of shape (n_replicates, n_columns) of replicate means.
+    """
+    n_rows = len(losses)
+    rng = np.random.default_rng(random_state)
+    if weights is None:
+        weights = np.ones(n_rows)
+    weighted_losses = losses * weights[:, np.newaxis]
+
+    replicates = np.empty((n_replicates, losses.shape[1]))
+    for start in range(0, n_replicates, chunk_size):
+        n_chunk = min(chunk_size, n_replicates - start)
+        indices = rng.integers(0, n_rows, size=(n_chunk, n_rows))
+        offsets = np.arange(n_chunk)[:, np.newaxis] * n_rows
+        counts = np.bincount(
+            (indices + offsets).ravel(), minlength=n_chunk * n_rows
+        ).reshape(n_chunk, n_rows)
+        replicates[start : start + n_chunk] = (counts @ weighted_losses) / (
+            counts @ weights
+        )[:, np.newaxis]
+    return replicates
+
+
+def bootstrap_loss_comparison(
+    test_y: pd.DataFrame,
+    method_imputations: Dict[
+        str, Dict[float, Union[np.ndarray, pd.DataFrame]]
+    ],
+    quantiles: Optional[List[float]] = QUANTILES,
+    n_replicates: int = 1000,
+    confidence_level: float = 0.95,
+    weights: Optional[np.ndarray] = None,
+    chunk_size: int = 100,
+    random_state: int = RANDOM_STATE,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Bootstrap confidence intervals for the quantile loss of each method.
+
+    The test rows are resampled once per replicate and the same resamples
+    are used for every method and quantile, so the paired differences
+    between methods account for their correlation.
+
+    Args:
+        test_y: DataFrame containing true values.
+        method_imputations: Nested dictionary mapping method names to
+            dictionaries mapping quantiles to imputation values.
+        quantiles: List of quantiles to evaluate.
+        n_replicates: Number of bootstrap replicates.
+        confidence_level: Level of the percentile intervals.
+        weights: Weight of each test row, such as survey weights.
+        chunk_size: Number of replicates resampled at once.
+        random_state: Random seed for reproducibility.
+
+    Returns:
+        A tuple containing:
+          - DataFrame with columns 'Method', 'Percentile', 'Loss', 'Lower'
+            and 'Upper', which plot_loss_comparison draws as error bars
+          - DataFrame of paired differences with columns 'Method',
+            'Baseline', 'Percentile', 'Difference', 'Lower', 'Upper' and
+            'P(Method better)'
+    """
+    y = test_y.to_numpy()
+    methods = list(method_imputations)
+    columns = list(itertools.product(methods, quantiles))
+
+    # Per-row loss of every (method, quantile), averaged over variables
+    losses = np.empty((len(y), len(columns)))
+    for k, (method, q) in enumerate(columns):
+        pred = np.asarray(method_imputations[method][q]).reshape(y.shape)
+        losses[:, k] = quantile_loss(q, y, pred).reshape(len(y), -1).mean(1)
+
+    if weights is None:
+        point = losses.mean(axis=0)
+    else:
+        point = np.average(losses, axis=0, weights=weights)
+    replicates = bootstrap_replicates(
+        losses, n_replicates, weights, chunk_size, random_state
+    )
+    alpha = (1 - confidence_level) / 2
+
+    lower, upper = np.quantile(replicates, [alpha, 1 - alpha], axis=0)
+    intervals = pd.DataFrame(
+        {
+            "Method": [method for method, _ in columns],
+            "Percentile": [_percentile_label(q) for _, q in columns],
+            "Loss": point,
+            "Lower": lower,
+            "Upper": upper,
+        }
+    )
+
+    records = []
+    n_quantiles = len(quantiles)
+    for (i, method), (j, baseline) in itertools.combinations(
+        enumerate(methods), 2
+    ):
+        for k, q in enumerate(quantiles):
+            a = i * n_quantiles + k
+            b = j * n_quantiles + k
+            differences = replicates[:, a] - replicates[:, b]
+            diff_lower, diff_upper = np.quantile(
+                differences, [alpha, 1 - alpha]
+            )
+            records.append(
+                (
+                    method,
+                    baseline,
+                    _percentile_label(q),
+                    point[a] - point[b],
+                    diff_lower,
+                    diff_upper,
+                    float((differences < 0).mean()),
+                )
+            )
+    differences = pd.DataFrame(
+        records,
+        columns=[
+            "Method",
+            "Baseline",
+            "Percentile",
+            "Difference",
+            "Lower",
+            "Upper",
+            "P(Method better)",
+        ],
+    )
+
+    return intervals, differences
@@ -1,4 +1,5 @@
 from sklearn.model_selection import train_test_split
+import numpy as np
 import pandas as pd
 import io
 import requests
@@ -6,7 +7,18 @@ import zipfile
 from tqdm import tqdm
 from typing import List, Union, Optional, Tuple, Set, Dict, Any
 
-from us_imputation_benchmarking.config import VALID_YEARS, RANDOM_STATE
+from us_imputation_benchmarking.comparisons.implicates import (
+    HOUSEHOLD_COLUMN,
+    household_ids,
+    household_split,
+)
+from us_imputation_benchmarking.config import (
+    MEMORY_CONFIG,
+    RANDOM_STATE,
+    VALID_YEARS,
+)
+
+WEIGHT_COLUMN = "wgt"
 
 
 def scf_url(year: int) -> str:
@@ -88,7 +100,12 @@ def _load(
 
 
 def preprocess_data(
-    full_data: bool = False, years: Optional[Union[int, List[int]]] = None
+    full_data: bool = False,
+    years: Optional[Union[int, List[int]]] = None,
+    include_year: bool = False,
+    include_household: bool = False,
+    include_weights: bool = False,
+    low_memory: Optional[bool] = None,
 ) -> Union[
     Tuple[pd.DataFrame, List[str], List[str]],  # when full_data=True
     Tuple[
@@ -100,6 +117,15 @@ def preprocess_data(
     Args:
         full_data: Whether to return the complete dataset without splitting.
         years: Year or list of years to load data for.
+        include_year: Whether to keep the (unstandardized) year column, to
+            tell the waves of a pooled dataset apart.
+        include_household: Whether to add a household id column, shared by
+            the implicates of a household. The train/test split then keeps
+            households together.
+        include_weights: Whether to keep the (unstandardized) survey weight
+            column 'wgt', to pass as weight_column to models and losses.
+        low_memory: Whether to keep the standardized columns as one
+            contiguous float32 block. Defaults to MEMORY_CONFIG["low_memory"].
 
     Returns:
         Different tuple formats depending on the value of full_data:
@@ -129,15 +155,108 @@ def preprocess_data(
         "networth"
     ]  # some property also captured in cps data (HPROP_VAL)
 
+    year = data["year"].to_numpy()
+    households = household_ids(data)
+    weights = data[WEIGHT_COLUMN].to_numpy()
     data = data[PREDICTORS + IMPUTED_VARIABLES]
     mean = data.mean(axis=0)
     std = data.std(axis=0)
     data = (data - mean) / std
 
+    if low_memory is None:
+        low_memory = MEMORY_CONFIG["low_memory"]
+    if low_memory:
+        data = pd.DataFrame(
+            np.ascontiguousarray(data.to_numpy(dtype=np.float32)),
+            index=data.index,
+            columns=data.columns,
+            copy=False,
+        )
+
+    if include_year:
+        data["year"] = year
+    if include_household:
+        data[HOUSEHOLD_COLUMN] = households
+    if include_weights:
+        data[WEIGHT_COLUMN] = weights
+
     if full_data:
         return data, PREDICTORS, IMPUTED_VARIABLES
+    elif include_household:
+        X, test_X = household_split(data, test_size=0.2)
+        return X, test_X, PREDICTORS, IMPUTED_VARIABLES
     else:
         X, test_X = train_test_split(
             data, test_size=0.2, train_size=0.8, random_state=RANDOM_STATE
         )
         return X, test_X, PREDICTORS, IMPUTED_VARIABLES
+
+
+def weighted_downsample(
+    data: pd.DataFrame,
+    frac: float = 0.05,
+    weight_column: str = WEIGHT_COLUMN,
+    random_state: int = RANDOM_STATE,
+) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Draw a small population-representative sample proportional to weight.
+
+    Rows are drawn by systematic sampling with probability proportional to
+    their weight, in a random order, so every draw stands for the same share
+    of the population. Rows drawn more than once are kept once with their
+    count. The returned weights are therefore equal per draw and sum to the
+    total weight of the data, and unweighted statistics of the draws are
+    unbiased for the population.
+
+    The variance penalty compares the sample to the full weighted data: the
+    effective size of the full data is its row count divided by Kish's
+    design effect of the weights, and the penalty is how many times larger
+    the variance of a mean is with the sample.
+
+    Args:
+        data: Dataset with a weight column.
+        frac: Number of draws as a share of the rows of data.
+        weight_column: Name of the weight column.
+        random_state: Random seed for reproducibility.
+
+    Returns:
+        A tuple containing:
+          - DataFrame of the sampled rows with their new weights
+          - Dictionary with the number of draws, the design effect and
+            effective size of the full data, and the variance penalty
+    """
+    weights = data[weight_column].to_numpy(dtype=float)
+    n_draws = max(int(round(frac * len(data))), 1)
+    total = weights.sum()
+
+    rng = np.random.default_rng(random_state)
+    order = rng.permutation(len(data))
+    cumulative = np.cumsum(weights[order])
+    step = total / n_draws
+    points = rng.uniform(0, step) + step * np.arange(n_draws)
+    drawn = order[
+        np.minimum(
+            np.searchsorted(cumulative, points, side="right"), len(data) - 1
+        )
+    ]
+
+    positions, counts = np.unique(drawn, return_counts=True)
+    sample = data.iloc[positions].copy()
+    sample[weight_column] = counts * step
+
+    design_effect = len(data) * (weights**2).sum() / total**2
+    effective_size = len(data) / design_effect
+    summary = {
+        "n_draws": n_draws,
+        "n_rows": len(sample),
+        "design_effect": design_effect,
+        "effective_size": effective_size,
+        "variance_penalty": effective_size / n_draws,
+    }
+
+    print("\nWeighted Downsampling Summary:")
+    print(f"Draws: {n_draws} ({len(sample)} distinct rows)")
+    print(f"Design effect of weights: {design_effect:.3f}")
+    print(f"Effective size of full data: {effective_size:.0f}")
+    print(f"Variance penalty: {summary['variance_penalty']:.2f}x")
+
+    return sample, summary
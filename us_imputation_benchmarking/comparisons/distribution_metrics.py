@@ -0,0 +1,267 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Iterable, Optional, Tuple, Union
+from us_imputation_benchmarking.config import QUANTILES
+
+DECILES: List[float] = [i / 10 for i in range(1, 10)]
+
+
+class WeightedDistribution:
+    """Weighted sample kept sorted, to compute distribution metrics.
+
+    Values are sorted once, and every metric (quantiles, Gini, top share,
+    Wasserstein distance) reads the sorted values and cumulative weights.
+    Distributions built from chunks of a large sample can be merged without
+    sorting again.
+    """
+
+    def __init__(
+        self,
+        values: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        is_sorted: bool = False,
+    ):
+        """Sort a weighted sample.
+
+        Args:
+            values: Sample values.
+            weights: Weight of each value. If None, values are weighted
+                equally.
+            is_sorted: Whether values are already sorted in ascending order.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        if weights is None:
+            weights = np.ones(len(values))
+        weights = np.asarray(weights, dtype=float).ravel()
+        if not is_sorted:
+            order = np.argsort(values, kind="stable")
+            values = values[order]
+            weights = weights[order]
+        self.values = values
+        self.weights = weights
+        self.cumulative_weights = np.cumsum(weights)
+
+    @classmethod
+    def from_chunks(
+        cls, chunks: Iterable[Tuple[np.ndarray, Optional[np.ndarray]]]
+    ) -> "WeightedDistribution":
+        """Build a distribution by sorting chunks and merging them.
+
+        Chunks are merged pairwise, in rounds, so each value takes part in
+        about log2(k) merges for k chunks instead of up to k.
+
+        Args:
+            chunks: Iterable of (values, weights) pairs.
+
+        Returns:
+            The merged distribution.
+        """
+        distributions = [cls(values, weights) for values, weights in chunks]
+        while len(distributions) > 1:
+            merged = [
+                first.merge(second)
+                for first, second in zip(
+                    distributions[::2], distributions[1::2]
+                )
+            ]
+            if len(distributions) % 2:
+                merged.append(distributions[-1])
+            distributions = merged
+        return distributions[0] if distributions else None
+
+    def merge(self, other: "WeightedDistribution") -> "WeightedDistribution":
+        """Merge two sorted distributions.
+
+        The two sorted samples are concatenated and sorted with numpy's
+        stable sort, which finds the two sorted runs and merges them in
+        linear time. Values of self come before equal values of other.
+
+        Args:
+            other: Distribution to merge with.
+
+        Returns:
+            New distribution holding both samples.
+        """
+        values = np.concatenate([self.values, other.values])
+        order = np.argsort(values, kind="stable")
+        weights = np.concatenate([self.weights, other.weights])[order]
+        return WeightedDistribution(values[order], weights, is_sorted=True)
+
+    @property
+    def total_weight(self) -> float:
+        """Sum of the weights."""
+        return float(self.cumulative_weights[-1])
+
+    def quantiles(self, probabilities: List[float] = DECILES) -> np.ndarray:
+        """Weighted quantiles.
+
+        Args:
+            probabilities: Probabilities of the quantiles. Defaults to the
+                deciles.
+
+        Returns:
+            Array of the smallest values whose cumulative weight share
+            reaches each probability.
+        """
+        positions = np.searchsorted(
+            self.cumulative_weights,
+            np.asarray(probabilities) * self.total_weight,
+            side="left",
+        )
+        return self.values[np.minimum(positions, len(self.values) - 1)]
+
+    def gini(self) -> float:
+        """Weighted Gini coefficient.
+
+        Returns:
+            Gini coefficient. It can exceed 1 when values are negative, as
+            with net worth.
+        """
+        amounts = np.cumsum(self.weights * self.values)
+        previous = np.concatenate([[0.0], amounts[:-1]])
+        area = (self.weights * (previous + amounts)).sum()
+        return float(1 - area / (self.total_weight * amounts[-1]))
+
+    def top_share(self, share: float = 0.1) -> float:
+        """Share of the total held by the top share of the weight.
+
+        Args:
+            share: Top share of the population, e.g. 0.1 for the top 10%.
+
+        Returns:
+            Share of the weighted total held by the top group.
+        """
+        threshold = (1 - share) * self.total_weight
+        top_weights = np.clip(
+            self.cumulative_weights - threshold, 0, self.weights
+        )
+        total = (self.weights * self.values).sum()
+        return float((top_weights * self.values).sum() / total)
+
+    def wasserstein(self, other: "WeightedDistribution") -> float:
+        """Wasserstein-1 distance to another distribution.
+
+        Args:
+            other: Distribution to compare to.
+
+        Returns:
+            Integral over probabilities of the absolute difference between
+            the two quantile functions.
+        """
+        shares = self.cumulative_weights / self.total_weight
+        other_shares = other.cumulative_weights / other.total_weight
+        grid = np.union1d(shares, other_shares)
+        steps = np.diff(np.concatenate([[0.0], grid]))
+        # Both quantile functions are constant between grid points
+        quantiles = self.values[
+            np.minimum(
+                np.searchsorted(shares, grid, side="left"),
+                len(self.values) - 1,
+            )
+        ]
+        other_quantiles = other.values[
+            np.minimum(
+                np.searchsorted(other_shares, grid, side="left"),
+                len(other.values) - 1,
+            )
+        ]
+        return float((steps * np.abs(quantiles - other_quantiles)).sum())
+
+
+def _distribution(
+    values: np.ndarray,
+    weights: Optional[np.ndarray],
+    chunk_size: Optional[int],
+) -> WeightedDistribution:
+    """Build a distribution, sorting it in chunks if chunk_size is given."""
+    if chunk_size is None:
+        return WeightedDistribution(values, weights)
+    return WeightedDistribution.from_chunks(
+        (
+            values[start : start + chunk_size],
+            None if weights is None else weights[start : start + chunk_size],
+        )
+        for start in range(0, len(values), chunk_size)
+    )
+
+
+def compare_distributions(
+    donor_y: pd.DataFrame,
+    method_imputations: Dict[
+        str, Dict[float, Union[np.ndarray, pd.DataFrame]]
+    ],
+    quantiles: Optional[List[float]] = QUANTILES,
+    variable: Optional[str] = None,
+    donor_weights: Optional[np.ndarray] = None,
+    weights: Optional[np.ndarray] = None,
+    top: float = 0.1,
+    chunk_size: Optional[int] = None,
+) -> pd.DataFrame:
+    """Compare the distribution of each method's imputations to the donors'.
+
+    For every method and quantile, the imputed values are sorted once and
+    compared to the donor distribution on weighted deciles, Gini, top share
+    and Wasserstein distance.
+
+    Args:
+        donor_y: DataFrame containing the donor (true) values.
+        method_imputations: Nested dictionary mapping method names to
+            dictionaries mapping quantiles to imputation values, as returned
+            by get_imputations.
+        quantiles: List of quantiles to evaluate.
+        variable: Imputed variable to compare. Required if donor_y has more
+            than one column.
+        donor_weights: Weight of each donor row, such as survey weights.
+        weights: Weight of each recipient row.
+        top: Top share of the population for the top share metric.
+        chunk_size: Number of recipients sorted at a time before merging,
+            for large recipient sets.
+
+    Returns:
+        DataFrame with columns 'Method' and 'Percentile' as returned by
+        compare_quantile_loss, and one column per metric: 'Wasserstein',
+        'Decile error' (mean absolute difference of deciles), 'Gini',
+        'Gini error', 'Top share' and 'Top share error'. The metrics can be
+        plotted with plot_loss_comparison(df, metric=...).
+
+    Raises:
+        ValueError: If variable is needed but not given.
+    """
+    if variable is None:
+        if donor_y.shape[1] != 1:
+            raise ValueError(
+                "variable is required when comparing several variables"
+            )
+        variable = donor_y.columns[0]
+    column = list(donor_y.columns).index(variable)
+
+    donor = WeightedDistribution(donor_y[variable].to_numpy(), donor_weights)
+    donor_deciles = donor.quantiles()
+    donor_gini = donor.gini()
+    donor_top_share = donor.top_share(top)
+
+    records = []
+    for method, imputations in method_imputations.items():
+        for q in quantiles:
+            values = np.asarray(imputations[q]).reshape(-1, donor_y.shape[1])[
+                :, column
+            ]
+            imputed = _distribution(values, weights, chunk_size)
+            gini = imputed.gini()
+            top_share = imputed.top_share(top)
+            records.append(
+                {
+                    "Method": method,
+                    "Percentile": str(int(q * 100)) + "th percentile",
+                    "Wasserstein": imputed.wasserstein(donor),
+                    "Decile error": float(
+                        np.abs(imputed.quantiles() - donor_deciles).mean()
+                    ),
+                    "Gini": gini,
+                    "Gini error": gini - donor_gini,
+                    "Top share": top_share,
+                    "Top share error": top_share - donor_top_share,
+                }
+            )
+
+    return pd.DataFrame(records)
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import GroupShuffleSplit, KFold
+from typing import List, Optional, Tuple
+from us_imputation_benchmarking.config import RANDOM_STATE
+
+HOUSEHOLD_COLUMN = "household_id"
+
+
+def household_ids(
+    data: pd.DataFrame,
+    id_column: str = "yy1",
+    year_column: Optional[str] = "year",
+) -> np.ndarray:
+    """Number the households of raw SCF data.
+
+    The SCF summary extract has one row per implicate, and the rows of a
+    household share its case id. Case ids are only unique within a wave, so
+    the year is part of the key when present.
+
+    Args:
+        data: Raw SCF data, as returned by _load.
+        id_column: Name of the household case id column.
+        year_column: Name of the wave column, or None for a single wave.
+
+    Returns:
+        Integer household id of each row.
+    """
+    keys = [id_column]
+    if year_column is not None and year_column in data.columns:
+        keys = [year_column, id_column]
+    return data.groupby(keys, sort=False).ngroup().to_numpy()
+
+
+def household_split(
+    data: pd.DataFrame,
+    test_size: float = 0.2,
+    random_state: int = RANDOM_STATE,
+    household_column: str = HOUSEHOLD_COLUMN,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split data into train and test sets without splitting households.
+
+    Args:
+        data: Dataset with a household id column.
+        test_size: Share of households held out for testing.
+        random_state: Random seed for reproducibility.
+        household_column: Name of the household id column.
+
+    Returns:
+        A tuple of the train and test DataFrames.
+    """
+    splitter = GroupShuffleSplit(
+        n_splits=1, test_size=test_size, random_state=random_state
+    )
+    train_idx, test_idx = next(
+        splitter.split(data, groups=data[household_column])
+    )
+    return data.iloc[train_idx], data.iloc[test_idx]
+
+
+def household_folds(
+    data: pd.DataFrame,
+    n_splits: int = 5,
+    random_state: int = RANDOM_STATE,
+    household_column: str = HOUSEHOLD_COLUMN,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Build shuffled k-fold splits that keep households together.
+
+    Args:
+        data: Dataset with a household id column.
+        n_splits: Number of folds.
+        random_state: Random seed for reproducibility.
+        household_column: Name of the household id column.
+
+    Returns:
+        List of (train row positions, test row positions) per fold, like
+        KFold.split.
+    """
+    households = data[household_column].to_numpy()
+    unique_households = np.unique(households)
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+
+    folds = []
+    for _, test_households in kf.split(unique_households):
+        test_mask = np.isin(households, unique_households[test_households])
+        folds.append((np.flatnonzero(~test_mask), np.flatnonzero(test_mask)))
+    return folds
+
+
+class ImplicateData:
+    """SCF data stored once per household, with an axis for implicates.
+
+    Columns that take the same value in every implicate of a household are
+    stored in one row per household. Columns that differ between implicates
+    are stored in an array of shape (n_households, n_implicates,
+    n_varying_columns).
+    """
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        columns: List[str],
+        household_column: str = HOUSEHOLD_COLUMN,
+    ):
+        """Build the compact representation from one row per implicate.
+
+        Args:
+            data: Dataset with one row per implicate and a household id
+                column.
+            columns: Columns to keep.
+            household_column: Name of the household id column.
+
+        Raises:
+            ValueError: If households do not all have the same number of
+                implicates.
+        """
+        data = data.sort_values(household_column, kind="stable")
+        sizes = data.groupby(household_column, sort=False).size()
+        if sizes.nunique() != 1:
+            raise ValueError(
+                "All households must have the same number of implicates"
+            )
+
+        n_distinct = data.groupby(household_column, sort=False)[
+            columns
+        ].nunique(dropna=False)
+        constant = (n_distinct <= 1).all()
+
+        self.columns = list(columns)
+        self.household_column = household_column
+        self.constant_columns = [c for c in columns if constant[c]]
+        self.varying_columns = [c for c in columns if not constant[c]]
+        self.n_implicates = int(sizes.iloc[0])
+
+        first_rows = data.iloc[:: self.n_implicates]
+        self.households = first_rows.set_index(household_column)[
+            self.constant_columns
+        ]
+        self.implicates = (
+            data[self.varying_columns]
+            .to_numpy()
+            .reshape(len(self.households), self.n_implicates, -1)
+        )
+
+    @property
+    def n_households(self) -> int:
+        """Number of households."""
+        return len(self.households)
+
+    def _subset(self, positions: np.ndarray) -> "ImplicateData":
+        """Return the households at the given positions."""
+        subset = object.__new__(ImplicateData)
+        subset.__dict__.update(self.__dict__)
+        subset.households = self.households.iloc[positions]
+        subset.implicates = self.implicates[positions]
+        return subset
+
+    def to_rows(self) -> pd.DataFrame:
+        """Expand back to one row per implicate.
+
+        Returns:
+            DataFrame with the household id column and the kept columns.
+        """
+        rows = self.households.iloc[
+            np.repeat(np.arange(self.n_households), self.n_implicates)
+        ].reset_index()
+        varying = self.implicates.reshape(-1, len(self.varying_columns))
+        for i, column in enumerate(self.varying_columns):
+            rows[column] = varying[:, i]
+        return rows[[self.household_column] + self.columns]
+
+    def to_weighted_rows(self, weight_column: str = "weight") -> pd.DataFrame:
+        """Collapse the identical implicates of each household.
+
+        Rows of a household that agree on every kept column are merged into
+        one row, weighted by the number of implicates it stands for, so the
+        weights of a household sum to n_implicates.
+
+        Args:
+            weight_column: Name of the multiplicity weight column to add.
+
+        Returns:
+            DataFrame with the household id column, the kept columns and the
+            weight column.
+        """
+        rows = self.to_rows()
+        return (
+            rows.groupby(list(rows.columns), sort=False, dropna=False)
+            .size()
+            .rename(weight_column)
+            .astype(float)
+            .reset_index()
+        )
+
+    def split(
+        self, test_size: float = 0.2, random_state: int = RANDOM_STATE
+    ) -> Tuple["ImplicateData", "ImplicateData"]:
+        """Split households into train and test sets.
+
+        Args:
+            test_size: Share of households held out for testing.
+            random_state: Random seed for reproducibility.
+
+        Returns:
+            A tuple of the train and test ImplicateData.
+        """
+        rng = np.random.default_rng(random_state)
+        order = rng.permutation(self.n_households)
+        n_test = int(np.ceil(test_size * self.n_households))
+        return self._subset(np.sort(order[n_test:])), self._subset(
+            np.sort(order[:n_test])
+        )
+
+    def folds(
+        self, n_splits: int = 5, random_state: int = RANDOM_STATE
+    ) -> List[Tuple["ImplicateData", "ImplicateData"]]:
+        """Build shuffled k-fold splits of the households.
+
+        Args:
+            n_splits: Number of folds.
+            random_state: Random seed for reproducibility.
+
+        Returns:
+            List of (train, test) ImplicateData per fold.
+        """
+        kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+        return [
+            (self._subset(train), self._subset(test))
+            for train, test in kf.split(np.arange(self.n_households))
+        ]
@@ -1,8 +1,54 @@
+import contextlib
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Optional, Union, Any, Type, Callable, Tuple
 from us_imputation_benchmarking.config import QUANTILES
+from us_imputation_benchmarking.execution import get_execution_context
 from us_imputation_benchmarking.models.quantreg import QuantReg
+from us_imputation_benchmarking.utils.memory import MemoryProfiler
+
+
+def fit_model(
+    model_class: Type,
+    X: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    **fit_kwargs: Any,
+) -> Any:
+    """Instantiate and fit a model class on the training data.
+
+    Args:
+        model_class: Model class to fit (e.g., QRF, OLS, QuantReg, Matching).
+        X: Training data containing predictors and variables to impute.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles, used by models that fit per quantile.
+        **fit_kwargs: Additional keyword arguments to pass to the model's fit.
+
+    Returns:
+        The fitted model instance.
+    """
+    model = model_class()
+
+    # Apply the thread budget of the active execution context, if any
+    context = get_execution_context()
+    if context is not None:
+        fit_kwargs = {**context.model_kwargs(model_class), **fit_kwargs}
+        limit = context.limit(model_class.__name__)
+    else:
+        limit = contextlib.nullcontext()
+
+    with limit:
+        # Handle QuantReg which needs quantiles during fitting
+        if model_class == QuantReg:
+            model.fit(
+                X, predictors, imputed_variables, quantiles, **fit_kwargs
+            )
+        else:
+            model.fit(X, predictors, imputed_variables, **fit_kwargs)
+
+    return model
 
 
 def get_imputations(
@@ -12,6 +58,8 @@ def get_imputations(
     predictors: List[str],
     imputed_variables: List[str],
     quantiles: Optional[List[float]] = QUANTILES,
+    profiler: Optional[MemoryProfiler] = None,
+    weight_column: Optional[str] = None,
 ) -> Dict[str, Dict[float, Union[np.ndarray, pd.DataFrame]]]:
     """Generate imputations using multiple model classes for the specified variables.
 
@@ -22,27 +70,41 @@ def get_imputations(
         predictors: Names of columns to use as predictors.
         imputed_variables: Names of columns to impute.
         quantiles: List of quantiles to predict.
+        profiler: Memory profiler recording the fit and predict stages of
+            each model, e.g. '<model> fit'.
+        weight_column: Name of a column of X with row weights, such as
+            survey weights, to fit the models with.
 
     Returns:
         Nested dictionary mapping method names to dictionaries mapping quantiles to imputations.
     """
     method_imputations: Dict[str, Dict[float, Any]] = {}
+    fit_kwargs = {}
+    if weight_column is not None:
+        fit_kwargs["weight_column"] = weight_column
+
+    def stage(name: str) -> Any:
+        if profiler is None:
+            return contextlib.nullcontext()
+        return profiler.stage(name)
 
     for model_class in model_classes:
         model_name = model_class.__name__
         method_imputations[model_name] = {}
 
-        # Instantiate the model
-        model = model_class()
-
-        # Handle QuantReg which needs quantiles during fitting
-        if model_class == QuantReg:
-            model.fit(X, predictors, imputed_variables, quantiles)
-        else:
-            model.fit(X, predictors, imputed_variables)
+        with stage(f"{model_name} fit"):
+            model = fit_model(
+                model_class,
+                X,
+                predictors,
+                imputed_variables,
+                quantiles,
+                **fit_kwargs,
+            )
 
         # Get predictions
-        imputations = model.predict(test_X, quantiles)
+        with stage(f"{model_name} predict"):
+            imputations = model.predict(test_X, quantiles)
         method_imputations[model_name] = imputations
 
     return method_imputations
@@ -1,33 +1,62 @@
-import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
-from typing import List, Dict, Type, Union, Optional, Tuple
+from typing import List, Dict, Type, Union, Optional, Tuple, TYPE_CHECKING
+from us_imputation_benchmarking.comparisons.report import FigureReport
 from us_imputation_benchmarking.config import QUANTILES, PLOT_CONFIG
 
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
 
 def plot_loss_comparison(
     loss_comparison_df: pd.DataFrame,
     quantiles: List[float] = QUANTILES,
     save_path: Optional[str] = None,
-) -> go.Figure:
+    metric: str = "Loss",
+    report: Optional[FigureReport] = None,
+) -> "go.Figure":
     """Plot a bar chart comparing quantile losses across different methods.
 
     Args:
-        loss_comparison_df: DataFrame containing loss comparison data.
+        loss_comparison_df: DataFrame containing loss comparison data. If
+            it has 'Lower' and 'Upper' columns, as returned by
+            bootstrap_loss_comparison, they are drawn as error bars.
         quantiles: List of quantile values (e.g. [0.05, 0.1, ...]).
         save_path: Path to save the plot. If None, the plot is displayed.
+        metric: Column to plot, e.g. a column of compare_distributions.
+        report: Report to add the figure to. save_path is then written when
+            the report is exported, instead of immediately.
 
     Returns:
         Plotly figure object
     """
+    import plotly.express as px
+
+    error_bars = {}
+    if {"Lower", "Upper"} <= set(loss_comparison_df.columns):
+        loss_comparison_df = loss_comparison_df.assign(
+            error_plus=loss_comparison_df["Upper"]
+            - loss_comparison_df["Loss"],
+            error_minus=loss_comparison_df["Loss"]
+            - loss_comparison_df["Lower"],
+        )
+        error_bars = {"error_y": "error_plus", "error_y_minus": "error_minus"}
+
+    if metric == "Loss":
+        title = "Test Loss Across Quantiles for Different Imputation Methods"
+        y_label = "Average Test Quantile Loss"
+    else:
+        title = f"{metric} Across Quantiles for Different Imputation Methods"
+        y_label = metric
+
     fig = px.bar(
         loss_comparison_df,
         x="Percentile",
-        y="Loss",
+        y=metric,
         color="Method",
         barmode="group",
-        title="Test Loss Across Quantiles for Different Imputation Methods",
-        labels={"Percentile": "Percentiles", "Loss": "Average Test Quantile Loss"},
+        **error_bars,
+        title=title,
+        labels={"Percentile": "Percentiles", metric: y_label},
     )
     
     # Update layout for better appearance
@@ -44,7 +73,9 @@ def plot_loss_comparison(
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(0,0,0,0.1)')
     
     # Save or show the plot
-    if save_path:
+    if report is not None:
+        report.add(fig, image_path=save_path)
+    elif save_path:
         try:
             fig.write_image(save_path)
             html_path = save_path.replace(".png", ".html").replace(".jpg", ".html")
@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Any, Union
+from typing import Dict, List, Tuple, Any, Union, Optional
 from us_imputation_benchmarking.config import QUANTILES
 
 
@@ -37,6 +37,32 @@ def compute_quantile_loss(
     losses = quantile_loss(q, test_y, imputations)
     return losses
 
+def mean_quantile_loss(
+    q: float,
+    y: np.ndarray,
+    f: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+) -> float:
+    """Average the quantile loss over rows, optionally weighted.
+
+    Args:
+        q: Quantile to be evaluated, e.g., 0.5 for median.
+        y: True values, of shape (n_rows,) or (n_rows, n_variables).
+        f: Fitted or predicted values, of the same size as y.
+        weights: Weight of each row, such as survey weights. If None, rows
+            are weighted equally.
+
+    Returns:
+        Mean quantile loss.
+    """
+    y = np.asarray(y)
+    losses = quantile_loss(q, y, np.asarray(f).reshape(y.shape))
+    if weights is None:
+        return float(losses.mean())
+    losses = losses.reshape(len(losses), -1).mean(axis=1)
+    return float(np.average(losses, weights=weights))
+
+
 quantiles_legend: List[str] = [
     str(int(q * 100)) + "th percentile" for q in QUANTILES
 ]
@@ -47,6 +73,7 @@ def compare_quantile_loss(
     method_imputations: Dict[
         str, Dict[float, Union[np.ndarray, pd.DataFrame]]
     ],
+    weights: Optional[np.ndarray] = None,
 ) -> Tuple[pd.DataFrame, List[float]]:
     """Compare quantile loss across different imputation methods.
 
@@ -54,6 +81,8 @@ def compare_quantile_loss(
         test_y: DataFrame containing true values.
         method_imputations: Nested dictionary mapping method names to dictionaries
                           mapping quantiles to imputation values.
+        weights: Weight of each test row, such as survey weights. If None,
+            rows are weighted equally.
 
     Returns:
         A tuple containing:
@@ -68,15 +97,16 @@ def compare_quantile_loss(
 
     for method, imputation in method_imputations.items():
         for quantile in QUANTILES:
-            q_loss = compute_quantile_loss(
-                test_y.values.flatten(),
-                imputation[quantile].values.flatten(),
+            q_loss = mean_quantile_loss(
                 quantile,
+                test_y.values,
+                np.asarray(imputation[quantile]),
+                weights,
             )
             new_row = {
                 "Method": method,
                 "Percentile": str(int(quantile * 100)) + "th percentile",
-                "Loss": q_loss.mean(),
+                "Loss": q_loss,
             }
 
             results_df = pd.concat(
@@ -0,0 +1,260 @@
+import time
+import numpy as np
+import pandas as pd
+from scipy.stats import t
+from typing import List, Dict, Any, Optional, Tuple, Type
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
+
+
+def _row_losses(
+    model: Any,
+    validation: pd.DataFrame,
+    y: np.ndarray,
+    quantiles: List[float],
+) -> np.ndarray:
+    """Per-row validation loss of a fitted model at each quantile.
+
+    Args:
+        model: Fitted model.
+        validation: Validation data.
+        y: True values of the validation data.
+        quantiles: List of quantiles to evaluate.
+
+    Returns:
+        Array of shape (n_quantiles, n_rows), averaged over variables.
+    """
+    predictions = model.predict(validation, quantiles)
+    return np.stack(
+        [
+            quantile_loss(q, y, np.asarray(predictions[q]).reshape(y.shape))
+            .reshape(len(y), -1)
+            .mean(axis=1)
+            for q in quantiles
+        ]
+    )
+
+
+def _dominated(
+    losses: Dict[str, np.ndarray], confidence_level: float
+) -> Dict[str, str]:
+    """Find the models significantly worse than another at every quantile.
+
+    Args:
+        losses: Mapping from model names to per-row losses of shape
+            (n_quantiles, n_rows), on the same rows.
+        confidence_level: Level of the one-sided paired t-tests.
+
+    Returns:
+        Dictionary mapping each dominated model to a model dominating it.
+    """
+    dominated = {}
+    for name, model_losses in losses.items():
+        for other, other_losses in losses.items():
+            if other == name:
+                continue
+            differences = model_losses - other_losses
+            n_rows = differences.shape[1]
+            mean = differences.mean(axis=1)
+            se = differences.std(axis=1, ddof=1) / np.sqrt(n_rows)
+            critical = t.ppf(confidence_level, n_rows - 1)
+            if np.all(mean > critical * se) and np.all(mean > 0):
+                dominated[name] = other
+                break
+    return dominated
+
+
+def race_models(
+    model_classes: List[Type],
+    X: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    time_budget: Optional[float] = None,
+    min_samples: int = 500,
+    eta: int = 3,
+    validation_size: float = 0.2,
+    confidence_level: float = 0.95,
+    random_state: int = RANDOM_STATE,
+) -> Tuple[List[Type], pd.DataFrame]:
+    """Race model classes on growing subsamples and drop dominated ones.
+
+    A validation set is held out of X once. In each rung, every remaining
+    model is fitted on a prefix of the shuffled training rows and scored on
+    the validation set. A model whose paired per-row loss is significantly
+    higher than another model's at every quantile is dropped. The training
+    size is then multiplied by eta, until the full training rows are used
+    or one model remains.
+
+    With a time budget, the first rung always runs, and a further rung only
+    starts if the previous rung's time multiplied by eta still fits in the
+    budget, so the race stops early instead of overrunning.
+
+    Args:
+        model_classes: List of model classes to race (e.g., QRF, OLS,
+            QuantReg, Matching).
+        X: Training data containing predictors and variables to impute.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to compare the models on.
+        time_budget: Wall-clock budget of the race in seconds, or None.
+        min_samples: Training rows of the first rung.
+        eta: Growth rate of the training size between rungs.
+        validation_size: Share of X held out to score the models.
+        confidence_level: Level of the one-sided paired t-tests.
+        random_state: Random seed for reproducibility.
+
+    Returns:
+        A tuple containing:
+          - List of the finalist model classes, in their order in
+            model_classes
+          - DataFrame ranking the models, with columns 'model', 'status',
+            'rung', 'n_samples', 'loss', 'fit_seconds' and
+            'predict_seconds' at the last rung each model ran
+    """
+    start = time.time()
+    rng = np.random.default_rng(random_state)
+    order = rng.permutation(len(X))
+    n_validation = int(round(len(X) * validation_size))
+    validation = X.iloc[order[:n_validation]]
+    train = X.iloc[order[n_validation:]]
+    y = validation[imputed_variables].to_numpy()
+
+    classes = {
+        model_class.__name__: model_class for model_class in model_classes
+    }
+    survivors = list(classes)
+    records: Dict[str, Dict[str, Any]] = {}
+
+    n_samples = min(min_samples, len(train))
+    rung = 0
+    while True:
+        rung_start = time.time()
+        rung_losses = {}
+        for name in survivors:
+            fit_start = time.time()
+            model = fit_model(
+                classes[name],
+                train.iloc[:n_samples],
+                predictors,
+                imputed_variables,
+                quantiles,
+            )
+            predict_start = time.time()
+            rung_losses[name] = _row_losses(model, validation, y, quantiles)
+            records[name] = {
+                "model": name,
+                "status": "finalist",
+                "rung": rung,
+                "n_samples": n_samples,
+                "loss": float(rung_losses[name].mean()),
+                "fit_seconds": predict_start - fit_start,
+                "predict_seconds": time.time() - predict_start,
+            }
+
+        for name, winner in _dominated(rung_losses, confidence_level).items():
+            records[name]["status"] = f"dropped (worse than {winner})"
+        survivors = [
+            name for name in survivors if records[name]["status"] == "finalist"
+        ]
+
+        if len(survivors) <= 1 or n_samples >= len(train):
+            break
+        if time_budget is not None:
+            projected = (time.time() - rung_start) * eta
+            if time.time() - start + projected > time_budget:
+                break
+        n_samples = min(n_samples * eta, len(train))
+        rung += 1
+
+    # Finalists first, then models by how long they stayed in the race
+    ranking = pd.DataFrame(list(records.values()))
+    ranking = (
+        ranking.assign(finalist=ranking["status"] == "finalist")
+        .sort_values(
+            ["finalist", "rung", "loss"],
+            ascending=[False, False, True],
+            ignore_index=True,
+        )
+        .drop(columns="finalist")
+    )
+
+    print(
+        f"\nRacing Summary ({rung + 1} rungs, " f"{time.time() - start:.1f}s):"
+    )
+    print(
+        ranking.set_index("model").to_string(float_format=lambda x: f"{x:.6f}")
+    )
+
+    finalists = [
+        model_class
+        for model_class in model_classes
+        if model_class.__name__ in survivors
+    ]
+    return finalists, ranking
+
+
+def race_and_impute(
+    model_classes: List[Type],
+    X: pd.DataFrame,
+    test_X: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    time_budget: Optional[float] = None,
+    **race_kwargs: Any,
+) -> Tuple[Dict[str, Dict[float, Any]], pd.DataFrame]:
+    """Race model classes, then impute with the finalists only.
+
+    The model classes are raced on subsamples of X (see race_models), and
+    only the finalists are fitted on the full training data and predict
+    test_X, as in get_imputations.
+
+    Args:
+        model_classes: List of model classes to race (e.g., QRF, OLS,
+            QuantReg, Matching).
+        X: Training data containing predictors and variables to impute.
+        test_X: Test data on which to make imputations.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to predict.
+        time_budget: Wall-clock budget of the race in seconds. The final
+            fits of the finalists are not included.
+        **race_kwargs: Additional keyword arguments to pass to race_models.
+
+    Returns:
+        A tuple containing:
+          - Nested dictionary mapping the finalists' names to dictionaries
+            mapping quantiles to imputations
+          - The race ranking, with the finalists' full-data fit and
+            predict times in columns 'final_fit_seconds' and
+            'final_predict_seconds'
+    """
+    finalists, ranking = race_models(
+        model_classes,
+        X,
+        predictors,
+        imputed_variables,
+        quantiles,
+        time_budget=time_budget,
+        **race_kwargs,
+    )
+
+    method_imputations: Dict[str, Dict[float, Any]] = {}
+    fit_seconds: Dict[str, float] = {}
+    predict_seconds: Dict[str, float] = {}
+    for model_class in finalists:
+        model_name = model_class.__name__
+        start = time.time()
+        model = fit_model(
+            model_class, X, predictors, imputed_variables, quantiles
+        )
+        fit_seconds[model_name] = time.time() - start
+        start = time.time()
+        method_imputations[model_name] = model.predict(test_X, quantiles)
+        predict_seconds[model_name] = time.time() - start
+
+    ranking["final_fit_seconds"] = ranking["model"].map(fit_seconds)
+    ranking["final_predict_seconds"] = ranking["model"].map(predict_seconds)
+    return method_imputations, ranking
@@ -0,0 +1,148 @@
+import html
+import os
+import time
+from typing import List, Any, Optional, Tuple
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+<h1>{title}</h1>
+{sections}
+</body>
+</html>
+"""
+
+
+class FigureReport:
+    """Collect figures and export them together.
+
+    Figures are rendered into a single HTML report that embeds plotly.js
+    once, and static images are rendered in one batch by plotly's kaleido
+    process, which is started once and kept alive for later exports.
+    Plotly and kaleido are only imported when the report is exported.
+
+    Example:
+        report = FigureReport("Sweep")
+        plot_loss_comparison(df, save_path="loss_2019.png", report=report)
+        report.export("report.html")
+    """
+
+    def __init__(self, title: str = "Imputation Benchmark Report"):
+        """Initialize an empty report.
+
+        Args:
+            title: Title of the HTML report.
+        """
+        self.title = title
+        self.figures: List[Tuple[str, Any, Optional[str]]] = []
+
+    def __len__(self) -> int:
+        """Number of figures in the report."""
+        return len(self.figures)
+
+    def add(
+        self,
+        fig: Any,
+        name: Optional[str] = None,
+        image_path: Optional[str] = None,
+    ) -> None:
+        """Add a figure to the report.
+
+        Args:
+            fig: Plotly figure.
+            name: Heading of the figure in the report. Defaults to the
+                figure's title.
+            image_path: Path to write a static image of the figure to on
+                export, with the format taken from its extension.
+        """
+        if name is None:
+            name = fig.layout.title.text or f"Figure {len(self) + 1}"
+        self.figures.append((name, fig, image_path))
+
+    def write_html(self, path: str, include_plotlyjs: Any = True) -> None:
+        """Write every figure into one HTML file.
+
+        Args:
+            path: Path of the HTML report.
+            include_plotlyjs: How plotly.js is included with the first
+                figure, as in plotly's to_html (True to embed it, "cdn" to
+                link to it).
+        """
+        import plotly.io as pio
+
+        sections = []
+        for i, (name, fig, _) in enumerate(self.figures):
+            div = pio.to_html(
+                fig,
+                full_html=False,
+                include_plotlyjs=include_plotlyjs if i == 0 else False,
+            )
+            sections.append(f"<h2>{html.escape(name)}</h2>\n{div}")
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                REPORT_TEMPLATE.format(
+                    title=html.escape(self.title),
+                    sections="\n".join(sections),
+                )
+            )
+
+    def write_images(self) -> List[str]:
+        """Render the static images of every figure with an image path.
+
+        Returns:
+            List of the image paths written.
+
+        Raises:
+            ValueError: If kaleido is not installed.
+        """
+        figures = [
+            (fig, path) for _, fig, path in self.figures if path is not None
+        ]
+        if not figures:
+            return []
+
+        import plotly.io as pio
+
+        scope = pio.kaleido.scope
+        if scope is None:
+            raise ValueError("Static image export requires kaleido")
+
+        written = []
+        for fig, path in figures:
+            image_format = os.path.splitext(path)[1].lstrip(".") or "png"
+            image = scope.transform(
+                fig.to_dict(),
+                format=image_format,
+                width=fig.layout.width,
+                height=fig.layout.height,
+            )
+            with open(path, "wb") as f:
+                f.write(image)
+            written.append(path)
+        return written
+
+    def export(self, html_path: str, images: bool = True) -> None:
+        """Write the HTML report and, optionally, the static images.
+
+        Args:
+            html_path: Path of the HTML report.
+            images: Whether to render the static images.
+        """
+        start = time.time()
+        self.write_html(html_path)
+        written = []
+        if images:
+            try:
+                written = self.write_images()
+            except Exception as e:
+                print(f"Error saving report images: {e}")
+
+        print(
+            f"\nReport saved to {html_path}: {len(self)} figures, "
+            f"{len(written)} images in {time.time() - start:.1f}s"
+        )
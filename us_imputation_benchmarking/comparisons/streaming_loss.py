@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Optional, Tuple, Union
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+
+# Key of one running total: (model, fold, split, quantile, variable)
+_Key = Tuple[str, Any, str, float, Any]
+
+
+class LossAccumulator:
+    """Running quantile loss totals, fed one chunk of predictions at a time.
+
+    For every (model, fold, split, quantile, variable) the accumulator keeps
+    the weighted sum of losses, the sum of weights and the row count, so
+    predictions can be discarded as soon as they are scored and memory does
+    not grow with the number of rows. Accumulators filled by separate
+    workers can be merged.
+    """
+
+    def __init__(self):
+        """Initialize an empty accumulator."""
+        self.totals: Dict[_Key, np.ndarray] = {}
+
+    def update(
+        self,
+        model: str,
+        split: str,
+        q: float,
+        y: Union[np.ndarray, pd.DataFrame],
+        predictions: Union[np.ndarray, pd.DataFrame],
+        weights: Optional[np.ndarray] = None,
+        fold: Any = None,
+        variables: Optional[List[Any]] = None,
+    ) -> "LossAccumulator":
+        """Add the losses of a chunk of predictions.
+
+        Args:
+            model: Name of the model.
+            split: "train" or "test".
+            q: Quantile of the predictions.
+            y: True values, of shape (n_rows,) or (n_rows, n_variables).
+            predictions: Predicted values, of the same size as y.
+            weights: Weight of each row. If None, rows are weighted equally.
+            fold: Cross-validation fold of the chunk, if any.
+            variables: Names of the variables. Defaults to the columns of y
+                if it is a DataFrame, or their positions otherwise.
+
+        Returns:
+            The accumulator, for chaining.
+        """
+        if variables is None:
+            variables = (
+                list(y.columns) if isinstance(y, pd.DataFrame) else None
+            )
+        y = np.asarray(y, dtype=float).reshape(len(y), -1)
+        predictions = np.asarray(predictions, dtype=float).reshape(y.shape)
+        if variables is None:
+            variables = list(range(y.shape[1]))
+
+        losses = quantile_loss(q, y, predictions)
+        if weights is None:
+            loss_sums = losses.sum(axis=0)
+            weight_sum = float(len(y))
+        else:
+            weights = np.asarray(weights, dtype=float)
+            loss_sums = weights @ losses
+            weight_sum = float(weights.sum())
+
+        for variable, loss_sum in zip(variables, loss_sums):
+            key = (model, fold, split, q, variable)
+            totals = self.totals.setdefault(key, np.zeros(3))
+            totals += (loss_sum, weight_sum, len(y))
+        return self
+
+    def merge(self, other: "LossAccumulator") -> "LossAccumulator":
+        """Add the totals of another accumulator to this one.
+
+        Args:
+            other: Accumulator to merge in.
+
+        Returns:
+            The accumulator, for chaining.
+        """
+        for key, totals in other.totals.items():
+            self.totals.setdefault(key, np.zeros(3))
+            self.totals[key] += totals
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the average loss of every running total.
+
+        Returns:
+            Long-form DataFrame with columns 'model', 'fold', 'split',
+            'quantile', 'variable', 'loss', 'weight' and 'count'.
+        """
+        records = [
+            (*key, totals[0] / totals[1], totals[1], int(totals[2]))
+            for key, totals in self.totals.items()
+        ]
+        return pd.DataFrame(
+            records,
+            columns=[
+                "model",
+                "fold",
+                "split",
+                "quantile",
+                "variable",
+                "loss",
+                "weight",
+                "count",
+            ],
+        )
+
+    def mean_loss(
+        self, model: str, split: str, q: float, fold: Any = None
+    ) -> float:
+        """Average loss of a model, split and quantile over its variables.
+
+        Args:
+            model: Name of the model.
+            split: "train" or "test".
+            q: Quantile.
+            fold: Cross-validation fold, if any.
+
+        Returns:
+            Mean over variables of the weighted average loss.
+        """
+        losses = [
+            totals[0] / totals[1]
+            for key, totals in self.totals.items()
+            if key[:4] == (model, fold, split, q)
+        ]
+        return float(np.mean(losses))
@@ -24,6 +24,20 @@ DEFAULT_MODEL_PARAMS: Dict[str, Dict[str, Any]] = {
     "matching": {}
 }
 
+# Hyperparameter search space for QRF tuning
+QRF_SEARCH_SPACE: Dict[str, List[Any]] = {
+    "n_estimators": [25, 50, 100, 200],
+    "max_depth": [None, 6, 10, 16],
+    "min_samples_leaf": [1, 5, 10, 25],
+    "max_features": [1.0, 0.5, "sqrt"],
+}
+
+# Memory configuration. In low-memory mode preprocess_data returns the
+# standardized data as contiguous float32, halving its size
+MEMORY_CONFIG: Dict[str, Any] = {
+    "low_memory": False,
+}
+
 # Plotting configuration
 PLOT_CONFIG: Dict[str, Any] = {
     "width": 1000,
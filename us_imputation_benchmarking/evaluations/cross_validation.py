@@ -2,9 +2,82 @@ import numpy as np
 import pandas as pd
 from sklearn.model_selection import KFold
 from typing import List, Dict, Type, Any, Union, Optional, Tuple, Callable
+from us_imputation_benchmarking.comparisons.implicates import household_folds
+from us_imputation_benchmarking.comparisons.imputations import fit_model
 from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.comparisons.streaming_loss import (
+    LossAccumulator,
+)
 from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
-from us_imputation_benchmarking.models.quantreg import QuantReg
+from us_imputation_benchmarking.models.qrf import QRF
+
+
+def _folds(
+    data: pd.DataFrame,
+    n_splits: int,
+    random_state: int,
+    group_column: Optional[str] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Build shuffled k-fold splits, keeping groups together if given.
+
+    Args:
+        data: Full dataset to split into folds.
+        n_splits: Number of cross-validation folds.
+        random_state: Random seed for reproducibility.
+        group_column: Name of a column of group ids, or None.
+
+    Returns:
+        List of (train row positions, test row positions) per fold.
+    """
+    if group_column is not None:
+        return household_folds(data, n_splits, random_state, group_column)
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    return list(kf.split(data))
+
+
+def _accumulate_losses(
+    accumulator: LossAccumulator,
+    model: Any,
+    model_name: str,
+    split: str,
+    fold: int,
+    data: pd.DataFrame,
+    imputed_variables: List[str],
+    quantiles: List[float],
+    weight_column: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+) -> None:
+    """Predict data in chunks and add the losses to an accumulator.
+
+    Args:
+        accumulator: Accumulator to add the losses to.
+        model: Fitted model.
+        model_name: Name of the model.
+        split: "train" or "test".
+        fold: Cross-validation fold of data.
+        data: Rows to predict.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate.
+        weight_column: Name of a column of row weights, or None.
+        chunk_size: Number of rows predicted at a time, or None for all.
+    """
+    chunk_size = chunk_size or len(data)
+    for start in range(0, len(data), chunk_size):
+        chunk = data.iloc[start : start + chunk_size]
+        imputations = model.predict(chunk, quantiles)
+        weights = (
+            chunk[weight_column].values if weight_column is not None else None
+        )
+        for q in quantiles:
+            accumulator.update(
+                model_name,
+                split,
+                q,
+                chunk[imputed_variables],
+                imputations[q],
+                weights=weights,
+                fold=fold,
+            )
 
 
 def cross_validate_model(
@@ -15,6 +88,10 @@ def cross_validate_model(
     quantiles: Optional[List[float]] = QUANTILES,
     n_splits: int = 5,
     random_state: int = RANDOM_STATE,
+    group_column: Optional[str] = None,
+    weight_column: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    fit_kwargs: Optional[Dict[str, Any]] = None,
 ) -> pd.DataFrame:
     """Perform cross-validation for an imputation model.
 
@@ -26,70 +103,76 @@ def cross_validate_model(
         quantiles: List of quantiles to evaluate. Defaults to standard set if None.
         n_splits: Number of cross-validation folds.
         random_state: Random seed for reproducibility.
+        group_column: Name of a column of group ids, such as the household
+            id of implicate data. Rows of a group are kept in the same fold.
+        weight_column: Name of a column of row weights, such as survey
+            weights. Models are fitted with the weights, and losses are
+            weighted averages.
+        chunk_size: Number of rows predicted at a time. If None, each split
+            of a fold is predicted at once. Models that sample predictions
+            (QRF) draw per chunk, so losses depend slightly on chunk_size.
+        fit_kwargs: Additional keyword arguments to pass to the model's fit,
+            such as QRF parameters.
 
     Returns:
         DataFrame with train and test rows, quantiles as columns, and average loss values
     """
 
-    test_results = {q: [] for q in quantiles}
-    train_results = {q: [] for q in quantiles}
-    train_y_values = []
-    test_y_values = []
+    model_name = model_class.__name__
+    fit_kwargs = dict(fit_kwargs or {})
+    if weight_column is not None:
+        fit_kwargs["weight_column"] = weight_column
 
-    # Set up k-fold cross-validation
-    kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    # Losses are accumulated as each chunk is predicted, so predictions
+    # are never kept beyond one chunk
+    accumulator = LossAccumulator()
+    folds = _folds(data, n_splits, random_state, group_column)
 
-    for train_idx, test_idx in kf.split(data):
+    for fold, (train_idx, test_idx) in enumerate(folds):
         train_data = data.iloc[train_idx]
         test_data = data.iloc[test_idx]
 
-        # Store actual values for this fold
-        train_y = train_data[imputed_variables].values
-        test_y = test_data[imputed_variables].values
-        train_y_values.append(train_y)
-        test_y_values.append(test_y)
+        model = fit_model(
+            model_class,
+            train_data,
+            predictors,
+            imputed_variables,
+            quantiles,
+            **fit_kwargs,
+        )
 
-        # Instantiate the model
-        model = model_class()
-
-        # Handle different model fitting requirements
-        if model_class == QuantReg:
-            model.fit(train_data, predictors, imputed_variables, quantiles)
-        else:
-            model.fit(train_data, predictors, imputed_variables)
-
-        # Get predictions for this fold
-        fold_test_imputations = model.predict(test_data, quantiles)
-        fold_train_imputations = model.predict(train_data, quantiles)
-
-        for q in quantiles:
-            test_results[q].append(fold_test_imputations[q])
-            train_results[q].append(fold_train_imputations[q])
-
-    avg_test_losses = {q: [] for q in quantiles}
-    avg_train_losses = {q: [] for q in quantiles}
-    for k in range(len(test_y_values)):
-        for q in quantiles:
-            # Flatten arrays for easier calculation
-            test_y_flat = test_y_values[k].flatten()
-            train_y_flat = train_y_values[k].flatten()
-            test_pred_flat = test_results[q][k].values.flatten()
-            train_pred_flat = train_results[q][k].values.flatten()
-
-            # Calculate the loss for this fold and quantile
-            test_loss = quantile_loss(q, test_y_flat, test_pred_flat)
-            train_loss = quantile_loss(q, train_y_flat, train_pred_flat)
-
-            # Store the mean loss
-            avg_test_losses[q].append(test_loss.mean())
-            avg_train_losses[q].append(train_loss.mean())
+        for split, split_data in [("test", test_data), ("train", train_data)]:
+            _accumulate_losses(
+                accumulator,
+                model,
+                model_name,
+                split,
+                fold,
+                split_data,
+                imputed_variables,
+                quantiles,
+                weight_column,
+                chunk_size,
+            )
 
     # Calculate the average loss across all folds for each quantile
     final_test_losses = {
-        q: np.mean(losses) for q, losses in avg_test_losses.items()
+        q: np.mean(
+            [
+                accumulator.mean_loss(model_name, "test", q, fold)
+                for fold in range(len(folds))
+            ]
+        )
+        for q in quantiles
     }
     final_train_losses = {
-        q: np.mean(losses) for q, losses in avg_train_losses.items()
+        q: np.mean(
+            [
+                accumulator.mean_loss(model_name, "train", q, fold)
+                for fold in range(len(folds))
+            ]
+        )
+        for q in quantiles
     }
 
     # Create DataFrame with quantiles as columns
@@ -108,3 +191,163 @@ def cross_validate_model(
     print(f"Train/Test Ratio: {train_test_ratio:.6f}")
 
     return final_results
+
+
+def cross_validate_models(
+    model_classes: List[Type],
+    data: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    n_splits: int = 5,
+    random_state: int = RANDOM_STATE,
+    return_predictions: bool = False,
+    group_column: Optional[str] = None,
+) -> Union[pd.DataFrame, Tuple[pd.DataFrame, Dict[str, np.ndarray]]]:
+    """Cross-validate several imputation models on shared folds.
+
+    The folds are computed and sliced once, and every model is fitted on the
+    same train/test data. Out-of-fold test predictions are written into one
+    preallocated array per model, while train losses are computed as soon as
+    each fold is predicted.
+
+    Args:
+        model_classes: List of model classes to evaluate (e.g., QRF, OLS,
+            QuantReg, Matching).
+        data: Full dataset to split into training and testing folds.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate. Defaults to standard set if None.
+        n_splits: Number of cross-validation folds.
+        random_state: Random seed for reproducibility.
+        return_predictions: Whether to also return the out-of-fold test
+            predictions.
+        group_column: Name of a column of group ids, such as the household
+            id of implicate data. Rows of a group are kept in the same fold.
+
+    Returns:
+        Long-form DataFrame with columns 'model', 'fold', 'split', 'quantile'
+        and 'loss'. If return_predictions is True, a tuple of that DataFrame
+        and a dictionary mapping model names to arrays of shape
+        (n_quantiles, n_rows, n_imputed_variables), in data row order.
+    """
+    y = data[imputed_variables].to_numpy()
+    n_rows, n_variables = y.shape
+
+    folds = _folds(data, n_splits, random_state, group_column)
+
+    predictions = {
+        model_class.__name__: np.empty((len(quantiles), n_rows, n_variables))
+        for model_class in model_classes
+    }
+    records = []
+
+    for fold, (train_idx, test_idx) in enumerate(folds):
+        train_data = data.iloc[train_idx]
+        test_data = data.iloc[test_idx]
+
+        for model_class in model_classes:
+            model_name = model_class.__name__
+            model = fit_model(
+                model_class,
+                train_data,
+                predictors,
+                imputed_variables,
+                quantiles,
+            )
+
+            fold_test_imputations = model.predict(test_data, quantiles)
+            fold_train_imputations = model.predict(train_data, quantiles)
+
+            for i, q in enumerate(quantiles):
+                predictions[model_name][i, test_idx] = np.asarray(
+                    fold_test_imputations[q]
+                ).reshape(len(test_idx), n_variables)
+                train_pred = np.asarray(fold_train_imputations[q]).reshape(
+                    len(train_idx), n_variables
+                )
+                train_loss = quantile_loss(q, y[train_idx], train_pred)
+                records.append(
+                    (model_name, fold, "train", q, train_loss.mean())
+                )
+
+    for model_name, model_predictions in predictions.items():
+        for fold, (_, test_idx) in enumerate(folds):
+            for i, q in enumerate(quantiles):
+                test_loss = quantile_loss(
+                    q, y[test_idx], model_predictions[i, test_idx]
+                )
+                records.append((model_name, fold, "test", q, test_loss.mean()))
+
+    results = pd.DataFrame(
+        records, columns=["model", "fold", "split", "quantile", "loss"]
+    )
+
+    summary = results.groupby(["model", "split"])["loss"].mean().unstack()
+    print("\nCross-Validation Summary:")
+    print(summary.to_string(float_format=lambda x: f"{x:.6f}"))
+
+    if return_predictions:
+        return results, predictions
+    return results
+
+
+def evaluate_qrf_oob(
+    data: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    random_state: int = RANDOM_STATE,
+    **qrf_kwargs: Any,
+) -> pd.DataFrame:
+    """Evaluate a QRF model from a single fit using out-of-bag predictions.
+
+    Each row is predicted only by the trees whose bootstrap sample left it
+    out, which plays the role of the test folds of cross_validate_model
+    without refitting. Rows with no out-of-bag tree are ignored.
+
+    Args:
+        data: Full dataset to fit and evaluate on.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate. Defaults to standard set if None.
+        random_state: Random seed for reproducibility.
+        **qrf_kwargs: Additional keyword arguments to pass to QRF. bootstrap
+            must not be disabled.
+
+    Returns:
+        DataFrame with train (in-sample) and test (out-of-bag) rows,
+        quantiles as columns, and average loss values
+    """
+    model = QRF(seed=random_state)
+    model.fit(data, predictors, imputed_variables, **qrf_kwargs)
+
+    train_imputations = model.predict(data, quantiles)
+    oob_imputations = model.predict(data, quantiles, oob_score=True)
+
+    y_flat = data[imputed_variables].values.flatten()
+    final_train_losses = {}
+    final_test_losses = {}
+    for q in quantiles:
+        train_loss = quantile_loss(
+            q, y_flat, train_imputations[q].values.flatten()
+        )
+        oob_loss = quantile_loss(
+            q, y_flat, oob_imputations[q].values.flatten()
+        )
+        final_train_losses[q] = train_loss.mean()
+        final_test_losses[q] = np.nanmean(oob_loss)
+
+    final_results = pd.DataFrame(
+        [final_train_losses, final_test_losses], index=["train", "test"]
+    )
+
+    train_mean = final_results.loc["train"].mean()
+    test_mean = final_results.loc["test"].mean()
+
+    print("\nOut-of-Bag Performance Summary for QRF:")
+    print(f"Average Train Loss: {train_mean:.6f}")
+    print(f"Average OOB Loss: {test_mean:.6f}")
+    print(f"Train/OOB Ratio: {train_mean / test_mean:.6f}")
+
+    return final_results
@@ -0,0 +1,202 @@
+import time
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold, train_test_split
+from typing import List, Dict, Any, Optional, Tuple, Type, Union, Callable
+from us_imputation_benchmarking.comparisons.data import preprocess_data
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import (
+    QUANTILES,
+    RANDOM_STATE,
+    VALID_YEARS,
+)
+from us_imputation_benchmarking.evaluations.results_store import (
+    ResultsStore,
+    unit_id,
+)
+
+
+def _load_year(year: int) -> Tuple[pd.DataFrame, List[str], List[str]]:
+    """Load and preprocess the full dataset of one SCF year."""
+    return preprocess_data(full_data=True, years=year)
+
+
+def _unit_losses(
+    model: Any,
+    data: pd.DataFrame,
+    imputed_variables: List[str],
+    quantiles: List[float],
+    split: str,
+) -> Tuple[List[Tuple[str, float, float]], float]:
+    """Predict one split and compute its average loss per quantile.
+
+    Returns:
+        A tuple of the list of (split, quantile, loss) rows and the seconds
+        spent predicting.
+    """
+    start = time.time()
+    imputations = model.predict(data, quantiles)
+    predict_time = time.time() - start
+
+    y = data[imputed_variables].values.flatten()
+    losses = [
+        (
+            split,
+            q,
+            float(
+                quantile_loss(
+                    q, y, np.asarray(imputations[q]).flatten()
+                ).mean()
+            ),
+        )
+        for q in quantiles
+    ]
+    return losses, predict_time
+
+
+def run_experiments(
+    models: List[Union[Type, Tuple[Type, Dict[str, Any]]]],
+    store: Union[str, ResultsStore],
+    years: Optional[List[int]] = None,
+    quantiles: Optional[List[float]] = QUANTILES,
+    n_splits: int = 5,
+    holdout: bool = True,
+    random_state: int = RANDOM_STATE,
+    load_data: Callable[
+        [int], Tuple[pd.DataFrame, List[str], List[str]]
+    ] = _load_year,
+) -> pd.DataFrame:
+    """Run a resumable comparison of models over years and folds.
+
+    The work is split into units of (model, parameters, year, fold), where
+    fold is either "holdout" (the 80/20 split used by preprocess_data) or
+    a cross-validation fold number. Each unit is written to the results
+    store as soon as it finishes, and units already in the store are
+    skipped, so an interrupted run continues where it stopped. A year's
+    data is only loaded if some of its units are still pending.
+
+    Args:
+        models: List of model classes, or (model class, fit keyword
+            arguments) tuples to evaluate several parameter sets.
+        store: ResultsStore or path of the SQLite file to record units in.
+            A store opened from a path is closed before returning.
+        years: Years of SCF data to run on. Defaults to VALID_YEARS.
+        quantiles: List of quantiles to evaluate.
+        n_splits: Number of cross-validation folds. 0 skips cross-validation.
+        holdout: Whether to also evaluate on the holdout split.
+        random_state: Random seed for reproducibility.
+        load_data: Function returning (data, predictors, imputed_variables)
+            for a year. Defaults to preprocess_data(full_data=True).
+
+    Returns:
+        Long-form DataFrame with the losses of every unit of this run, as
+        returned by ResultsStore.query.
+    """
+    if years is None:
+        years = VALID_YEARS
+    if isinstance(store, str):
+        # A store opened here is closed here, even if a unit fails
+        with ResultsStore(store) as opened_store:
+            return run_experiments(
+                models=models,
+                store=opened_store,
+                years=years,
+                quantiles=quantiles,
+                n_splits=n_splits,
+                holdout=holdout,
+                random_state=random_state,
+                load_data=load_data,
+            )
+
+    model_specs = [
+        spec if isinstance(spec, tuple) else (spec, {}) for spec in models
+    ]
+    folds = (["holdout"] if holdout else []) + [
+        str(k) for k in range(n_splits)
+    ]
+    settings = {
+        "quantiles": quantiles,
+        "n_splits": n_splits,
+        "random_state": random_state,
+    }
+
+    completed = store.completed_units()
+    run_units = set()
+    n_skipped = 0
+    n_run = 0
+
+    for year in years:
+        pending = []
+        for model_class, params in model_specs:
+            for fold in folds:
+                unit = unit_id(
+                    model_class.__name__, params, year, fold, settings
+                )
+                run_units.add(unit)
+                if unit in completed:
+                    n_skipped += 1
+                else:
+                    pending.append((unit, model_class, params, fold))
+        if not pending:
+            continue
+
+        data, predictors, imputed_variables = load_data(year)
+        splits = {}
+        if holdout:
+            splits["holdout"] = train_test_split(
+                data,
+                test_size=0.2,
+                train_size=0.8,
+                random_state=random_state,
+            )
+        if n_splits:
+            kf = KFold(
+                n_splits=n_splits, shuffle=True, random_state=random_state
+            )
+            for k, (train_idx, test_idx) in enumerate(kf.split(data)):
+                splits[str(k)] = (data.iloc[train_idx], data.iloc[test_idx])
+
+        for unit, model_class, params, fold in pending:
+            train_data, test_data = splits[fold]
+
+            start = time.time()
+            model = fit_model(
+                model_class,
+                train_data,
+                predictors,
+                imputed_variables,
+                quantiles,
+                **params,
+            )
+            fit_time = time.time() - start
+
+            losses, predict_time = _unit_losses(
+                model, test_data, imputed_variables, quantiles, "test"
+            )
+            # Train loss is only reported for cross-validation folds, as
+            # in cross_validate_model
+            if fold != "holdout":
+                train_losses, train_time = _unit_losses(
+                    model, train_data, imputed_variables, quantiles, "train"
+                )
+                losses += train_losses
+                predict_time += train_time
+
+            store.record(
+                unit,
+                model_class.__name__,
+                params,
+                year,
+                fold,
+                losses,
+                fit_time,
+                predict_time,
+            )
+            n_run += 1
+
+    print("\nExperiment Summary:")
+    print(f"Units run: {n_run}")
+    print(f"Units skipped (already in store): {n_skipped}")
+
+    return store.query(units=run_units)
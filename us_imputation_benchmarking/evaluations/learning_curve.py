@@ -0,0 +1,280 @@
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.model_selection import KFold
+from typing import List, Dict, Any, Optional, Type
+from us_imputation_benchmarking.comparisons.implicates import household_folds
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
+from us_imputation_benchmarking.execution import get_execution_context
+from us_imputation_benchmarking.utils.memory import MemoryProfiler
+from us_imputation_benchmarking.utils.shared_data import SharedDataset
+
+
+def training_sizes(
+    max_size: int, n_sizes: int = 6, min_size: int = 100
+) -> List[int]:
+    """Geometric grid of training sizes.
+
+    Args:
+        max_size: Largest training size, included in the grid.
+        n_sizes: Number of sizes in the grid.
+        min_size: Smallest training size.
+
+    Returns:
+        Sorted list of distinct sizes from min_size to max_size.
+    """
+    min_size = min(min_size, max_size)
+    sizes = np.geomspace(min_size, max_size, n_sizes).round().astype(int)
+    return sorted(set(sizes.tolist()))
+
+
+def _size_losses(
+    model_class: Type,
+    dataset: SharedDataset,
+    train_positions: np.ndarray,
+    test_positions: np.ndarray,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: List[float],
+    fit_kwargs: Optional[Dict[str, Any]] = None,
+    measure_memory: bool = False,
+) -> Dict[str, Any]:
+    """Fit a model on one training subsample and score it on a test fold.
+
+    Args:
+        model_class: Model class to fit.
+        dataset: Shared dataset.
+        train_positions: Row positions of the training subsample.
+        test_positions: Row positions of the test fold.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate.
+        fit_kwargs: Keyword arguments to pass to the model's fit.
+        measure_memory: Whether to fit and predict a second time with
+            memory tracing, which is too slow to share with the timed run.
+
+    Returns:
+        Dictionary with the loss per quantile, the fit and predict times
+        and the peak memory allocated by either stage, or NaN if memory was
+        not measured.
+    """
+    train_data = dataset.rows(train_positions)
+    test_data = dataset.rows(test_positions)
+
+    def fit() -> Any:
+        return fit_model(
+            model_class,
+            train_data,
+            predictors,
+            imputed_variables,
+            quantiles,
+            **(fit_kwargs or {}),
+        )
+
+    start = time.time()
+    model = fit()
+    fit_seconds = time.time() - start
+    start = time.time()
+    imputations = model.predict(test_data, quantiles)
+    predict_seconds = time.time() - start
+
+    peak_memory = np.nan
+    if measure_memory:
+        profiler = MemoryProfiler()
+        with profiler.stage("fit"):
+            traced_model = fit()
+        with profiler.stage("predict"):
+            traced_model.predict(test_data, quantiles)
+        peak_memory = max(
+            record["peak_allocated_mib"] for record in profiler.records
+        )
+
+    test_y = test_data[imputed_variables].to_numpy().flatten()
+    return {
+        "losses": {
+            q: quantile_loss(
+                q, test_y, np.asarray(imputations[q]).flatten()
+            ).mean()
+            for q in quantiles
+        },
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+        "peak_memory_mib": peak_memory,
+    }
+
+
+def loss_plateau(results: pd.DataFrame, tolerance: float = 0.01) -> pd.Series:
+    """Smallest training size whose loss is close to each model's best.
+
+    Args:
+        results: DataFrame returned by learning_curve.
+        tolerance: Relative excess over the best mean loss still counted as
+            converged.
+
+    Returns:
+        Series mapping model names to training sizes.
+    """
+    curve = results.groupby(["model", "n_train"])["loss"].mean()
+    plateau = {}
+    for model_name, losses in curve.groupby(level="model"):
+        losses = losses.droplevel("model")
+        converged = losses[losses <= losses.min() * (1 + tolerance)]
+        plateau[model_name] = int(converged.index.min())
+    return pd.Series(plateau, name="n_train")
+
+
+def learning_curve(
+    model_classes: List[Type],
+    data: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    sizes: Optional[List[int]] = None,
+    n_sizes: int = 6,
+    min_size: int = 100,
+    n_splits: int = 5,
+    group_column: Optional[str] = None,
+    measure_memory: bool = True,
+    n_jobs: Optional[int] = None,
+    random_state: int = RANDOM_STATE,
+) -> pd.DataFrame:
+    """Measure loss and cost of each model as the training set grows.
+
+    Folds are built once. The training rows of each fold are shuffled once,
+    and every training size takes a prefix of them, so the subsamples are
+    nested and a larger size only adds rows. Every (model, size, fold) fit
+    is scored on the same test fold. The fits of each model run in
+    parallel, largest first, with that model's thread budget, and workers
+    read the rows from shared memory.
+
+    Peak memory is the memory allocated by Python and numpy during the fit
+    or predict stage (tracemalloc), so allocations made directly in C, such
+    as tree nodes, are not counted. Tracing slows fits down several times,
+    so it is measured by a separate fit on the first fold only, and is NaN
+    on the other folds.
+
+    Args:
+        model_classes: List of model classes to evaluate (e.g., QRF, OLS,
+            QuantReg, Matching).
+        data: Full dataset to split into training and testing folds.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate.
+        sizes: Training sizes to evaluate. Defaults to a geometric grid of
+            n_sizes sizes from min_size to the size of the smallest
+            training fold.
+        n_sizes: Number of sizes of the default grid.
+        min_size: Smallest size of the default grid.
+        n_splits: Number of cross-validation folds.
+        group_column: Name of a column of group ids, such as the household
+            id of implicate data. Rows of a group are kept in the same fold.
+        measure_memory: Whether to measure peak memory.
+        n_jobs: Number of fits run in parallel. Defaults to the outer jobs
+            of the active execution context, or all cores.
+        random_state: Random seed for reproducibility.
+
+    Returns:
+        Long-form DataFrame with columns 'model', 'n_train', 'fold',
+        'quantile', 'loss', 'fit_seconds', 'predict_seconds' and
+        'peak_memory_mib'.
+
+    Raises:
+        ValueError: If a size exceeds the smallest training fold.
+    """
+    if group_column is not None:
+        folds = household_folds(data, n_splits, random_state, group_column)
+    else:
+        kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+        folds = list(kf.split(data))
+    rng = np.random.default_rng(random_state)
+    folds = [(rng.permutation(train), test) for train, test in folds]
+
+    max_size = min(len(train) for train, _ in folds)
+    if sizes is None:
+        sizes = training_sizes(max_size, n_sizes, min_size)
+    if max(sizes) > max_size:
+        raise ValueError(
+            f"Training sizes cannot exceed the smallest training fold "
+            f"({max_size} rows)"
+        )
+
+    # Largest fits first, so the slowest tasks do not start last
+    tasks = [
+        (model_class, n_train, fold)
+        for model_class in model_classes
+        for n_train in sorted(sizes, reverse=True)
+        for fold in range(len(folds))
+    ]
+    context = get_execution_context()
+
+    # Fits of one model run together, so workers get that model's threads
+    task_results = []
+    with SharedDataset(data[predictors + imputed_variables]) as dataset:
+        for model_class in model_classes:
+            model_tasks = (
+                delayed(_size_losses)(
+                    model_class,
+                    dataset,
+                    folds[fold][0][:n_train],
+                    folds[fold][1],
+                    predictors,
+                    imputed_variables,
+                    quantiles,
+                    context.model_kwargs(model_class) if context else None,
+                    measure_memory and fold == 0,
+                )
+                for task_class, n_train, fold in tasks
+                if task_class is model_class
+            )
+            if context is not None:
+                task_results.extend(
+                    context.run(
+                        model_tasks,
+                        n_jobs=n_jobs,
+                        model_name=model_class.__name__,
+                    )
+                )
+            else:
+                task_results.extend(Parallel(n_jobs=n_jobs or -1)(model_tasks))
+
+    records = []
+    for (model_class, n_train, fold), result in zip(tasks, task_results):
+        for q in quantiles:
+            records.append(
+                (
+                    model_class.__name__,
+                    n_train,
+                    fold,
+                    q,
+                    result["losses"][q],
+                    result["fit_seconds"],
+                    result["predict_seconds"],
+                    result["peak_memory_mib"],
+                )
+            )
+    results = pd.DataFrame(
+        records,
+        columns=[
+            "model",
+            "n_train",
+            "fold",
+            "quantile",
+            "loss",
+            "fit_seconds",
+            "predict_seconds",
+            "peak_memory_mib",
+        ],
+    ).sort_values(["model", "n_train", "fold", "quantile"], ignore_index=True)
+
+    summary = results.groupby(["model", "n_train"])[
+        ["loss", "fit_seconds", "predict_seconds", "peak_memory_mib"]
+    ].mean()
+    print("\nLearning Curve Summary:")
+    print(summary.to_string(float_format=lambda x: f"{x:.6f}"))
+    print("Loss plateau (training rows):")
+    print(loss_plateau(results).to_string())
+
+    return results
@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+from functools import partial
+from joblib import Parallel, delayed
+from scipy.stats import t
+from typing import List, Dict, Any, Optional, Type
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
+from us_imputation_benchmarking.execution import get_execution_context
+
+
+def _prediction_losses(
+    model: Any,
+    data: pd.DataFrame,
+    y: np.ndarray,
+    n_copies: int,
+    quantiles: List[float],
+) -> np.ndarray:
+    """Predict stacked copies of the test data and score each copy.
+
+    Args:
+        model: Fitted model.
+        data: n_copies copies of the test data, stacked.
+        y: True values of one copy, of shape (n_rows, n_variables).
+        n_copies: Number of stacked copies.
+        quantiles: List of quantiles to evaluate.
+
+    Returns:
+        Array of mean losses of shape (n_quantiles, n_copies).
+    """
+    imputations = model.predict(data, quantiles)
+    losses = np.empty((len(quantiles), n_copies))
+    for i, q in enumerate(quantiles):
+        pred = np.asarray(imputations[q]).reshape(n_copies, *y.shape)
+        losses[i] = quantile_loss(q, y, pred).mean(axis=(1, 2))
+    return losses
+
+
+def _repeat_losses(
+    model: Any,
+    test_X: pd.DataFrame,
+    y: np.ndarray,
+    predictors: List[str],
+    quantiles: List[float],
+    batch_size: int,
+    seed: List[int],
+) -> np.ndarray:
+    """Compute the loss with each predictor permuted, for one repeat.
+
+    The permuted copies of the test data are stacked and predicted in
+    batches of batch_size predictors per predict call.
+
+    Args:
+        model: Fitted model.
+        test_X: Test data, with a default index.
+        y: True values of the test data.
+        predictors: Names of the predictors to permute.
+        quantiles: List of quantiles to evaluate.
+        batch_size: Number of permuted copies predicted at once.
+        seed: Seed of this repeat's permutations.
+
+    Returns:
+        Array of mean losses of shape (n_quantiles, n_predictors).
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = len(test_X)
+    losses = np.empty((len(quantiles), len(predictors)))
+
+    for start in range(0, len(predictors), batch_size):
+        batch = predictors[start : start + batch_size]
+        stacked = pd.concat([test_X] * len(batch), ignore_index=True)
+        for j, predictor in enumerate(batch):
+            column = stacked.columns.get_loc(predictor)
+            values = test_X[predictor].to_numpy()
+            stacked.iloc[j * n_rows : (j + 1) * n_rows, column] = values[
+                rng.permutation(n_rows)
+            ]
+        losses[:, start : start + len(batch)] = _prediction_losses(
+            model, stacked, y, len(batch), quantiles
+        )
+    return losses
+
+
+def permutation_importance(
+    model_classes: List[Type],
+    X: pd.DataFrame,
+    test_X: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    n_repeats: int = 5,
+    batch_size: Optional[int] = None,
+    confidence_level: float = 0.95,
+    n_jobs: Optional[int] = None,
+    random_state: int = RANDOM_STATE,
+) -> pd.DataFrame:
+    """Measure how much each predictor matters to each model's imputations.
+
+    A predictor's importance is the increase in quantile loss on the test
+    data when its values are shuffled across rows. Each model is fitted
+    once and the unshuffled test data is predicted once as the baseline.
+    For every repeat, the copies of the test data with one predictor
+    shuffled are stacked and predicted together, and repeats run in
+    parallel. Models that sample their predictions (QRF) add some noise to
+    the differences, which the repeats average out.
+
+    Args:
+        model_classes: List of model classes to evaluate (e.g., QRF, OLS,
+            QuantReg, Matching).
+        X: Training data containing predictors and variables to impute.
+        test_X: Test data to measure the losses on.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate.
+        n_repeats: Number of shuffles per predictor.
+        batch_size: Number of shuffled copies predicted in one call.
+            Defaults to all predictors at once; lower it to bound memory.
+        confidence_level: Level of the t confidence intervals over repeats.
+        n_jobs: Number of repeats run in parallel. Defaults to the outer jobs
+            of the active execution context, or all cores.
+        random_state: Random seed for reproducibility.
+
+    Returns:
+        Long-form DataFrame with columns 'model', 'quantile', 'predictor',
+        'importance', 'std', 'ci_lower' and 'ci_upper'.
+    """
+    test_X = test_X.reset_index(drop=True)
+    y = test_X[imputed_variables].to_numpy()
+    batch_size = batch_size or len(predictors)
+
+    context = get_execution_context()
+
+    critical = t.ppf(0.5 + confidence_level / 2, max(n_repeats - 1, 1))
+    records = []
+
+    for model_class in model_classes:
+        model_name = model_class.__name__
+        model = fit_model(
+            model_class, X, predictors, imputed_variables, quantiles
+        )
+
+        baseline = _prediction_losses(model, test_X, y, 1, quantiles)
+        if context is not None:
+            run_parallel = partial(
+                context.run, n_jobs=n_jobs, model_name=model_name
+            )
+        else:
+            run_parallel = Parallel(n_jobs=n_jobs or -1)
+        repeats = run_parallel(
+            delayed(_repeat_losses)(
+                model,
+                test_X,
+                y,
+                predictors,
+                quantiles,
+                batch_size,
+                [random_state, repeat],
+            )
+            for repeat in range(n_repeats)
+        )
+        # Shape (n_repeats, n_quantiles, n_predictors)
+        increases = np.stack(repeats) - baseline[np.newaxis]
+
+        importance = increases.mean(axis=0)
+        if n_repeats > 1:
+            std = increases.std(axis=0, ddof=1)
+        else:
+            std = np.zeros_like(importance)
+        margin = critical * std / np.sqrt(n_repeats)
+
+        for i, q in enumerate(quantiles):
+            for j, predictor in enumerate(predictors):
+                records.append(
+                    (
+                        model_name,
+                        q,
+                        predictor,
+                        importance[i, j],
+                        std[i, j],
+                        importance[i, j] - margin[i, j],
+                        importance[i, j] + margin[i, j],
+                    )
+                )
+
+    results = pd.DataFrame(
+        records,
+        columns=[
+            "model",
+            "quantile",
+            "predictor",
+            "importance",
+            "std",
+            "ci_lower",
+            "ci_upper",
+        ],
+    )
+
+    summary = results.groupby(["predictor", "model"])["importance"].mean()
+    print("\nPermutation Importance (mean over quantiles):")
+    print(summary.unstack().to_string(float_format=lambda x: f"{x:.6f}"))
+
+    return results
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import sqlite3
+import pandas as pd
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    unit_id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    params TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    fold TEXT NOT NULL,
+    fit_time REAL,
+    predict_time REAL,
+    completed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS losses (
+    unit_id TEXT NOT NULL REFERENCES units (unit_id),
+    split TEXT NOT NULL,
+    quantile REAL NOT NULL,
+    loss REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS losses_unit ON losses (unit_id);
+"""
+
+
+def unit_id(
+    model: str,
+    params: Dict[str, Any],
+    year: int,
+    fold: str,
+    settings: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Build the key identifying one unit of experiment work.
+
+    Args:
+        model: Name of the model class.
+        params: Keyword arguments the model is fitted with.
+        year: SCF year the unit runs on.
+        fold: "holdout" or the cross-validation fold number.
+        settings: Other settings that change the unit's results, such as
+            quantiles, number of folds and random state.
+
+    Returns:
+        Hex digest identifying the unit.
+    """
+    key = json.dumps(
+        [model, params, year, str(fold), settings or {}],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class ResultsStore:
+    """SQLite store of per-unit quantile losses.
+
+    Each completed unit of work (model, parameters, year, fold) is written
+    in a single transaction together with its losses, so a unit is either
+    fully recorded or absent, and an interrupted run can be resumed by
+    skipping the recorded units.
+    """
+
+    def __init__(self, path: str):
+        """Open or create the store.
+
+        Args:
+            path: Path of the SQLite database file.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+
+    def completed_units(self) -> Set[str]:
+        """Return the ids of all recorded units.
+
+        Returns:
+            Set of unit ids.
+        """
+        rows = self.connection.execute("SELECT unit_id FROM units")
+        return {row[0] for row in rows}
+
+    def record(
+        self,
+        unit: str,
+        model: str,
+        params: Dict[str, Any],
+        year: int,
+        fold: str,
+        losses: List[Tuple[str, float, float]],
+        fit_time: float,
+        predict_time: float,
+    ) -> None:
+        """Record a completed unit and its losses.
+
+        Args:
+            unit: Unit id, as returned by unit_id.
+            model: Name of the model class.
+            params: Keyword arguments the model was fitted with.
+            year: SCF year of the unit.
+            fold: "holdout" or the cross-validation fold number.
+            losses: List of (split, quantile, loss) tuples.
+            fit_time: Seconds spent fitting the model.
+            predict_time: Seconds spent predicting.
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    unit,
+                    model,
+                    json.dumps(params, sort_keys=True, default=str),
+                    int(year),
+                    str(fold),
+                    fit_time,
+                    predict_time,
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+            self.connection.execute(
+                "DELETE FROM losses WHERE unit_id = ?", (unit,)
+            )
+            self.connection.executemany(
+                "INSERT INTO losses VALUES (?, ?, ?, ?)",
+                [(unit, split, q, loss) for split, q, loss in losses],
+            )
+
+    def query(
+        self,
+        model: Optional[str] = None,
+        year: Optional[int] = None,
+        fold: Optional[str] = None,
+        split: Optional[str] = None,
+        units: Optional[Set[str]] = None,
+    ) -> pd.DataFrame:
+        """Return recorded losses, optionally filtered.
+
+        Args:
+            model: Only return this model's results.
+            year: Only return this year's results.
+            fold: Only return this fold's results.
+            split: Only return "train" or "test" losses.
+            units: Only return these unit ids.
+
+        Returns:
+            Long-form DataFrame with columns 'model', 'params', 'year',
+            'fold', 'split', 'quantile', 'loss', 'fit_time' and
+            'predict_time'.
+        """
+        conditions = []
+        values: List[Any] = []
+        for column, value in [
+            ("units.model", model),
+            ("units.year", year),
+            ("units.fold", None if fold is None else str(fold)),
+            ("losses.split", split),
+        ]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        if units is not None:
+            unit_ids = sorted(units)
+            placeholders = ", ".join("?" * len(unit_ids))
+            conditions.append(f"units.unit_id IN ({placeholders})")
+            values.extend(unit_ids)
+
+        sql = (
+            "SELECT model, params, year, fold, split, "
+            "quantile, loss, fit_time, predict_time "
+            "FROM losses JOIN units ON losses.unit_id = units.unit_id"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        return pd.read_sql_query(sql, self.connection, params=values)
+
+    def summary(self, **filters: Any) -> pd.DataFrame:
+        """Average losses over folds for each model, year and split.
+
+        Args:
+            **filters: Keyword arguments passed to query.
+
+        Returns:
+            DataFrame indexed by (model, params, year, split), with
+            quantiles as columns and average loss values.
+        """
+        results = self.query(**filters)
+        results = results[results["fold"] != "holdout"]
+        return results.pivot_table(
+            index=["model", "params", "year", "split"],
+            columns="quantile",
+            values="loss",
+            aggfunc="mean",
+        )
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.connection.close()
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -1,16 +1,20 @@
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-from typing import List, Dict, Type, Union, Optional, Tuple
+from typing import List, Dict, Type, Union, Optional, Tuple, TYPE_CHECKING
+from us_imputation_benchmarking.comparisons.report import FigureReport
 from us_imputation_benchmarking.config import PLOT_CONFIG
 
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
 
 def plot_train_test_performance(
     results: pd.DataFrame,
     title: Optional[str] = None,
     save_path: Optional[str] = None,
     figsize: Tuple[int, int] = (PLOT_CONFIG["width"], PLOT_CONFIG["height"]),
-) -> go.Figure:
+    report: Optional[FigureReport] = None,
+) -> "go.Figure":
     """Plot the performance comparison between training and testing sets across quantiles.
 
     Args:
@@ -18,10 +22,14 @@ def plot_train_test_performance(
         title: Custom title for the plot. If None, a default title is used.
         save_path: Path to save the plot. If None, the plot is displayed.
         figsize: Figure size as (width, height) in pixels.
+        report: Report to add the figure to. save_path is then written when
+            the report is exported, instead of immediately.
 
     Returns:
         Plotly figure object
     """
+    import plotly.graph_objects as go
+
     # Convert column names to strings if they are not already
     results.columns = [str(col) for col in results.columns]
     
@@ -71,7 +79,9 @@ def plot_train_test_performance(
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(0,0,0,0.1)')
     
     # Save or show the plot
-    if save_path:
+    if report is not None:
+        report.add(fig, image_path=save_path)
+    elif save_path:
         try:
             fig.write_image(save_path)
             # Also save HTML version for interactive viewing
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.model_selection import train_test_split
+from typing import List, Dict, Any, Optional, Tuple, Type
+from us_imputation_benchmarking.comparisons.data import preprocess_data
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
+from us_imputation_benchmarking.execution import get_execution_context
+from us_imputation_benchmarking.utils.shared_data import SharedDataset
+
+
+def _transfer_losses(
+    model_class: Type,
+    dataset: SharedDataset,
+    train_positions: np.ndarray,
+    test_positions: Dict[int, np.ndarray],
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: List[float],
+    fit_kwargs: Optional[Dict[str, Any]] = None,
+) -> Dict[Tuple[float, int], float]:
+    """Fit a model on one wave and compute its loss on every test wave.
+
+    Args:
+        model_class: Model class to fit.
+        dataset: Shared pooled dataset.
+        train_positions: Row positions of the training part of the
+            training wave.
+        test_positions: Dictionary mapping years to the row positions of
+            the test part of each wave.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate.
+        fit_kwargs: Keyword arguments to pass to the model's fit.
+
+    Returns:
+        Dictionary mapping (quantile, test year) to the average loss.
+    """
+    model = fit_model(
+        model_class,
+        dataset.rows(train_positions),
+        predictors,
+        imputed_variables,
+        quantiles,
+        **(fit_kwargs or {}),
+    )
+
+    losses = {}
+    for test_year, positions in test_positions.items():
+        test_data = dataset.rows(positions)
+        imputations = model.predict(test_data, quantiles)
+        test_y = test_data[imputed_variables].values.flatten()
+        for q in quantiles:
+            pred = np.asarray(imputations[q]).flatten()
+            losses[(q, test_year)] = quantile_loss(q, test_y, pred).mean()
+    return losses
+
+
+def transfer_evaluation(
+    model_classes: List[Type],
+    data: Optional[pd.DataFrame] = None,
+    predictors: Optional[List[str]] = None,
+    imputed_variables: Optional[List[str]] = None,
+    years: Optional[List[int]] = None,
+    quantiles: Optional[List[float]] = QUANTILES,
+    year_column: str = "year",
+    test_size: float = 0.2,
+    n_jobs: Optional[int] = None,
+    random_state: int = RANDOM_STATE,
+) -> Dict[str, Dict[float, pd.DataFrame]]:
+    """Evaluate how models trained on one SCF wave perform on other waves.
+
+    Each wave is split once into train and test parts. Every model is fitted
+    once per training wave, on that wave's train part, and the fit is used
+    to predict the test part of every wave, so the diagonal of the matrix is
+    the usual within-wave holdout loss. Fits run in parallel, and workers
+    read the pooled data from shared memory instead of receiving a copy.
+
+    Args:
+        model_classes: List of model classes to evaluate (e.g., QRF, OLS,
+            QuantReg, Matching).
+        data: Pooled dataset with a year column. If None, it is loaded with
+            preprocess_data(full_data=True, include_year=True).
+        predictors: Names of columns to use as predictors. Required if data
+            is given.
+        imputed_variables: Names of columns to impute. Required if data is
+            given.
+        years: Waves to include. Defaults to all years in data.
+        quantiles: List of quantiles to evaluate.
+        year_column: Name of the column identifying the wave.
+        test_size: Share of each wave held out for testing.
+        n_jobs: Number of fits run in parallel. Defaults to the outer jobs
+            of the active execution context, or all cores.
+        random_state: Random seed for reproducibility.
+
+    Returns:
+        Nested dictionary mapping model names to dictionaries mapping
+        quantiles to DataFrames of average loss, with training years as rows
+        and test years as columns.
+    """
+    if data is None:
+        data, predictors, imputed_variables = preprocess_data(
+            full_data=True, years=years, include_year=True
+        )
+    if years is None:
+        years = sorted(data[year_column].unique())
+
+    train_positions = {}
+    test_positions = {}
+    for year in years:
+        wave = np.flatnonzero(data[year_column].to_numpy() == year)
+        train_positions[year], test_positions[year] = train_test_split(
+            wave,
+            test_size=test_size,
+            train_size=1 - test_size,
+            random_state=random_state,
+        )
+
+    tasks = [
+        (model_class, train_year)
+        for model_class in model_classes
+        for train_year in years
+    ]
+    context = get_execution_context()
+
+    # Fits of one model run together, so workers get that model's threads
+    task_losses = []
+    with SharedDataset(data[predictors + imputed_variables]) as dataset:
+        for model_class in model_classes:
+            model_tasks = (
+                delayed(_transfer_losses)(
+                    model_class,
+                    dataset,
+                    train_positions[train_year],
+                    test_positions,
+                    predictors,
+                    imputed_variables,
+                    quantiles,
+                    context.model_kwargs(model_class) if context else None,
+                )
+                for train_year in years
+            )
+            if context is not None:
+                task_losses.extend(
+                    context.run(
+                        model_tasks,
+                        n_jobs=n_jobs,
+                        model_name=model_class.__name__,
+                    )
+                )
+            else:
+                task_losses.extend(Parallel(n_jobs=n_jobs or -1)(model_tasks))
+
+    results: Dict[str, Dict[float, pd.DataFrame]] = {
+        model_class.__name__: {
+            q: pd.DataFrame(
+                np.nan,
+                index=pd.Index(years, name="train_year"),
+                columns=pd.Index(years, name="test_year"),
+            )
+            for q in quantiles
+        }
+        for model_class in model_classes
+    }
+    for (model_class, train_year), losses in zip(tasks, task_losses):
+        for (q, test_year), loss in losses.items():
+            results[model_class.__name__][q].loc[train_year, test_year] = loss
+
+    print(
+        f"\nTransfer evaluation: {len(tasks)} fits for "
+        f"{len(model_classes)} models over {len(years)} waves"
+    )
+
+    return results
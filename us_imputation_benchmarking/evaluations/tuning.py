@@ -0,0 +1,269 @@
+import json
+import math
+import time
+from functools import partial
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.model_selection import KFold, ParameterSampler
+from typing import List, Dict, Any, Optional, Tuple
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import (
+    DEFAULT_MODEL_PARAMS,
+    QRF_SEARCH_SPACE,
+    QUANTILES,
+    RANDOM_STATE,
+)
+from us_imputation_benchmarking.execution import get_execution_context
+from us_imputation_benchmarking.models.qrf import QRF
+
+
+def _evaluate_candidate(
+    params: Dict[str, Any],
+    folds: List[Tuple[pd.DataFrame, pd.DataFrame]],
+    n_samples: int,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: List[float],
+    deadline: Optional[float],
+    random_state: int,
+    fit_kwargs: Optional[Dict[str, Any]] = None,
+) -> Optional[float]:
+    """Score one parameter set by its average quantile loss over CV folds.
+
+    Args:
+        params: QRF keyword arguments to evaluate.
+        folds: List of (train, test) DataFrames. Train rows are pre-shuffled,
+            so the first n_samples rows form a random subsample.
+        n_samples: Number of training rows to use on each fold.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to evaluate.
+        deadline: Wall-clock time (time.time()) after which no new
+            evaluation is started. None means no limit.
+        random_state: Random seed for the forest.
+        fit_kwargs: Keyword arguments added to every fit, such as n_jobs.
+
+    Returns:
+        Mean quantile loss across folds and quantiles, or None if the
+        deadline passed before the evaluation started.
+    """
+    if deadline is not None and time.time() > deadline:
+        return None
+
+    fold_losses = []
+    for train_data, test_data in folds:
+        model = QRF(seed=random_state)
+        model.fit(
+            train_data.iloc[:n_samples],
+            predictors,
+            imputed_variables,
+            **{**(fit_kwargs or {}), **params},
+        )
+        imputations = model.predict(test_data, quantiles)
+        test_y = test_data[imputed_variables].values.flatten()
+        for q in quantiles:
+            pred = np.asarray(imputations[q]).flatten()
+            fold_losses.append(quantile_loss(q, test_y, pred).mean())
+
+    return float(np.mean(fold_losses))
+
+
+def tune_qrf(
+    data: pd.DataFrame,
+    predictors: List[str],
+    imputed_variables: List[str],
+    quantiles: Optional[List[float]] = QUANTILES,
+    search_space: Optional[Dict[str, List[Any]]] = None,
+    n_candidates: int = 27,
+    eta: int = 3,
+    min_samples: Optional[int] = None,
+    n_splits: int = 3,
+    time_budget: Optional[float] = None,
+    n_jobs: Optional[int] = None,
+    random_state: int = RANDOM_STATE,
+    update_defaults: bool = False,
+    save_path: Optional[str] = None,
+) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """Tune QRF hyperparameters with successive halving on quantile loss.
+
+    Candidates are sampled from the search space and evaluated on growing
+    subsamples of the training folds. After each rung only the best
+    1/eta of the candidates are kept, and the training size is multiplied
+    by eta, until the full folds are used or one candidate remains.
+
+    Args:
+        data: Full dataset to split into training and testing folds.
+        predictors: Names of columns to use as predictors.
+        imputed_variables: Names of columns to impute.
+        quantiles: List of quantiles to average the loss over.
+        search_space: Mapping from QRF parameter names to lists of values.
+            Defaults to QRF_SEARCH_SPACE.
+        n_candidates: Number of parameter sets sampled for the first rung.
+        eta: Halving rate between rungs.
+        min_samples: Training rows per fold in the first rung. Defaults to
+            the size that lets the last rung use the full folds.
+        n_splits: Number of cross-validation folds.
+        time_budget: Wall-clock budget in seconds. Candidates not started
+            before the budget runs out are discarded, and no further rungs
+            are run.
+        n_jobs: Number of candidates evaluated in parallel. Defaults to the
+            outer jobs of the active execution context, or all cores.
+        random_state: Random seed for reproducibility.
+        update_defaults: Whether to write the winning parameters to
+            DEFAULT_MODEL_PARAMS["qrf"], so later QRF fits in this process
+            use them.
+        save_path: Path of a JSON file to save the winning parameters to.
+
+    Returns:
+        A tuple containing:
+          - Dictionary with the winning parameter set
+          - DataFrame with the history of every evaluation
+
+    Raises:
+        RuntimeError: If the budget ran out before any candidate was scored.
+    """
+    if search_space is None:
+        search_space = QRF_SEARCH_SPACE
+
+    context = get_execution_context()
+    if context is not None:
+        fit_kwargs = context.model_kwargs(QRF)
+        run_parallel = partial(context.run, n_jobs=n_jobs, model_name="QRF")
+    else:
+        fit_kwargs = {}
+        run_parallel = Parallel(n_jobs=n_jobs or -1)
+
+    start = time.time()
+    deadline = start + time_budget if time_budget is not None else None
+
+    # Build folds once; shuffling the train rows lets each rung take a
+    # prefix as its subsample
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    folds = []
+    for train_idx, test_idx in kf.split(data):
+        folds.append(
+            (
+                data.iloc[rng.permutation(train_idx)],
+                data.iloc[test_idx],
+            )
+        )
+    max_samples = min(len(train) for train, _ in folds)
+
+    candidates = list(
+        ParameterSampler(
+            search_space, n_iter=n_candidates, random_state=random_state
+        )
+    )
+    n_rungs = max(1, math.floor(math.log(len(candidates), eta)) + 1)
+    if min_samples is None:
+        min_samples = max(max_samples // eta ** (n_rungs - 1), 1)
+
+    history = []
+    survivors = list(range(len(candidates)))
+    n_samples = min_samples
+    best_idx: Optional[int] = None
+    best_loss = np.inf
+
+    for rung in range(n_rungs):
+        if deadline is not None and time.time() > deadline:
+            break
+
+        n_samples = min(n_samples, max_samples)
+        scores = run_parallel(
+            (
+                delayed(_evaluate_candidate)(
+                    candidates[i],
+                    folds,
+                    n_samples,
+                    predictors,
+                    imputed_variables,
+                    quantiles,
+                    deadline,
+                    random_state,
+                    fit_kwargs,
+                )
+                for i in survivors
+            )
+        )
+
+        scored = [
+            (score, i)
+            for score, i in zip(scores, survivors)
+            if score is not None
+        ]
+        for score, i in scored:
+            history.append(
+                {
+                    "rung": rung,
+                    "candidate": i,
+                    "n_samples": n_samples,
+                    "params": candidates[i],
+                    "loss": score,
+                    "elapsed": time.time() - start,
+                }
+            )
+        if not scored:
+            break
+
+        scored.sort(key=lambda pair: pair[0])
+        best_loss, best_idx = scored[0]
+        n_keep = max(1, len(scored) // eta)
+        survivors = [i for _, i in scored[:n_keep]]
+        if len(survivors) == 1 and n_samples >= max_samples:
+            break
+        n_samples *= eta
+
+    if best_idx is None:
+        raise RuntimeError(
+            "Time budget exhausted before any QRF candidate was evaluated"
+        )
+
+    best_params = candidates[best_idx]
+    history_df = pd.DataFrame(history)
+
+    print("\nQRF Tuning Summary:")
+    print(f"Candidates evaluated: {history_df['candidate'].nunique()}")
+    print(f"Rungs completed: {history_df['rung'].nunique()}")
+    print(f"Best loss: {best_loss:.6f}")
+    print(f"Best parameters: {best_params}")
+    print(f"Elapsed time: {time.time() - start:.1f}s")
+
+    if update_defaults:
+        DEFAULT_MODEL_PARAMS["qrf"] = dict(best_params)
+    if save_path is not None:
+        save_model_params(best_params, save_path)
+
+    return best_params, history_df
+
+
+def save_model_params(params: Dict[str, Any], path: str) -> None:
+    """Save a parameter set to a JSON file.
+
+    Args:
+        params: Dictionary of model parameters.
+        path: File path to write the JSON to.
+    """
+    with open(path, "w") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_model_params(
+    path: str, model: Optional[str] = "qrf"
+) -> Dict[str, Any]:
+    """Load a parameter set saved by save_model_params.
+
+    Args:
+        path: File path of the JSON to read.
+        model: Key of DEFAULT_MODEL_PARAMS to update with the loaded
+            parameters. If None, the defaults are left unchanged.
+
+    Returns:
+        Dictionary of model parameters.
+    """
+    with open(path, "r") as f:
+        params = json.load(f)
+    if model is not None:
+        DEFAULT_MODEL_PARAMS[model] = dict(params)
+    return params
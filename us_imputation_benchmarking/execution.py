@@ -0,0 +1,164 @@
+import os
+from contextlib import contextmanager
+from joblib import Parallel, parallel_backend
+from threadpoolctl import threadpool_limits
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Type
+
+# Stack of active execution contexts, innermost last
+_active_contexts: List["ExecutionContext"] = []
+
+
+def get_execution_context() -> Optional["ExecutionContext"]:
+    """Return the innermost active execution context.
+
+    Returns:
+        The active ExecutionContext, or None if none is active.
+    """
+    return _active_contexts[-1] if _active_contexts else None
+
+
+class ExecutionContext:
+    """Core budget shared between outer tasks and inner library threads.
+
+    Forests, BLAS inside statsmodels and the process pools of the package
+    each parallelize on their own, and nesting them oversubscribes the
+    machine. An execution context splits a total core budget into outer
+    jobs (parallel fits, folds or candidates) and inner threads per model
+    type, such that outer jobs times inner threads stays within the budget.
+    While the context is active:
+
+      - fit_model passes the inner thread count to QRF as n_jobs and caps
+        BLAS threads around every fit. If inner_threads lists "Matching",
+        that count is passed to Matching as its number of R workers.
+      - tune_qrf, transfer_evaluation and ShardedHotdeck default to the
+        outer job count, and pools started with run cap the BLAS threads of
+        their workers.
+
+    Example:
+        with ExecutionContext(n_cores=64, outer_jobs=16) as context:
+            context.summary()
+            transfer_evaluation([QRF, OLS])
+    """
+
+    def __init__(
+        self,
+        n_cores: Optional[int] = None,
+        outer_jobs: Optional[int] = None,
+        inner_threads: Optional[Dict[str, int]] = None,
+    ):
+        """Set the core budget and how it is split.
+
+        Args:
+            n_cores: Total number of cores to use. Defaults to all cores.
+            outer_jobs: Number of tasks run in parallel by pools. Defaults to
+                n_cores, i.e. one thread per task.
+            inner_threads: Mapping from model class names (e.g. "QRF",
+                "OLS") to threads per task. Models not listed get
+                n_cores // outer_jobs threads.
+
+        Raises:
+            ValueError: If the budget is not positive or a split exceeds it.
+        """
+        self.n_cores = n_cores or os.cpu_count() or 1
+        self.outer_jobs = outer_jobs or self.n_cores
+        self.inner_threads = dict(inner_threads or {})
+        self.default_threads = max(1, self.n_cores // self.outer_jobs)
+
+        if self.n_cores < 1 or not 1 <= self.outer_jobs <= self.n_cores:
+            raise ValueError(
+                f"Outer jobs must be between 1 and the budget of "
+                f"{self.n_cores} cores"
+            )
+        for model_name, threads in self.inner_threads.items():
+            if threads < 1 or threads * self.outer_jobs > self.n_cores:
+                raise ValueError(
+                    f"{model_name}: {self.outer_jobs} jobs x {threads} "
+                    f"threads exceeds the budget of {self.n_cores} cores"
+                )
+
+    def threads(self, model_name: Optional[str] = None) -> int:
+        """Number of inner threads a task of a model type may use.
+
+        Args:
+            model_name: Name of the model class, or None for the default.
+
+        Returns:
+            Number of threads.
+        """
+        return self.inner_threads.get(model_name, self.default_threads)
+
+    def model_kwargs(self, model_class: Type) -> Dict[str, Any]:
+        """Keyword arguments applying the thread budget to a model's fit.
+
+        Args:
+            model_class: Model class to fit.
+
+        Returns:
+            Fit keyword arguments, e.g. {"n_jobs": 4} for QRF.
+        """
+        if model_class.__name__ == "QRF":
+            return {"n_jobs": self.threads("QRF")}
+        if model_class.__name__ == "Matching" and (
+            "Matching" in self.inner_threads
+        ):
+            return {"n_workers": self.threads("Matching")}
+        return {}
+
+    @contextmanager
+    def limit(self, model_name: Optional[str] = None) -> Iterator[None]:
+        """Cap BLAS and OpenMP threads in this process.
+
+        Args:
+            model_name: Name of the model class whose budget applies.
+        """
+        with threadpool_limits(limits=self.threads(model_name)):
+            yield
+
+    def run(
+        self,
+        tasks: Iterable[Any],
+        n_jobs: Optional[int] = None,
+        model_name: Optional[str] = None,
+    ) -> List[Any]:
+        """Run joblib delayed tasks in a pool sized by the budget.
+
+        Args:
+            tasks: Iterable of joblib.delayed calls.
+            n_jobs: Number of parallel tasks. Defaults to outer_jobs.
+            model_name: Name of the model class whose thread budget caps
+                the BLAS threads of each worker.
+
+        Returns:
+            List of task results, in order.
+        """
+        with parallel_backend(
+            "loky", inner_max_num_threads=self.threads(model_name)
+        ):
+            return Parallel(n_jobs=n_jobs or self.outer_jobs)(tasks)
+
+    def summary(self, model_names: Optional[List[str]] = None) -> None:
+        """Print how the core budget is split.
+
+        Args:
+            model_names: Model class names to report threads for. Defaults
+                to the models with their own thread counts.
+        """
+        if model_names is None:
+            model_names = list(self.inner_threads)
+        print("\nExecution Budget:")
+        print(f"Cores: {self.n_cores}")
+        print(f"Outer jobs: {self.outer_jobs}")
+        print(f"Default threads per job: {self.default_threads}")
+        for model_name in model_names:
+            threads = self.threads(model_name)
+            print(
+                f"{model_name}: {threads} threads per job, "
+                f"{threads * self.outer_jobs} cores in total"
+            )
+
+    def __enter__(self) -> "ExecutionContext":
+        _active_contexts.append(self)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        _active_contexts.remove(self)
@@ -1,6 +1,7 @@
 from .ols import *
 from .quantreg import *
 from .qrf import *
+from .chained import *
 
 # These modules don't exist yet
 # from .gradient_boosting import *
@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from typing import List, Dict, Optional, Any, Type, Union
+
+# Module import, as comparisons.imputations imports the models package
+from us_imputation_benchmarking.comparisons import imputations
+from us_imputation_benchmarking.config import QUANTILES
+from us_imputation_benchmarking.execution import get_execution_context
+from us_imputation_benchmarking.models.qrf import QRF
+
+
+def _fit_chain(
+    model_classes: Dict[str, Type],
+    X: pd.DataFrame,
+    predictors: List[str],
+    chain: List[str],
+    quantiles: List[float],
+    fit_kwargs: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Fit one model per variable of a chain.
+
+    Each variable is fitted on the predictors and the variables before it
+    in the chain.
+
+    Args:
+        model_classes: Mapping from variables to model classes.
+        X: Training data.
+        predictors: Names of the base predictor columns.
+        chain: Variables to impute, in order.
+        quantiles: Quantiles the models must be able to predict.
+        fit_kwargs: Mapping from variables to fit keyword arguments.
+
+    Returns:
+        Dictionary mapping each variable to its fitted model.
+    """
+    models = {}
+    for i, variable in enumerate(chain):
+        models[variable] = imputations.fit_model(
+            model_classes[variable],
+            X,
+            predictors + chain[:i],
+            [variable],
+            quantiles,
+            **fit_kwargs.get(variable, {}),
+        )
+    return models
+
+
+def _predict_chain(
+    models: Dict[str, Any],
+    test_X: pd.DataFrame,
+    predictors: List[str],
+    chain: List[str],
+    quantiles: List[float],
+    chain_quantile: float,
+    batch_size: Optional[int],
+) -> Dict[float, pd.DataFrame]:
+    """Impute the variables of a chain, one recipient batch at a time.
+
+    Args:
+        models: Mapping from variables to fitted models.
+        test_X: Recipient data with the base predictors.
+        predictors: Names of the base predictor columns.
+        chain: Variables to impute, in order.
+        quantiles: List of quantiles to predict.
+        chain_quantile: Quantile whose prediction of a variable is used as
+            a predictor of the later variables.
+        batch_size: Number of recipients passed through the chain at once.
+            If None, all recipients form one batch.
+
+    Returns:
+        Dictionary mapping quantiles to DataFrames of the chain's variables.
+    """
+    batch_size = batch_size or len(test_X)
+    step_quantiles = sorted(set(quantiles) | {chain_quantile})
+    batches = {q: [] for q in quantiles}
+
+    for start in range(0, len(test_X), batch_size):
+        # Design matrix shared by all steps; each step appends its variable
+        design = test_X[predictors].iloc[start : start + batch_size].copy()
+        imputed = {q: {} for q in quantiles}
+        for variable in chain:
+            step = models[variable].predict(design, step_quantiles)
+            for q in quantiles:
+                imputed[q][variable] = np.asarray(step[q]).ravel()
+            design[variable] = np.asarray(step[chain_quantile]).ravel()
+        for q in quantiles:
+            batches[q].append(pd.DataFrame(imputed[q], index=design.index))
+
+    return {q: pd.concat(batches[q]) for q in quantiles}
+
+
+class ChainedImputer:
+    """
+    Chained (sequential) imputation of several variables.
+
+    Each imputed variable is predicted by its own model from the predictors
+    and the variables imputed before it, so the imputed variables stay
+    consistent with each other. Variables can be split into independent
+    chains, which are fitted and predicted in parallel.
+    """
+
+    def __init__(
+        self,
+        model_class: Union[Type, Dict[str, Type]] = QRF,
+        chains: Optional[List[List[str]]] = None,
+        chain_quantile: float = 0.5,
+        batch_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        fit_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        """Initialize the chained imputer.
+
+        Args:
+            model_class: Model class used for every variable (QRF, OLS or
+                QuantReg), or a mapping from variables to model classes.
+            chains: Lists of variables imputed in order, each chain
+                independent of the others. Defaults to a single chain in the
+                order of imputed_variables.
+            chain_quantile: Quantile whose prediction of a variable feeds the
+                later variables of its chain.
+            batch_size: Number of recipients passed through each chain at
+                once, to bound memory on large recipient sets.
+            n_jobs: Number of chains fitted and predicted in parallel.
+                Defaults to the outer jobs of the active execution context,
+                or 1.
+            fit_kwargs: Mapping from variables to keyword arguments for
+                their model's fit.
+        """
+        self.model_class = model_class
+        self.chains = chains
+        self.chain_quantile = chain_quantile
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.fit_kwargs = fit_kwargs or {}
+        self.models: Dict[str, Any] = {}
+        self.predictors: Optional[List[str]] = None
+        self.imputed_variables: Optional[List[str]] = None
+        self._chains: List[List[str]] = []
+
+    def _run(self, tasks: Any) -> List[Any]:
+        """Run one task per chain, in parallel if there are several."""
+        tasks = list(tasks)
+        context = get_execution_context()
+        if len(tasks) == 1:
+            function, args, kwargs = tasks[0]
+            return [function(*args, **kwargs)]
+        if context is not None:
+            return context.run(tasks, n_jobs=self.n_jobs)
+        return Parallel(n_jobs=self.n_jobs or 1)(tasks)
+
+    def fit(
+        self,
+        X: pd.DataFrame,
+        predictors: List[str],
+        imputed_variables: List[str],
+        quantiles: List[float] = QUANTILES,
+    ) -> "ChainedImputer":
+        """Fit one model per imputed variable.
+
+        Args:
+            X: DataFrame containing the training data.
+            predictors: List of column names to use as base predictors.
+            imputed_variables: List of column names to impute.
+            quantiles: Quantiles to fit QuantReg models for.
+
+        Returns:
+            The fitted model instance.
+
+        Raises:
+            ValueError: If the chains do not cover each imputed variable
+                exactly once.
+        """
+        chains = self.chains or [list(imputed_variables)]
+        chained = [variable for chain in chains for variable in chain]
+        if sorted(chained) != sorted(imputed_variables):
+            raise ValueError(
+                "Chains must contain each imputed variable exactly once"
+            )
+
+        self.predictors = predictors
+        self.imputed_variables = imputed_variables
+        self._chains = chains
+        if isinstance(self.model_class, dict):
+            model_classes = self.model_class
+        else:
+            model_classes = {v: self.model_class for v in imputed_variables}
+        fit_quantiles = sorted(set(quantiles) | {self.chain_quantile})
+
+        chain_models = self._run(
+            delayed(_fit_chain)(
+                model_classes,
+                X,
+                predictors,
+                chain,
+                fit_quantiles,
+                self.fit_kwargs,
+            )
+            for chain in chains
+        )
+        self.models = {}
+        for models in chain_models:
+            self.models.update(models)
+        return self
+
+    def predict(
+        self, test_X: pd.DataFrame, quantiles: List[float]
+    ) -> Dict[float, pd.DataFrame]:
+        """Impute every variable at the specified quantiles.
+
+        Args:
+            test_X: DataFrame containing the recipient data.
+            quantiles: List of quantiles to predict.
+
+        Returns:
+            Dictionary mapping quantiles to DataFrames of imputed values,
+            with one column per imputed variable, indexed like test_X.
+        """
+        chain_imputations = self._run(
+            delayed(_predict_chain)(
+                {variable: self.models[variable] for variable in chain},
+                test_X,
+                self.predictors,
+                chain,
+                quantiles,
+                self.chain_quantile,
+                self.batch_size,
+            )
+            for chain in self._chains
+        )
+        return {
+            q: pd.concat(
+                [chain_result[q] for chain_result in chain_imputations],
+                axis=1,
+            )[self.imputed_variables]
+            for q in quantiles
+        }
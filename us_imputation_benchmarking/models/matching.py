@@ -1,4 +1,6 @@
 from us_imputation_benchmarking.utils.statmatch_hotdeck import (
+    ShardedHotdeck,
+    nnd_hotdeck_indices_using_rpy2,
     nnd_hotdeck_using_rpy2,
 )
 import pandas as pd
@@ -17,23 +19,79 @@ class Matching:
 
     This model uses R's StatMatch package through rpy2 to perform nearest neighbor
     distance hot deck matching for imputation.
+
+    In index-only mode, R returns only the matched donor positions and the
+    donation is a NumPy gather from the donor data, which avoids building
+    and converting fused data frames. With more than one worker, recipients
+    are matched in shards by a pool of R worker processes (see
+    ShardedHotdeck), which also donates by index.
+
+    Blocking variables split donors and recipients into classes, and each
+    recipient is only compared with the donors of its class. Variables
+    listed in blocking_bins are cut into quantile bins of the donor data;
+    the others are used as exact values. Donor classes smaller than
+    min_block_size are merged into one pooled class, which also receives the
+    recipients of classes without donors. Blocking implies index-only
+    donation.
+
+    The worker pool of sharded matching is shut down by close, on leaving
+    a with block, or when the model is garbage collected.
     """
-    def __init__(self, matching_hotdeck: Callable = nnd_hotdeck_using_rpy2):
+    def __init__(
+        self,
+        matching_hotdeck: Callable = nnd_hotdeck_using_rpy2,
+        index_only: bool = False,
+        matching_indices: Callable = nnd_hotdeck_indices_using_rpy2,
+        n_workers: int = 1,
+        shard_size: Optional[int] = None,
+        blocking_variables: Optional[List[str]] = None,
+        blocking_bins: Optional[Dict[str, int]] = None,
+        min_block_size: int = 50,
+    ):
         """Initialize the matching model.
 
         Args:
             matching_hotdeck: Function that performs the hot deck matching.
+            index_only: Whether to donate values from the matched donor
+                positions instead of the fused dataset built in R.
+            matching_indices: Function that returns the 0-based donor
+                position matched to each recipient. Used when index_only
+                is True.
+            n_workers: Number of R worker processes to shard recipients
+                over. Values above 1 imply index-only donation.
+            shard_size: Maximum number of recipients per shard. Defaults to
+                an even split over the workers.
+            blocking_variables: Column names whose values define the
+                matching classes (e.g. hhsex, married, race, age).
+            blocking_bins: Mapping from blocking variables to the number of
+                quantile bins to cut them into. Variables not listed are
+                blocked on their exact values.
+            min_block_size: Minimum number of donors in a class. Smaller
+                classes are merged into the pooled class.
         """
         self.matching_hotdeck = matching_hotdeck
+        self.index_only = index_only
+        self.matching_indices = matching_indices
+        self.n_workers = n_workers
+        self.shard_size = shard_size
+        self.sharded_hotdeck: Optional[ShardedHotdeck] = None
+        self.blocking_variables = blocking_variables or []
+        self.blocking_bins = blocking_bins or {}
+        self.min_block_size = min_block_size
+        self.bin_edges: Dict[str, np.ndarray] = {}
+        self.donor_blocks: Dict[Any, np.ndarray] = {}
         self.predictors: Optional[List[str]] = None
         self.imputed_variables: Optional[List[str]] = None
         self.donor_data: Optional[pd.DataFrame] = None
+        self.donor_values: Optional[np.ndarray] = None
 
     def fit(
         self,
         X: pd.DataFrame,
         predictors: List[str],
         imputed_variables: List[str],
+        weight_column: Optional[str] = None,
+        n_workers: Optional[int] = None,
     ) -> "Matching":
         """Fit the matching model by storing the donor data and variable names.
 
@@ -41,15 +99,100 @@ class Matching:
             X: DataFrame containing the donor data.
             predictors: List of column names to use as predictors.
             imputed_variables: List of column names to impute.
+            weight_column: Name of a column of row weights. Accepted so
+                weighted evaluations can include Matching, but ignored:
+                hot-deck donors are chosen by distance only, unweighted.
+            n_workers: Number of R worker processes to shard recipients
+                over, overriding the value given at initialization. Lets
+                fit_model and the evaluations, which build models without
+                arguments, use sharded matching.
 
         Returns:
             The fitted model instance.
         """
-        self.donor_data = X.copy()
+        self.close()
+        if n_workers is not None:
+            self.n_workers = n_workers
+        # A copy of only the columns used for matching and donation is
+        # kept, which is smaller than a copy of all donor columns
+        columns = list(
+            dict.fromkeys(
+                predictors + imputed_variables + self.blocking_variables
+            )
+        )
+        self.donor_data = X[columns]
+        self.donor_values = self.donor_data[imputed_variables].to_numpy()
         self.predictors = predictors
         self.imputed_variables = imputed_variables
+        self._build_donor_blocks()
         return self
 
+    def _build_donor_blocks(self) -> None:
+        """Compute the bin edges and donor positions of each matching class.
+
+        Without blocking variables all donors form a single class.
+        """
+        n_donors = len(self.donor_data)
+        if not self.blocking_variables:
+            self.donor_blocks = {None: np.arange(n_donors)}
+            return
+
+        self.bin_edges = {}
+        for variable, n_bins in self.blocking_bins.items():
+            edges = np.quantile(
+                self.donor_data[variable], np.linspace(0, 1, n_bins + 1)
+            )
+            # Only interior edges are kept, so values outside the donor
+            # range fall into the first or last bin
+            self.bin_edges[variable] = np.unique(edges)[1:-1]
+
+        blocks = self._block_positions(self.donor_data)
+        small = [
+            key
+            for key, rows in blocks.items()
+            if len(rows) < self.min_block_size
+        ]
+        self.donor_blocks = {
+            key: rows for key, rows in blocks.items() if key not in small
+        }
+        if small:
+            pooled = np.sort(np.concatenate([blocks[key] for key in small]))
+        else:
+            pooled = np.array([], dtype=np.intp)
+        if len(pooled) < self.min_block_size:
+            # Too few donors left to form their own class
+            pooled = np.arange(n_donors)
+        self.donor_blocks[None] = pooled
+
+        log.info(
+            f"Built {len(self.donor_blocks) - 1} donor blocks, "
+            f"merging {len(small)} small blocks into a pool of "
+            f"{len(pooled)} donors"
+        )
+
+    def _block_positions(self, data: pd.DataFrame) -> Dict[Any, np.ndarray]:
+        """Group row positions by matching class.
+
+        Args:
+            data: DataFrame containing the blocking variables.
+
+        Returns:
+            Dictionary mapping class keys to row positions.
+        """
+        block_columns = {}
+        for variable in self.blocking_variables:
+            values = data[variable].to_numpy()
+            if variable in self.bin_edges:
+                values = np.searchsorted(
+                    self.bin_edges[variable], values, side="right"
+                )
+            block_columns[variable] = values
+        return (
+            pd.DataFrame(block_columns)
+            .groupby(self.blocking_variables, sort=False, dropna=False)
+            .indices
+        )
+
     def predict(
         self, test_X: pd.DataFrame, quantiles: List[float]
     ) -> Dict[float, pd.DataFrame]:
@@ -62,14 +205,20 @@ class Matching:
         Returns:
             Dictionary mapping quantiles to imputed values.
         """
+        if self.index_only or self.n_workers > 1 or self.blocking_variables:
+            return self._predict_from_indices(test_X, quantiles)
+
         imputations: Dict[float, pd.DataFrame] = {}
-        test_X_copy = test_X.copy()
-        test_X_copy.drop(
-            self.imputed_variables, axis=1, inplace=True, errors="ignore"
-        )
+        # Only the predictors are sent to R as the receiver, rather than
+        # every column but the imputed variables: NND.hotdeck only reads
+        # the matching variables, and only the imputed variables are read
+        # from the fused data
+        receiver = test_X[
+            [p for p in self.predictors if p not in self.imputed_variables]
+        ]
 
         fused0, fused1 = self.matching_hotdeck(
-            receiver=test_X_copy,
+            receiver=receiver,
             donor=self.donor_data,
             matching_variables=self.predictors,
             z_variables=self.imputed_variables,
@@ -82,3 +231,83 @@ class Matching:
             imputations[q] = fused0_pd[self.imputed_variables]
 
         return imputations
+
+    def _predict_from_indices(
+        self, test_X: pd.DataFrame, quantiles: List[float]
+    ) -> Dict[float, pd.DataFrame]:
+        """Predict imputed values by gathering from the matched donor rows.
+
+        Args:
+            test_X: DataFrame containing the recipient data.
+            quantiles: List of quantiles to predict.
+
+        Returns:
+            Dictionary mapping quantiles to imputed values.
+        """
+        if self.blocking_variables:
+            receiver_blocks = self._block_positions(test_X)
+            # Recipients of classes without donors go to the pooled class
+            unmatched = [
+                key for key in receiver_blocks if key not in self.donor_blocks
+            ]
+            if unmatched:
+                pooled = [receiver_blocks.pop(key) for key in unmatched]
+                if None in receiver_blocks:
+                    pooled.append(receiver_blocks[None])
+                receiver_blocks[None] = np.sort(np.concatenate(pooled))
+        else:
+            receiver_blocks = {None: np.arange(len(test_X))}
+
+        if self.n_workers > 1:
+            # The worker pool is started on first use and kept warm until
+            # the model is refitted or closed
+            if self.sharded_hotdeck is None:
+                self.sharded_hotdeck = ShardedHotdeck(
+                    donor=self.donor_data,
+                    matching_variables=self.predictors,
+                    n_workers=self.n_workers,
+                    shard_size=self.shard_size,
+                    donor_groups=self.donor_blocks,
+                )
+            donor_indices = self.sharded_hotdeck.match(
+                test_X, receiver_groups=receiver_blocks
+            )
+        else:
+            donor_indices = np.empty(len(test_X), dtype=np.intp)
+            for key, rows in receiver_blocks.items():
+                donor_rows = self.donor_blocks[key]
+                receiver = test_X
+                if len(rows) < len(test_X):
+                    receiver = test_X.iloc[rows]
+                donor = self.donor_data
+                if len(donor_rows) < len(donor):
+                    donor = donor.iloc[donor_rows]
+                matched = self.matching_indices(
+                    receiver=receiver,
+                    donor=donor,
+                    matching_variables=self.predictors,
+                    donor_classes=None,
+                )
+                donor_indices[rows] = donor_rows[matched]
+        donated = self.donor_values[donor_indices]
+
+        # Matching is not quantile-specific: every quantile shares the
+        # gathered values
+        return {
+            q: pd.DataFrame(
+                donated, columns=self.imputed_variables, index=test_X.index
+            )
+            for q in quantiles
+        }
+
+    def close(self) -> None:
+        """Shut down the R worker processes used for sharded matching."""
+        if self.sharded_hotdeck is not None:
+            self.sharded_hotdeck.close()
+            self.sharded_hotdeck = None
+
+    def __enter__(self) -> "Matching":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
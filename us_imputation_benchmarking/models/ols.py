@@ -23,6 +23,7 @@ class OLS:
         X: pd.DataFrame,
         predictors: List[str],
         imputed_variables: List[str],
+        weight_column: Optional[str] = None,
     ) -> "OLS":
         """Fit the OLS model to the training data.
 
@@ -30,6 +31,8 @@ class OLS:
             X: DataFrame containing the training data.
             predictors: List of column names to use as predictors.
             imputed_variables: List of column names to impute.
+            weight_column: Name of a column of row weights. If given, the
+                model is fitted by weighted least squares.
 
         Returns:
             The fitted model instance.
@@ -40,7 +43,14 @@ class OLS:
         Y = X[imputed_variables]
         X_with_const = sm.add_constant(X[predictors])
 
-        self.model = sm.OLS(Y, X_with_const).fit()
+        if weight_column is None:
+            self.model = sm.OLS(Y, X_with_const).fit()
+        else:
+            # Normalize to mean 1 so the residual scale is a weighted
+            # variance whatever the units of the weights
+            weights = X[weight_column].to_numpy(dtype=float)
+            weights = weights / weights.mean()
+            self.model = sm.WLS(Y, X_with_const, weights=weights).fit()
         return self
 
     def predict(
@@ -57,23 +67,26 @@ class OLS:
         """
         imputations: Dict[float, np.ndarray] = {}
         test_X_with_const = sm.add_constant(test_X[self.predictors])
+        # The mean prediction is shared by every quantile
+        mean_pred = self.model.predict(test_X_with_const)
 
         for q in quantiles:
-            imputation = self._predict_quantile(test_X_with_const, q)
+            imputation = self._predict_quantile(mean_pred, q)
             imputations[q] = imputation
 
         return imputations
 
-    def _predict_quantile(self, X: pd.DataFrame, q: float) -> np.ndarray:
+    def _predict_quantile(
+        self, mean_pred: Union[pd.Series, np.ndarray], q: float
+    ) -> np.ndarray:
         """Predict values at a specified quantile.
 
         Args:
-            X: Feature matrix with constant.
+            mean_pred: Mean prediction of the model.
             q: Quantile to predict.
 
         Returns:
             Array of predicted values at the specified quantile.
         """
-        mean_pred = self.model.predict(X)
         se = np.sqrt(self.model.scale)
         return mean_pred + norm.ppf(q) * se
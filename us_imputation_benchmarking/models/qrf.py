@@ -2,7 +2,10 @@ from us_imputation_benchmarking.utils import qrf
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Optional, Any, Union
-from us_imputation_benchmarking.config import RANDOM_STATE
+from us_imputation_benchmarking.config import (
+    DEFAULT_MODEL_PARAMS,
+    RANDOM_STATE,
+)
 
 
 class QRF:
@@ -27,6 +30,7 @@ class QRF:
         X: pd.DataFrame,
         predictors: List[str],
         imputed_variables: List[str],
+        weight_column: Optional[str] = None,
         **qrf_kwargs: Any,
     ) -> "QRF":
         """Fit the QRF model to the training data.
@@ -35,7 +39,12 @@ class QRF:
             X: DataFrame containing the training data.
             predictors: List of column names to use as predictors.
             imputed_variables: List of column names to impute.
-            **qrf_kwargs: Additional keyword arguments to pass to QRF.
+            weight_column: Name of a column of row weights, such as the
+                multiplicity weights of ImplicateData.to_weighted_rows or
+                survey weights. The leaf quantiles are weighted too.
+            **qrf_kwargs: Additional keyword arguments to pass to QRF, such
+                as the data wave label. These override the parameters in
+                DEFAULT_MODEL_PARAMS["qrf"].
 
         Returns:
             The fitted model instance.
@@ -43,27 +52,65 @@ class QRF:
         self.predictors = predictors
         self.imputed_variables = imputed_variables
 
-        self.qrf.fit(X[predictors], X[imputed_variables], **qrf_kwargs)
+        qrf_kwargs = {**DEFAULT_MODEL_PARAMS["qrf"], **qrf_kwargs}
+        sample_weight = (
+            X[weight_column].to_numpy() if weight_column is not None else None
+        )
+        self.qrf.fit(
+            X[predictors],
+            X[imputed_variables],
+            sample_weight=sample_weight,
+            **qrf_kwargs,
+        )
         return self
 
+    def update(
+        self,
+        X: pd.DataFrame,
+        wave: Any,
+        n_estimators: Optional[int] = None,
+        replace_oldest: bool = False,
+    ) -> Dict[str, Any]:
+        """Add trees grown on a new data wave to the fitted model.
+
+        Args:
+            X: DataFrame containing the new wave's data.
+            wave: Label of the new wave (e.g. SCF year).
+            n_estimators: Number of trees to grow on the new wave. Defaults
+                to the number of trees of the latest wave.
+            replace_oldest: Whether to drop the trees of the oldest wave.
+
+        Returns:
+            Dictionary with the update time and loss before and after, as
+            returned by utils.qrf.QRF.update.
+        """
+        return self.qrf.update(
+            X[self.predictors],
+            X[self.imputed_variables],
+            wave=wave,
+            n_estimators=n_estimators,
+            replace_oldest=replace_oldest,
+        )
+
     def predict(
-        self, test_X: pd.DataFrame, quantiles: List[float]
+        self,
+        test_X: pd.DataFrame,
+        quantiles: List[float],
+        oob_score: bool = False,
     ) -> Dict[float, np.ndarray]:
         """Predict values at specified quantiles using the QRF model.
 
         Args:
             test_X: DataFrame containing the test data.
             quantiles: List of quantiles to predict.
+            oob_score: Whether to predict from out-of-bag trees only. test_X
+                must then be the training data, in training order.
 
         Returns:
             Dictionary mapping quantiles to predicted values.
         """
-        imputations: Dict[float, np.ndarray] = {}
-
-        for q in quantiles:
-            imputation = self.qrf.predict(
-                test_X[self.predictors], mean_quantile=q
-            )
-            imputations[q] = imputation
+        imputations: Dict[float, np.ndarray] = self.qrf.predict_quantiles(
+            test_X[self.predictors], quantiles, oob_score=oob_score
+        )
 
         return imputations
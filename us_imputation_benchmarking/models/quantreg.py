@@ -23,6 +23,7 @@ class QuantReg:
         predictors: List[str],
         imputed_variables: List[str],
         quantiles: List[float],
+        weight_column: Optional[str] = None,
     ) -> "QuantReg":
         """Fit the Quantile Regression model to the training data.
 
@@ -31,6 +32,7 @@ class QuantReg:
             predictors: List of column names to use as predictors.
             imputed_variables: List of column names to impute.
             quantiles: List of quantiles to fit models for.
+            weight_column: Name of a column of row weights.
 
         Returns:
             The fitted model instance.
@@ -41,6 +43,14 @@ class QuantReg:
         Y = X[imputed_variables]
         X_with_const = sm.add_constant(X[predictors])
 
+        if weight_column is not None:
+            # The check loss is positively homogeneous, so scaling a row by
+            # its weight weights its contribution to the loss
+            weights = X[weight_column].to_numpy(dtype=float)
+            weights = weights / weights.mean()
+            Y = Y.mul(weights, axis=0)
+            X_with_const = X_with_const.mul(weights, axis=0)
+
         for q in quantiles:
             self.models[q] = sm.QuantReg(Y, X_with_const).fit(q=q)
 
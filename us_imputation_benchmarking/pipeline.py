@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import time
+import joblib
+import pandas as pd
+from functools import lru_cache, partial
+from joblib import Parallel, delayed
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from us_imputation_benchmarking.execution import get_execution_context
+
+
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    """Hash of the package's source files.
+
+    Returns:
+        Hex digest that changes whenever any module of the package changes.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.endswith(".py"):
+                path = os.path.join(root, file_name)
+                digest.update(os.path.relpath(path, package_dir).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _timed(
+    function: Callable[..., Any], params: Dict[str, Any], *inputs: Any
+) -> Tuple[Any, float]:
+    """Run a stage function and measure its wall-clock time."""
+    start = time.time()
+    result = function(params, *inputs)
+    return result, time.time() - start
+
+
+class Pipeline:
+    """Dependency graph of stages with per-stage result caching.
+
+    Each node is a function called with its own parameters followed by the
+    results of the nodes it depends on. A node's cache key hashes its name,
+    function, parameters and the keys of its inputs, so changing the
+    parameters of a node changes the keys of every node downstream of it,
+    and only those nodes are run again. The key also hashes the package's
+    source (see code_version), so cached results are not reused after the
+    code changes. Results are cached with joblib in cache_dir.
+
+    Nodes run in waves: a node's wave is one more than the latest wave of
+    its inputs, and the nodes of a wave that are not cached run in
+    parallel. Node functions must be picklable, i.e. defined at module
+    level.
+
+    Example:
+        pipeline = Pipeline(".cache")
+        pipeline.add("data", load, {"year": 2019})
+        pipeline.add("model", fit, {"n_estimators": 50}, inputs=["data"])
+        results = pipeline.run(n_jobs=4)
+        pipeline.summary()
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """Initialize an empty pipeline.
+
+        Args:
+            cache_dir: Directory of the result cache. If None, nothing is
+                cached.
+        """
+        self.cache_dir = cache_dir
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.records: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        name: str,
+        function: Callable[..., Any],
+        params: Optional[Dict[str, Any]] = None,
+        inputs: Optional[List[str]] = None,
+    ) -> None:
+        """Add a node to the pipeline.
+
+        Args:
+            name: Unique name of the node.
+            function: Function called as function(params, *input_results).
+            params: JSON-serializable parameters of the node.
+            inputs: Names of the nodes whose results are passed to function,
+                in order. They must already be in the pipeline.
+
+        Raises:
+            ValueError: If the name is taken or an input is unknown.
+        """
+        if name in self.nodes:
+            raise ValueError(f"Node {name} is already in the pipeline")
+        inputs = inputs or []
+        unknown = [node for node in inputs if node not in self.nodes]
+        if unknown:
+            raise ValueError(f"Unknown inputs of node {name}: {unknown}")
+
+        params = params or {}
+        key = json.dumps(
+            [
+                name,
+                f"{function.__module__}.{function.__qualname__}",
+                code_version(),
+                params,
+                [self.nodes[node]["key"] for node in inputs],
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        self.nodes[name] = {
+            "function": function,
+            "params": params,
+            "inputs": inputs,
+            "key": hashlib.sha1(key.encode()).hexdigest(),
+            "wave": max(
+                (self.nodes[node]["wave"] + 1 for node in inputs), default=0
+            ),
+        }
+
+    def _cache_path(self, name: str) -> Optional[str]:
+        """Path of a node's cached result, or None without a cache."""
+        if self.cache_dir is None:
+            return None
+        return os.path.join(
+            self.cache_dir, f"{self.nodes[name]['key']}.joblib"
+        )
+
+    def is_cached(self, name: str) -> bool:
+        """Whether a node's result is in the cache.
+
+        Args:
+            name: Name of the node.
+
+        Returns:
+            True if the node does not need to run.
+        """
+        path = self._cache_path(name)
+        return path is not None and os.path.exists(path)
+
+    def run(
+        self,
+        targets: Optional[List[str]] = None,
+        n_jobs: Optional[int] = None,
+        force: bool = False,
+    ) -> Dict[str, Any]:
+        """Run the nodes that are not cached and return the results.
+
+        Args:
+            targets: Names of the nodes whose results are needed. Defaults
+                to every node.
+            n_jobs: Number of nodes run in parallel within a wave. Defaults
+                to the outer jobs of the active execution context, or all
+                cores.
+            force: Whether to run every needed node even if it is cached.
+
+        Returns:
+            Dictionary mapping the names of the targets to their results.
+        """
+        if targets is None:
+            targets = list(self.nodes)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Walk up from the targets; inputs of cached nodes are not needed
+        to_run = set()
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            if force or not self.is_cached(name):
+                to_run.add(name)
+                stack.extend(self.nodes[name]["inputs"])
+
+        context = get_execution_context()
+        if context is not None:
+            run_parallel = partial(context.run, n_jobs=n_jobs)
+        else:
+            run_parallel = Parallel(n_jobs=n_jobs or -1)
+
+        self.records = []
+        results: Dict[str, Any] = {}
+
+        def result(name: str) -> Any:
+            if name not in results:
+                results[name] = joblib.load(self._cache_path(name))
+            return results[name]
+
+        for name in needed - to_run:
+            self.records.append(
+                {
+                    "node": name,
+                    "wave": self.nodes[name]["wave"],
+                    "status": "cached",
+                    "seconds": 0.0,
+                }
+            )
+
+        waves = sorted({self.nodes[name]["wave"] for name in to_run})
+        for wave in waves:
+            names = sorted(
+                name for name in to_run if self.nodes[name]["wave"] == wave
+            )
+            tasks = [
+                delayed(_timed)(
+                    self.nodes[name]["function"],
+                    self.nodes[name]["params"],
+                    *[result(node) for node in self.nodes[name]["inputs"]],
+                )
+                for name in names
+            ]
+            if len(tasks) == 1:
+                function, args, kwargs = tasks[0]
+                outputs = [function(*args, **kwargs)]
+            else:
+                outputs = run_parallel(tasks)
+
+            for name, (output, seconds) in zip(names, outputs):
+                results[name] = output
+                path = self._cache_path(name)
+                if path is not None:
+                    # Write then rename, so an interrupted run leaves no
+                    # partial result in the cache
+                    joblib.dump(output, path + ".tmp")
+                    os.replace(path + ".tmp", path)
+                self.records.append(
+                    {
+                        "node": name,
+                        "wave": wave,
+                        "status": "run",
+                        "seconds": seconds,
+                    }
+                )
+
+        return {name: result(name) for name in targets}
+
+    def summary(self) -> pd.DataFrame:
+        """Print and return the profile of the last run.
+
+        Returns:
+            DataFrame with one row per needed node and columns 'wave',
+            'status' ("run" or "cached") and 'seconds'.
+        """
+        profile = (
+            pd.DataFrame(self.records)
+            .sort_values(["wave", "node"])
+            .set_index("node")
+        )
+        n_run = int((profile["status"] == "run").sum())
+        print("\nPipeline Profile:")
+        print(profile.to_string(float_format=lambda x: f"{x:.2f}"))
+        print(f"Nodes run: {n_run}")
+        print(f"Nodes cached: {len(profile) - n_run}")
+        print(f"Node seconds: {profile['seconds'].sum():.2f}")
+        return profile
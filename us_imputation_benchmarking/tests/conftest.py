@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+from typing import List, Tuple
+from us_imputation_benchmarking.config import RANDOM_STATE
+
+
+@pytest.fixture
+def synthetic_data() -> Tuple[pd.DataFrame, List[str], List[str]]:
+    """Small standardized dataset shaped like preprocess_data(full_data=True)."""
+    rng = np.random.default_rng(RANDOM_STATE)
+    n = 400
+    predictors = ["age", "income", "kids"]
+    imputed_variables = ["networth"]
+    data = pd.DataFrame(
+        {
+            "age": rng.normal(size=n),
+            "income": rng.lognormal(size=n),
+            "kids": rng.integers(0, 4, size=n).astype(float),
+        }
+    )
+    data["networth"] = (
+        0.5 * data["age"] + data["income"] ** 1.5 + rng.standard_t(3, size=n)
+    )
+    data = (data - data.mean()) / data.std()
+    return data, predictors, imputed_variables
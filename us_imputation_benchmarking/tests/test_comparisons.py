@@ -0,0 +1,410 @@
+import numpy as np
+import pandas as pd
+import pytest
+from us_imputation_benchmarking.comparisons.bootstrap import (
+    bootstrap_loss_comparison,
+    bootstrap_replicates,
+)
+from us_imputation_benchmarking.comparisons.data import weighted_downsample
+from us_imputation_benchmarking.comparisons.distribution_metrics import (
+    WeightedDistribution,
+    compare_distributions,
+)
+from us_imputation_benchmarking.comparisons.implicates import (
+    ImplicateData,
+    household_folds,
+)
+from us_imputation_benchmarking.comparisons.imputations import (
+    fit_model,
+    get_imputations,
+)
+from us_imputation_benchmarking.comparisons.plot import plot_loss_comparison
+from us_imputation_benchmarking.comparisons.quantile_loss import (
+    mean_quantile_loss,
+)
+from us_imputation_benchmarking.comparisons.racing import race_and_impute
+from us_imputation_benchmarking.comparisons.streaming_loss import (
+    LossAccumulator,
+)
+from us_imputation_benchmarking.config import RANDOM_STATE
+from us_imputation_benchmarking.models.ols import OLS
+from us_imputation_benchmarking.models.qrf import QRF
+from us_imputation_benchmarking.models.quantreg import QuantReg
+from us_imputation_benchmarking.utils.memory import MemoryProfiler
+
+
+def _implicate_data(n_households: int = 60, n_implicates: int = 5):
+    """Rows of households with shared predictors and a varying target."""
+    rng = np.random.default_rng(RANDOM_STATE)
+    households = pd.DataFrame(
+        {
+            "household_id": np.arange(n_households),
+            "age": rng.normal(size=n_households),
+            "income": rng.normal(size=n_households),
+        }
+    )
+    data = households.loc[households.index.repeat(n_implicates)]
+    # Half the households have the same target in every implicate
+    noise = rng.normal(size=len(data)) * (data["household_id"] % 2)
+    data = data.assign(networth=data["income"] + noise)
+    return data.reset_index(drop=True)
+
+
+def test_implicate_data():
+    data = _implicate_data()
+    columns = ["age", "income", "networth"]
+    implicates = ImplicateData(data, columns)
+
+    assert implicates.constant_columns == ["age", "income"]
+    assert implicates.varying_columns == ["networth"]
+    assert implicates.implicates.shape == (60, 5, 1)
+    pd.testing.assert_frame_equal(
+        implicates.to_rows(), data[["household_id"] + columns]
+    )
+
+    weighted = implicates.to_weighted_rows()
+    assert len(weighted) == 30 + 30 * 5
+    assert weighted["weight"].sum() == len(data)
+
+    train, test = implicates.split(test_size=0.25)
+    assert train.n_households + test.n_households == 60
+    assert not set(train.households.index) & set(test.households.index)
+
+    for train_idx, test_idx in household_folds(data, n_splits=4):
+        assert not set(data["household_id"].iloc[train_idx]) & set(
+            data["household_id"].iloc[test_idx]
+        )
+
+
+def test_weighted_fits_match_duplicated_rows():
+    data = _implicate_data()
+    weighted = ImplicateData(data, ["age", "income", "networth"])
+    weighted = weighted.to_weighted_rows()
+    predictors = ["age", "income"]
+    quantiles = [0.1, 0.5, 0.9]
+
+    for model_class in [OLS, QuantReg]:
+        full = fit_model(model_class, data, predictors, ["networth"])
+        compact = fit_model(
+            model_class,
+            weighted,
+            predictors,
+            ["networth"],
+            weight_column="weight",
+        )
+        for q in quantiles:
+            np.testing.assert_allclose(
+                full.predict(data, quantiles)[q],
+                compact.predict(data, quantiles)[q],
+                atol=0.05,
+            )
+
+    # QRF grows its trees on the de-duplicated rows, so its conditional
+    # quantiles only match the duplicated fit on average
+    full = fit_model(QRF, data, predictors, ["networth"])
+    compact = fit_model(
+        QRF, weighted, predictors, ["networth"], weight_column="weight"
+    )
+    X = data[predictors]
+    np.testing.assert_allclose(
+        full.qrf._forest_quantiles(X, quantiles, False).mean(axis=0),
+        compact.qrf._forest_quantiles(X, quantiles, False).mean(axis=0),
+        atol=0.05,
+    )
+
+    # Rows that only reach zero-weight training rows have no distribution
+    leaf_weights = compact.qrf.leaf_weights[None]
+    leaf_weights["matrix"] = leaf_weights["matrix"] * 0
+    with pytest.raises(ValueError):
+        compact.predict(data, quantiles)
+
+
+def test_weighted_downsample():
+    rng = np.random.default_rng(RANDOM_STATE)
+    n = 20000
+    data = pd.DataFrame(
+        {"x": rng.normal(size=n), "wgt": rng.lognormal(size=n)}
+    )
+    data["x"] += np.log(data["wgt"])
+
+    sample, summary = weighted_downsample(data, frac=0.05)
+
+    assert summary["n_draws"] == 1000
+    assert summary["variance_penalty"] > 1
+    assert np.isclose(sample["wgt"].sum(), data["wgt"].sum())
+    population_mean = np.average(data["x"], weights=data["wgt"])
+    sample_mean = np.average(sample["x"], weights=sample["wgt"])
+    assert abs(sample_mean - population_mean) < 0.1
+    assert abs(data["x"].mean() - population_mean) > 0.5
+
+
+def test_mean_quantile_loss_weights():
+    y = np.array([[0.0], [1.0], [2.0]])
+    f = np.zeros((3, 1))
+    assert np.isclose(mean_quantile_loss(0.5, y, f), 0.5)
+    assert np.isclose(
+        mean_quantile_loss(0.5, y, f, weights=np.array([1.0, 0.0, 1.0])),
+        0.5,
+    )
+    assert np.isclose(
+        mean_quantile_loss(0.5, y, f, weights=np.array([0.0, 0.0, 1.0])),
+        1.0,
+    )
+
+
+def test_loss_accumulator_chunks_and_merge():
+    rng = np.random.default_rng(RANDOM_STATE)
+    y = pd.DataFrame(rng.normal(size=(100, 2)), columns=["a", "b"])
+    predictions = rng.normal(size=(100, 2))
+    weights = rng.uniform(size=100)
+
+    full = LossAccumulator().update("OLS", "test", 0.5, y, predictions)
+    first = LossAccumulator().update(
+        "OLS", "test", 0.5, y.iloc[:30], predictions[:30]
+    )
+    second = LossAccumulator().update(
+        "OLS", "test", 0.5, y.iloc[30:], predictions[30:]
+    )
+    merged = first.merge(second)
+
+    pd.testing.assert_frame_equal(full.to_frame(), merged.to_frame())
+    assert np.isclose(
+        merged.mean_loss("OLS", "test", 0.5),
+        mean_quantile_loss(0.5, y.values, predictions),
+    )
+
+    weighted = LossAccumulator().update(
+        "OLS", "test", 0.5, y, predictions, weights=weights
+    )
+    assert np.isclose(
+        weighted.mean_loss("OLS", "test", 0.5),
+        mean_quantile_loss(0.5, y.values, predictions, weights),
+    )
+
+
+def test_bootstrap_loss_comparison():
+    rng = np.random.default_rng(RANDOM_STATE)
+    n = 2000
+    test_y = pd.DataFrame({"networth": rng.normal(size=n)})
+    quantiles = [0.1, 0.5, 0.9]
+    method_imputations = {
+        "Good": {q: test_y.to_numpy() * 0.9 for q in quantiles},
+        "Bad": {q: np.zeros((n, 1)) for q in quantiles},
+    }
+
+    intervals, differences = bootstrap_loss_comparison(
+        test_y, method_imputations, quantiles, n_replicates=1000
+    )
+
+    assert len(intervals) == 2 * 3
+    assert (intervals["Lower"] <= intervals["Loss"]).all()
+    assert (intervals["Loss"] <= intervals["Upper"]).all()
+    assert len(differences) == 3
+    assert (differences["Upper"] < 0).all()
+    assert (differences["P(Method better)"] == 1).all()
+
+    fig = plot_loss_comparison(intervals, quantiles)
+    assert fig.data[0].error_y.array is not None
+
+    # All loss columns share each resample, drawn in chunks of replicates
+    losses = rng.exponential(size=(n, 6))
+    replicates = bootstrap_replicates(losses, n_replicates=250, chunk_size=100)
+    assert replicates.shape == (250, 6)
+    np.testing.assert_allclose(
+        replicates.mean(axis=0), losses.mean(axis=0), rtol=0.02
+    )
+    # Chunking only bounds memory; the resamples are the same
+    np.testing.assert_allclose(
+        replicates,
+        bootstrap_replicates(losses, n_replicates=250, chunk_size=250),
+    )
+
+
+def test_compare_distributions():
+    rng = np.random.default_rng(RANDOM_STATE)
+    donor_y = pd.DataFrame({"networth": rng.lognormal(size=5000)})
+    quantiles = [0.5]
+    method_imputations = {
+        "Same": {0.5: rng.lognormal(size=(5000, 1))},
+        "Flat": {0.5: np.full((5000, 1), np.exp(0.5))},
+    }
+
+    results = compare_distributions(donor_y, method_imputations, quantiles)
+    chunked = compare_distributions(
+        donor_y, method_imputations, quantiles, chunk_size=777
+    )
+    pd.testing.assert_frame_equal(results, chunked)
+
+    results = results.set_index("Method")
+    assert results.loc["Same", "Wasserstein"] < 0.1
+    assert results.loc["Flat", "Wasserstein"] > 0.5
+    assert abs(results.loc["Flat", "Gini"]) < 1e-9
+    assert abs(results.loc["Same", "Gini error"]) < 0.05
+
+    # Unweighted and duplicated-row metrics agree
+    values = np.array([1.0, 2.0, 2.0, 5.0])
+    weighted = WeightedDistribution(np.array([1.0, 2.0, 5.0]), [1, 2, 1])
+    plain = WeightedDistribution(values)
+    assert np.isclose(weighted.gini(), plain.gini())
+    assert np.isclose(weighted.top_share(0.25), 0.5)
+    assert np.isclose(plain.wasserstein(weighted), 0)
+
+    fig = plot_loss_comparison(
+        results.reset_index(), quantiles, metric="Wasserstein"
+    )
+    assert fig.layout.yaxis.title.text == "Wasserstein"
+
+
+def test_low_memory_imputations_and_profile():
+    rng = np.random.default_rng(RANDOM_STATE)
+    data = pd.DataFrame(
+        rng.normal(size=(2000, 3)), columns=["age", "income", "networth"]
+    )
+    data["networth"] += data["income"]
+    data32 = pd.DataFrame(
+        np.ascontiguousarray(data.to_numpy(dtype=np.float32)),
+        columns=data.columns,
+    )
+    X, test_X = data32.iloc[:1500], data32.iloc[1500:]
+    quantiles = [0.1, 0.5, 0.9]
+
+    profiler = MemoryProfiler()
+    imputations = get_imputations(
+        [OLS, QRF],
+        X,
+        test_X,
+        ["age", "income"],
+        ["networth"],
+        quantiles,
+        profiler=profiler,
+    )
+    profile = profiler.summary()
+    assert list(profile.index) == [
+        "OLS fit",
+        "OLS predict",
+        "QRF fit",
+        "QRF predict",
+    ]
+    assert (profile["peak_allocated_mib"] >= 0).all()
+
+    # float32 data gives the same OLS imputations as float64
+    reference = get_imputations(
+        [OLS],
+        data.iloc[:1500],
+        data.iloc[1500:],
+        ["age", "income"],
+        ["networth"],
+        quantiles,
+    )
+    for q in quantiles:
+        np.testing.assert_allclose(
+            np.asarray(imputations["OLS"][q]),
+            np.asarray(reference["OLS"][q]),
+            atol=1e-4,
+        )
+
+    # Weights reach the fits
+    weighted = get_imputations(
+        [OLS],
+        data.iloc[:1500].assign(wgt=np.exp(data["networth"].iloc[:1500])),
+        data.iloc[1500:],
+        ["age", "income"],
+        ["networth"],
+        quantiles,
+        weight_column="wgt",
+    )
+    assert not np.allclose(
+        np.asarray(weighted["OLS"][0.5]), np.asarray(reference["OLS"][0.5])
+    )
+
+
+def test_racing_drops_dominated_models():
+    rng = np.random.default_rng(RANDOM_STATE)
+    n = 3000
+    data = pd.DataFrame(
+        {"age": rng.normal(size=n), "income": rng.lognormal(size=n)}
+    )
+    data["networth"] = data["income"] ** 2 + rng.standard_t(2, size=n) * (
+        1 + data["income"]
+    )
+    X, test_X = data.iloc[:2500], data.iloc[2500:]
+
+    imputations, ranking = race_and_impute(
+        [OLS, QuantReg, QRF],
+        X,
+        test_X,
+        ["age", "income"],
+        ["networth"],
+        [0.1, 0.5, 0.9],
+        min_samples=200,
+    )
+
+    finalists = ranking.loc[ranking["status"] == "finalist", "model"]
+    assert set(imputations) == set(finalists)
+    assert "OLS" not in imputations
+    assert ranking["status"].iloc[-1].startswith("dropped")
+    final_fits = ranking.loc[ranking["model"].isin(finalists)]
+    assert final_fits["final_fit_seconds"].notna().all()
+
+    # A spent budget stops the race after the first rung
+    _, ranking = race_and_impute(
+        [OLS, QuantReg],
+        X,
+        test_X,
+        ["age", "income"],
+        ["networth"],
+        [0.5],
+        time_budget=0,
+        min_samples=200,
+    )
+    assert (ranking["rung"] == 0).all()
+
+
+def test_figure_report(tmp_path):
+    import subprocess
+    import sys
+
+    # Importing the plotting modules does not import plotly
+    code = (
+        "import sys\n"
+        "import us_imputation_benchmarking.comparisons.plot\n"
+        "import us_imputation_benchmarking.evaluations.train_test_performance\n"
+        "assert 'plotly' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+    from us_imputation_benchmarking.comparisons.report import FigureReport
+    from us_imputation_benchmarking.evaluations.train_test_performance import (
+        plot_train_test_performance,
+    )
+
+    report = FigureReport("Sweep")
+    loss_df = pd.DataFrame(
+        {
+            "Method": ["OLS", "QRF"],
+            "Percentile": ["50th percentile"] * 2,
+            "Loss": [0.3, 0.2],
+        }
+    )
+    image_path = tmp_path / "loss.png"
+    for year in [2016, 2019]:
+        plot_loss_comparison(
+            loss_df, [0.5], save_path=str(image_path), report=report
+        )
+        plot_train_test_performance(
+            pd.DataFrame({0.5: [0.1, 0.2]}, index=["train", "test"]),
+            title=f"Train vs Test {year}",
+            report=report,
+        )
+    assert len(report) == 4
+    assert not image_path.exists()
+
+    html_path = tmp_path / "report.html"
+    report.export(str(html_path), images=False)
+    content = html_path.read_text()
+    assert content.count("<h2>") == 4
+    assert "Train vs Test 2019" in content
+    # plotly.js is embedded once
+    assert len(content) < 2 * len(
+        report.figures[0][1].to_html(include_plotlyjs=True)
+    )
@@ -0,0 +1,375 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from us_imputation_benchmarking import pipeline as pipeline_module
+from us_imputation_benchmarking.cli import build_pipeline, load_spec, main
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.config import DEFAULT_MODEL_PARAMS, QUANTILES
+from us_imputation_benchmarking.evaluations.cross_validation import (
+    cross_validate_model,
+    cross_validate_models,
+    evaluate_qrf_oob,
+)
+from us_imputation_benchmarking.evaluations.experiment_runner import (
+    run_experiments,
+)
+from us_imputation_benchmarking.evaluations.learning_curve import (
+    learning_curve,
+    loss_plateau,
+    training_sizes,
+)
+from us_imputation_benchmarking.evaluations.permutation_importance import (
+    permutation_importance,
+)
+from us_imputation_benchmarking.evaluations.results_store import ResultsStore
+from us_imputation_benchmarking.evaluations.transfer import (
+    transfer_evaluation,
+)
+from us_imputation_benchmarking.evaluations.tuning import (
+    load_model_params,
+    tune_qrf,
+)
+from us_imputation_benchmarking.execution import (
+    ExecutionContext,
+    get_execution_context,
+)
+from us_imputation_benchmarking.models.ols import OLS
+from us_imputation_benchmarking.models.qrf import QRF
+from us_imputation_benchmarking.models.quantreg import QuantReg
+
+
+def test_tune_qrf(synthetic_data, tmp_path):
+    data, predictors, imputed_variables = synthetic_data
+    search_space = {"n_estimators": [5, 10], "min_samples_leaf": [1, 10]}
+    save_path = tmp_path / "qrf_params.json"
+
+    best_params, history = tune_qrf(
+        data,
+        predictors,
+        imputed_variables,
+        search_space=search_space,
+        n_candidates=4,
+        eta=2,
+        n_jobs=1,
+        save_path=str(save_path),
+    )
+
+    assert set(best_params) == set(search_space)
+    assert history["loss"].notna().all()
+    assert history["n_samples"].is_monotonic_increasing
+    assert DEFAULT_MODEL_PARAMS["qrf"] == {}
+
+    try:
+        assert load_model_params(str(save_path)) == best_params
+        assert DEFAULT_MODEL_PARAMS["qrf"] == best_params
+    finally:
+        DEFAULT_MODEL_PARAMS["qrf"] = {}
+
+
+def test_evaluate_qrf_oob(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+
+    results = evaluate_qrf_oob(
+        data, predictors, imputed_variables, n_estimators=20
+    )
+
+    assert list(results.index) == ["train", "test"]
+    assert list(results.columns) == QUANTILES
+    assert not results.isna().any().any()
+    # Out-of-bag loss behaves like test loss, not in-sample loss
+    assert (results.loc["test"] > results.loc["train"]).all()
+
+
+def test_cross_validate_models(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+    model_classes = [OLS, QuantReg]
+
+    results, predictions = cross_validate_models(
+        model_classes,
+        data,
+        predictors,
+        imputed_variables,
+        n_splits=3,
+        return_predictions=True,
+    )
+
+    assert len(results) == len(model_classes) * 3 * 2 * len(QUANTILES)
+    assert predictions["OLS"].shape == (len(QUANTILES), len(data), 1)
+
+    # Matches the single-model harness on the same folds
+    single = cross_validate_model(
+        OLS, data, predictors, imputed_variables, n_splits=3
+    )
+    multi = (
+        results[results["model"] == "OLS"]
+        .groupby(["split", "quantile"])["loss"]
+        .mean()
+        .unstack()
+    )
+    pd.testing.assert_frame_equal(
+        multi.loc[["train", "test"]], single, check_names=False
+    )
+
+
+def test_run_experiments_resumes(
+    synthetic_data, tmp_path, capsys, monkeypatch
+):
+    data, predictors, imputed_variables = synthetic_data
+    store_path = str(tmp_path / "results.sqlite")
+
+    def load_data(year):
+        return data, predictors, imputed_variables
+
+    closed = []
+    close = ResultsStore.close
+
+    def recording_close(store):
+        closed.append(store)
+        close(store)
+
+    monkeypatch.setattr(ResultsStore, "close", recording_close)
+
+    first = run_experiments(
+        [OLS], store_path, years=[2019], n_splits=2, load_data=load_data
+    )
+    second = run_experiments(
+        [OLS, (QRF, {"n_estimators": 5})],
+        store_path,
+        years=[2019],
+        n_splits=2,
+        load_data=load_data,
+    )
+
+    assert "Units skipped (already in store): 3" in capsys.readouterr().out
+    assert len(closed) == 2
+
+    def failing_load_data(year):
+        raise RuntimeError("missing data")
+
+    with pytest.raises(RuntimeError):
+        run_experiments(
+            [OLS], store_path, years=[2016], load_data=failing_load_data
+        )
+    assert len(closed) == 3
+    assert set(second["model"]) == {"OLS", "QRF"}
+    pd.testing.assert_frame_equal(
+        second[second["model"] == "OLS"].reset_index(drop=True), first
+    )
+    with ResultsStore(store_path) as store:
+        assert len(store.completed_units()) == 6
+        assert store.summary().shape == (4, len(QUANTILES))
+        pd.testing.assert_frame_equal(
+            store.query(units=store.completed_units()), second
+        )
+        assert store.query(units=set()).empty
+
+
+def test_transfer_evaluation(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+    data = data.assign(year=[2016, 2019] * (len(data) // 2))
+
+    results = transfer_evaluation(
+        [OLS, QuantReg],
+        data,
+        predictors,
+        imputed_variables,
+        quantiles=[0.1, 0.5],
+        n_jobs=2,
+    )
+
+    assert set(results) == {"OLS", "QuantReg"}
+    matrix = results["OLS"][0.5]
+    assert list(matrix.index) == [2016, 2019]
+    assert list(matrix.columns) == [2016, 2019]
+    assert not matrix.isna().any().any()
+
+
+def test_cross_validate_model_weights(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+    # Survey-like weights that favour rows with a high target
+    data = data.assign(wgt=np.exp(data["networth"]) + 0.5)
+
+    results = cross_validate_model(
+        OLS,
+        data,
+        predictors,
+        imputed_variables,
+        n_splits=3,
+        weight_column="wgt",
+    )
+    unweighted = cross_validate_model(
+        OLS, data, predictors, imputed_variables, n_splits=3
+    )
+
+    assert list(results.index) == ["train", "test"]
+    assert results.notna().all().all()
+    assert not np.allclose(results.values, unweighted.values)
+
+    # QRF leaf quantiles are weighted too, so with large leaves they shift
+    # towards the heavily weighted rows
+    weighted_qrf = fit_model(
+        QRF,
+        data,
+        predictors,
+        imputed_variables,
+        weight_column="wgt",
+        min_samples_leaf=20,
+    )
+    qrf = fit_model(
+        QRF, data, predictors, imputed_variables, min_samples_leaf=20
+    )
+    weighted_median = weighted_qrf.predict(data, [0.5])[0.5].mean()
+    median = qrf.predict(data, [0.5])[0.5].mean()
+    assert (weighted_median > median + 0.05).all()
+
+
+def test_execution_context(synthetic_data, monkeypatch):
+    data, predictors, imputed_variables = synthetic_data
+
+    with pytest.raises(ValueError):
+        ExecutionContext(n_cores=4, outer_jobs=2, inner_threads={"QRF": 4})
+
+    with ExecutionContext(
+        n_cores=4, outer_jobs=2, inner_threads={"QRF": 2}
+    ) as context:
+        assert get_execution_context() is context
+        assert context.threads("OLS") == 2
+        assert context.model_kwargs(type("Matching", (), {})) == {}
+        model = fit_model(QRF, data, predictors, imputed_variables)
+        assert model.qrf.qrf.n_jobs == 2
+
+        # Record the model whose thread budget each pool gets
+        run = context.run
+        model_names = []
+
+        def recording_run(tasks, n_jobs=None, model_name=None):
+            model_names.append(model_name)
+            return run(tasks, n_jobs=n_jobs, model_name=model_name)
+
+        monkeypatch.setattr(context, "run", recording_run)
+        results = transfer_evaluation(
+            [OLS, QuantReg],
+            data.assign(year=[2016, 2019] * (len(data) // 2)),
+            predictors,
+            imputed_variables,
+            quantiles=[0.5],
+        )
+        assert results["OLS"][0.5].shape == (2, 2)
+        assert model_names == ["OLS", "QuantReg"]
+
+    assert get_execution_context() is None
+
+    # Listing Matching sets its number of R workers
+    context = ExecutionContext(
+        n_cores=4, outer_jobs=2, inner_threads={"Matching": 2}
+    )
+    assert context.model_kwargs(type("Matching", (), {})) == {"n_workers": 2}
+
+
+def test_permutation_importance(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+    train, test = data.iloc[:300], data.iloc[300:]
+
+    results = permutation_importance(
+        [OLS, QRF],
+        train,
+        test,
+        predictors,
+        imputed_variables,
+        quantiles=[0.1, 0.5, 0.9],
+        n_repeats=3,
+        batch_size=2,
+        n_jobs=1,
+    )
+
+    assert len(results) == 2 * 3 * len(predictors)
+    assert (results["ci_lower"] <= results["ci_upper"]).all()
+    # networth is built from income and age, not kids
+    median = results[results["quantile"] == 0.5].set_index(
+        ["model", "predictor"]
+    )["importance"]
+    for model in ["OLS", "QRF"]:
+        assert median[(model, "income")] > median[(model, "kids")]
+
+
+def test_learning_curve(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+
+    assert training_sizes(320, n_sizes=4, min_size=40) == [40, 80, 160, 320]
+
+    results = learning_curve(
+        [OLS, QRF],
+        data,
+        predictors,
+        imputed_variables,
+        quantiles=[0.1, 0.5],
+        n_sizes=3,
+        min_size=40,
+        n_splits=3,
+        n_jobs=2,
+    )
+
+    assert set(results["model"]) == {"OLS", "QRF"}
+    assert sorted(results["n_train"].unique()) == training_sizes(266, 3, 40)
+    assert len(results) == 2 * 3 * 3 * 2
+    assert results["loss"].notna().all()
+    assert (results[["fit_seconds", "predict_seconds"]] > 0).all().all()
+    peak_memory = results.loc[results["fold"] == 0, "peak_memory_mib"]
+    assert (peak_memory >= 0).all()
+    assert set(loss_plateau(results).index) == {"OLS", "QRF"}
+
+    with pytest.raises(ValueError):
+        learning_curve(
+            [OLS], data, predictors, imputed_variables, sizes=[1000]
+        )
+
+
+def test_cli_pipeline_caching(synthetic_data, tmp_path, monkeypatch):
+    data, predictors, imputed_variables = synthetic_data
+    data.to_csv(tmp_path / "data.csv", index=False)
+    spec = {
+        "data": {
+            "path": str(tmp_path / "data.csv"),
+            "predictors": predictors,
+            "imputed_variables": imputed_variables,
+        },
+        "models": {"QRF": {"n_estimators": 10}, "OLS": {}},
+        "quantiles": [0.1, 0.5, 0.9],
+        "n_splits": 2,
+        "output_dir": str(tmp_path / "results"),
+        "report": False,
+    }
+    spec_path = tmp_path / "spec.json"
+    spec_path.write_text(json.dumps(spec))
+    cache_dir = str(tmp_path / "cache")
+
+    status = main([str(spec_path), "--cache-dir", cache_dir, "--n-jobs", "2"])
+    assert status == 0
+    losses = pd.read_csv(tmp_path / "results" / "losses.csv")
+    assert set(losses["Method"]) == {"QRF", "OLS"}
+    assert losses["Loss"].notna().all()
+
+    # Changing one model's parameters only invalidates its nodes and the
+    # loss comparison
+    spec["models"]["QRF"] = {"n_estimators": 20}
+    spec_path.write_text(json.dumps(spec))
+    pipeline, loss_nodes, cv_nodes = build_pipeline(
+        load_spec(str(spec_path)), cache_dir
+    )
+    stale = {name for name in pipeline.nodes if not pipeline.is_cached(name)}
+    assert stale == {"impute/data/QRF", "cv/data/QRF", "loss/data"}
+
+    results = pipeline.run(loss_nodes + cv_nodes, n_jobs=1)
+    profile = pipeline.summary()
+    assert set(profile.index[profile["status"] == "run"]) == stale
+    assert set(results) == set(loss_nodes + cv_nodes)
+
+    # A code change invalidates every node
+    monkeypatch.setattr(pipeline_module, "code_version", lambda: "changed")
+    pipeline, _, _ = build_pipeline(load_spec(str(spec_path)), cache_dir)
+    assert not any(pipeline.is_cached(name) for name in pipeline.nodes)
+
+    spec_path.write_text(json.dumps({"models": {"XGBoost": {}}}))
+    with pytest.raises(ValueError):
+        load_spec(str(spec_path))
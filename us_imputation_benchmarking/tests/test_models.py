@@ -0,0 +1,220 @@
+import gc
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import Parallel, delayed
+from us_imputation_benchmarking.comparisons.imputations import fit_model
+from us_imputation_benchmarking.models.chained import ChainedImputer
+from us_imputation_benchmarking.models.ols import OLS
+from us_imputation_benchmarking.models.qrf import QRF
+from us_imputation_benchmarking.models.quantreg import QuantReg
+from us_imputation_benchmarking.utils import qrf as utils_qrf
+from us_imputation_benchmarking.utils.shared_data import SharedDataset
+
+
+def test_matching_index_only(synthetic_data):
+    pytest.importorskip("rpy2")
+    from us_imputation_benchmarking.models.matching import Matching
+
+    data, predictors, imputed_variables = synthetic_data
+    donors, recipients = data.iloc[:300], data.iloc[300:]
+
+    model = Matching(index_only=True).fit(
+        donors, predictors, imputed_variables
+    )
+    imputations = model.predict(recipients, [0.1, 0.5])
+
+    # NND.hotdeck defaults to Manhattan distance
+    distances = np.abs(
+        recipients[predictors].values[:, None, :]
+        - donors[predictors].values[None, :, :]
+    ).sum(axis=2)
+    expected = donors[imputed_variables].values[distances.argmin(axis=1)]
+
+    assert imputations[0.1].index.equals(recipients.index)
+    np.testing.assert_allclose(imputations[0.5].values, expected)
+
+    # Weights are accepted for weighted evaluations but do not change the
+    # donors
+    weighted = Matching(index_only=True).fit(
+        donors.assign(wgt=np.linspace(1, 5, len(donors))),
+        predictors,
+        imputed_variables,
+        weight_column="wgt",
+    )
+    np.testing.assert_allclose(
+        weighted.predict(recipients, [0.5])[0.5].values, expected
+    )
+
+
+def test_matching_sharded(synthetic_data):
+    pytest.importorskip("rpy2")
+    from us_imputation_benchmarking.models.matching import Matching
+
+    data, predictors, imputed_variables = synthetic_data
+    donors, recipients = data.iloc[:300], data.iloc[300:]
+
+    single = Matching(index_only=True).fit(
+        donors, predictors, imputed_variables
+    )
+    with Matching(n_workers=2, shard_size=30).fit(
+        donors, predictors, imputed_variables
+    ) as sharded:
+        sharded_imputations = sharded.predict(recipients, [0.5])
+        finalizer = sharded.sharded_hotdeck._finalizer
+    assert not finalizer.alive
+
+    np.testing.assert_array_equal(
+        sharded_imputations[0.5].values,
+        single.predict(recipients, [0.5])[0.5].values,
+    )
+
+    # Sharding is reachable through fit_model, and a dropped model shuts
+    # its worker pool down
+    model = fit_model(
+        Matching, donors, predictors, imputed_variables, n_workers=2
+    )
+    np.testing.assert_array_equal(
+        model.predict(recipients, [0.5])[0.5].values,
+        sharded_imputations[0.5].values,
+    )
+    finalizer = model.sharded_hotdeck._finalizer
+    del model
+    gc.collect()
+    assert not finalizer.alive
+
+
+def test_matching_blocking(synthetic_data):
+    pytest.importorskip("rpy2")
+    from us_imputation_benchmarking.models.matching import Matching
+
+    data, predictors, imputed_variables = synthetic_data
+    donors, recipients = data.iloc[:300], data.iloc[300:]
+
+    model = Matching(
+        blocking_variables=["kids", "age"],
+        blocking_bins={"age": 2},
+        min_block_size=10,
+    ).fit(donors, predictors, imputed_variables)
+    imputations = model.predict(recipients, [0.5])
+
+    # Every recipient draws from a donor of its own block
+    age_median = donors["age"].median()
+    for i, (_, recipient) in enumerate(recipients.iterrows()):
+        same_block = (donors["kids"] == recipient["kids"]) & (
+            (donors["age"] > age_median) == (recipient["age"] > age_median)
+        )
+        candidates = donors[same_block]
+        distances = np.abs(
+            candidates[predictors].values - recipient[predictors].values
+        ).sum(axis=1)
+        expected = candidates[imputed_variables].values[distances.argmin()]
+        np.testing.assert_allclose(imputations[0.5].values[i], expected)
+
+
+def test_qrf_update(synthetic_data, tmp_path):
+    data, predictors, imputed_variables = synthetic_data
+    old_wave, new_wave = data.iloc[:200], data.iloc[200:]
+
+    model = QRF().fit(
+        old_wave, predictors, imputed_variables, wave=2016, n_estimators=10
+    )
+    report = model.update(new_wave, wave=2019, n_estimators=5)
+
+    assert report["n_trees"] == 15
+    assert report["loss_after"] < report["loss_before"]
+    assert list(model.qrf.forests) == [2016, 2019]
+
+    report = model.update(data.iloc[:100], wave=2022, replace_oldest=True)
+    assert report["n_trees"] == 10
+    assert list(model.qrf.forests) == [2019, 2022]
+
+    path = str(tmp_path / "qrf.pkl")
+    model.qrf.save(path)
+    loaded = utils_qrf.QRF(file_path=path)
+    pd.testing.assert_frame_equal(
+        loaded.predict(data[predictors]), model.qrf.predict(data[predictors])
+    )
+
+
+def test_qrf_encoding(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+    X = data[predictors].assign(region=["a", "b", "c", "d"] * 100)
+
+    model = utils_qrf.QRF()
+    model.fit(X, data[imputed_variables], n_estimators=5)
+    assert model.dummy_columns == ["region_b", "region_c", "region_d"]
+
+    # Dummies of categories missing from the data are filled with 0
+    one_region = X[X["region"] == "a"]
+    encoded = model._encode(one_region)
+    assert list(encoded.columns) == list(model.encoded_columns)
+    assert (encoded[model.dummy_columns] == 0).all().all()
+
+    # A missing numeric predictor is an error, not zeros
+    with pytest.raises(KeyError):
+        model.predict(one_region.drop(columns="age"))
+
+
+def _shared_column_sum(dataset, column):
+    return float(dataset.frame[column].sum())
+
+
+def test_shared_dataset(synthetic_data, tmp_path):
+    data, predictors, imputed_variables = synthetic_data
+
+    for path in [None, str(tmp_path / "data.mmap")]:
+        with SharedDataset(data, path=path) as dataset:
+            attached = pickle.loads(pickle.dumps(dataset))
+            np.testing.assert_array_equal(attached.array, data.to_numpy())
+            assert np.shares_memory(attached.frame.values, attached.array)
+            attached.close()
+
+            sums = Parallel(n_jobs=2)(
+                delayed(_shared_column_sum)(dataset, column)
+                for column in data.columns
+            )
+            np.testing.assert_allclose(sums, data.sum().to_numpy())
+        if path is not None:
+            assert not os.path.exists(path)
+
+
+def test_chained_imputer(synthetic_data):
+    data, predictors, imputed_variables = synthetic_data
+    rng = np.random.default_rng(0)
+    data = data.assign(
+        debt=0.8 * data["networth"] + 0.1 * rng.normal(size=len(data)),
+        assets=data["age"] + rng.normal(size=len(data)),
+    )
+    variables = ["networth", "debt", "assets"]
+    train, test = data.iloc[:300], data.iloc[300:]
+    quantiles = [0.1, 0.5, 0.9]
+
+    model = ChainedImputer(OLS, chains=[["networth", "debt"], ["assets"]])
+    model.fit(train, predictors, variables)
+    imputations = model.predict(test, quantiles)
+
+    assert list(imputations[0.5].columns) == variables
+    assert imputations[0.5].index.equals(test.index)
+    # debt is predicted from the imputed networth
+    assert list(model.models["debt"].predictors) == predictors + ["networth"]
+    assert (
+        np.corrcoef(imputations[0.5]["networth"], imputations[0.5]["debt"])[
+            0, 1
+        ]
+        > 0.9
+    )
+
+    batched = ChainedImputer(
+        {"networth": QRF, "debt": QuantReg, "assets": OLS},
+        chains=[["networth", "debt"], ["assets"]],
+        batch_size=40,
+        n_jobs=2,
+    )
+    batched.fit(train, predictors, variables, quantiles=quantiles)
+    assert batched.predict(test, quantiles)[0.9].shape == (100, 3)
+
+    with pytest.raises(ValueError):
+        ChainedImputer(chains=[["networth"]]).fit(train, predictors, variables)
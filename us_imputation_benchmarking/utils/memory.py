@@ -0,0 +1,89 @@
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+from typing import List, Dict, Any, Iterator, Optional
+
+
+def current_rss() -> Optional[float]:
+    """Resident set size of this process, in MiB.
+
+    Returns:
+        Current RSS, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * resource.getpagesize() / 2**20
+
+
+def peak_rss() -> float:
+    """Highest resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class MemoryProfiler:
+    """Record the memory used by each stage of a run.
+
+    For every stage the profiler records the peak of memory allocated by
+    Python and numpy during the stage (tracemalloc), the RSS at the end of
+    the stage and the process RSS high-water mark, which only grows. Stages
+    should not be nested.
+
+    Example:
+        profiler = MemoryProfiler()
+        with profiler.stage("preprocess"):
+            data, predictors, imputed_variables = preprocess_data(True)
+        profiler.summary()
+    """
+
+    def __init__(self):
+        """Initialize an empty profile."""
+        self.records: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure the memory used by a block of code.
+
+        Args:
+            name: Name of the stage.
+        """
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start_traced, _ = tracemalloc.get_traced_memory()
+        start = time.time()
+        try:
+            yield
+        finally:
+            _, peak_traced = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self.records.append(
+                {
+                    "stage": name,
+                    "seconds": time.time() - start,
+                    "peak_allocated_mib": (peak_traced - start_traced) / 2**20,
+                    "rss_mib": current_rss(),
+                    "peak_rss_mib": peak_rss(),
+                }
+            )
+
+    def summary(self) -> pd.DataFrame:
+        """Print and return the memory used by each stage.
+
+        Returns:
+            DataFrame with one row per stage and columns 'seconds',
+            'peak_allocated_mib', 'rss_mib' and 'peak_rss_mib'.
+        """
+        results = pd.DataFrame(self.records).set_index("stage")
+        print("\nMemory Profile:")
+        print(results.to_string(float_format=lambda x: f"{x:.1f}"))
+        return results
@@ -2,26 +2,38 @@ from quantile_forest import RandomForestQuantileRegressor
 import pandas as pd
 import numpy as np
 import pickle
+import time
+from scipy import sparse
 from typing import List, Optional, Dict, Any, Union, Tuple
-from us_imputation_benchmarking.config import RANDOM_STATE
+from us_imputation_benchmarking.comparisons.quantile_loss import quantile_loss
+from us_imputation_benchmarking.config import QUANTILES, RANDOM_STATE
 
 
 class QRF:
     categorical_columns: Optional[List[str]] = None
     encoded_columns: Optional[List[str]] = None
+    dummy_columns: Optional[List[str]] = None
     output_columns: Optional[List[str]] = None
 
     def __init__(self, 
                  seed: int = RANDOM_STATE, 
-                 file_path: Optional[str] = None):
+                 file_path: Optional[str] = None,
+                 mixture_resolution: int = 101):
         """Initialize Quantile Random Forest.
 
         Args:
             seed: Random seed for reproducibility.
             file_path: Path to a pickled model file to load.
+            mixture_resolution: Number of quantiles per forest used to
+                combine the forests of several waves after an update.
         """
         self.seed = seed
         self.qrf = None
+        self.mixture_resolution = mixture_resolution
+        # Forest grown on each data wave, oldest first
+        self.forests: Dict[Any, RandomForestQuantileRegressor] = {}
+        # Weighted leaf populations of the forests fitted with weights
+        self.leaf_weights: Dict[Any, Dict[str, Any]] = {}
 
         if file_path is not None:
             with open(file_path, "rb") as f:
@@ -29,33 +41,423 @@ class QRF:
             self.seed = data["seed"]
             self.categorical_columns = data["categorical_columns"]
             self.encoded_columns = data["encoded_columns"]
+            self.dummy_columns = data.get("dummy_columns")
             self.output_columns = data["output_columns"]
             self.qrf = data["qrf"]
+            self.forests = data.get("forests", {})
+            self.leaf_weights = data.get("leaf_weights", {})
 
-    def fit(self, X: pd.DataFrame, y: pd.DataFrame, **qrf_kwargs: Any) -> None:
+    def fit(
+        self,
+        X: pd.DataFrame,
+        y: pd.DataFrame,
+        wave: Any = None,
+        sample_weight: Optional[np.ndarray] = None,
+        **qrf_kwargs: Any,
+    ) -> None:
         """Fit the Quantile Random Forest model.
 
+        Sample weights, such as survey weights or implicate
+        multiplicities, are used both to choose the splits and to compute
+        the quantiles of each leaf, so the quantiles are those of the
+        weighted training distribution. With multiplicity weights, the
+        quantiles are close to those of a fit on the duplicated rows,
+        without growing the trees on every duplicate.
+
         Args:
             X: Feature DataFrame.
             y: Target DataFrame.
+            wave: Label of the data wave (e.g. SCF year), used by update.
+            sample_weight: Weight of each training row, such as survey or
+                multiplicity weights.
             **qrf_kwargs: Additional keyword arguments to pass to RandomForestQuantileRegressor.
+
+        Raises:
+            ValueError: If a sample weight is negative.
         """
         self.categorical_columns = X.select_dtypes(include=["object"]).columns
-        X = pd.get_dummies(
-            X, columns=self.categorical_columns, drop_first=True
-        )
+        numeric_columns = X.columns.difference(self.categorical_columns)
+        if len(self.categorical_columns):
+            X = pd.get_dummies(
+                X, columns=self.categorical_columns, drop_first=True
+            )
         self.encoded_columns = X.columns
+        self.dummy_columns = list(X.columns.difference(numeric_columns))
         self.output_columns = y.columns
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=float)
+            if (sample_weight < 0).any():
+                raise ValueError("Sample weights must be non-negative")
         self.qrf = RandomForestQuantileRegressor(
             random_state=self.seed, **qrf_kwargs
         )
-        self.qrf.fit(X, y)
+        self.qrf.fit(X, y, sample_weight=sample_weight)
+        self.forests = {wave: self.qrf}
+        self.leaf_weights = {}
+        if sample_weight is not None:
+            self.leaf_weights[wave] = self._weighted_leaves(
+                self.qrf, X, y, sample_weight
+            )
+
+    @staticmethod
+    def _weighted_leaves(
+        forest: RandomForestQuantileRegressor,
+        X: pd.DataFrame,
+        y: pd.DataFrame,
+        sample_weight: np.ndarray,
+    ) -> Dict[str, Any]:
+        """Record the weighted training rows of every leaf of a forest.
+
+        quantile-forest uses sample weights for the splits only, and keeps
+        unweighted leaf samples. Here each training row gets, in each tree,
+        its weight divided by the total weight of its leaf and by the number
+        of trees, so the rows reaching a test row's leaves weigh 1 in total.
+
+        Args:
+            forest: Fitted forest.
+            X: Encoded training features.
+            y: Training targets.
+            sample_weight: Weight of each training row.
+
+        Returns:
+            Dictionary with the leaf offsets of each tree, the matrix of
+            row weights per leaf (leaves x rows) and the training targets.
+        """
+        n_rows = len(sample_weight)
+        n_trees = len(forest.estimators_)
+
+        offsets = np.concatenate(
+            [[0], np.cumsum([tree.tree_.node_count for tree in forest])]
+        )
+        leaves = forest.apply(X) + offsets[:-1]
+        leaf_totals = np.bincount(
+            leaves.ravel(),
+            weights=np.repeat(sample_weight, n_trees),
+            minlength=offsets[-1],
+        )
+        totals = leaf_totals[leaves]
+        values = np.divide(
+            sample_weight[:, np.newaxis],
+            totals * n_trees,
+            out=np.zeros(leaves.shape),
+            where=totals > 0,
+        )
+        rows = np.repeat(np.arange(n_rows), n_trees)
+        matrix = sparse.csr_matrix(
+            (values.ravel(), (leaves.ravel(), rows)),
+            shape=(offsets[-1], n_rows),
+        )
+        return {
+            "offsets": offsets[:-1],
+            "matrix": matrix,
+            "y": np.asarray(y, dtype=float).reshape(n_rows, -1),
+        }
+
+    def _weighted_quantiles(
+        self,
+        forest: RandomForestQuantileRegressor,
+        leaf_weights: Dict[str, Any],
+        X: pd.DataFrame,
+        quantiles: List[float],
+        chunk_size: Optional[int] = None,
+    ) -> np.ndarray:
+        """Predict quantiles from the weighted leaf populations.
+
+        Args:
+            forest: Forest fitted with sample weights.
+            leaf_weights: Leaf populations, as built by _weighted_leaves.
+            X: Encoded feature DataFrame.
+            quantiles: Quantiles to predict.
+            chunk_size: Number of rows predicted at a time. Defaults to a
+                size that keeps the dense weights of a chunk near 32 MB.
+
+        Returns:
+            Array of predictions with quantiles on the last axis, shaped
+            like the predictions of RandomForestQuantileRegressor.
+
+        Raises:
+            ValueError: If a row only reaches leaves of zero-weight training
+                rows, so it has no weighted distribution.
+        """
+        y = leaf_weights["y"]
+        n_train, n_outputs = y.shape
+        chunk_size = chunk_size or max(1, 4_000_000 // n_train)
+        leaves = forest.apply(X) + leaf_weights["offsets"]
+        n_rows, n_trees = leaves.shape
+        orders = [np.argsort(y[:, o], kind="stable") for o in range(n_outputs)]
+        # Smallest target with cumulative weight at least q, skipping rows
+        # outside the leaves (zero weight) for q = 0
+        targets = np.maximum(np.asarray(quantiles) - 1e-12, 1e-12)
+
+        pred = np.empty((n_rows, n_outputs, len(quantiles)))
+        for start in range(0, n_rows, chunk_size):
+            chunk = leaves[start : start + chunk_size]
+            n_chunk = len(chunk)
+            indicator = sparse.csr_matrix(
+                (
+                    np.ones(chunk.size),
+                    chunk.ravel(),
+                    np.arange(0, chunk.size + 1, n_trees),
+                ),
+                shape=(n_chunk, leaf_weights["matrix"].shape[0]),
+            )
+            # Weight of every training row for every row of the chunk
+            weights = (indicator @ leaf_weights["matrix"]).toarray()
+            empty = np.flatnonzero(weights.sum(axis=1) <= 0)
+            if len(empty):
+                raise ValueError(
+                    f"{len(empty)} rows, starting with row "
+                    f"{start + empty[0]}, only reach leaves of zero-weight "
+                    f"training rows"
+                )
+            # Rows are shifted apart so one search covers the whole chunk
+            shifts = 2 * np.arange(n_chunk)[:, np.newaxis]
+            for o, order in enumerate(orders):
+                cumulative = np.cumsum(weights[:, order], axis=1)
+                cumulative /= cumulative[:, -1:]
+                positions = (
+                    np.searchsorted(
+                        (cumulative + shifts).ravel(),
+                        targets[np.newaxis, :] + shifts,
+                    )
+                    - n_train * np.arange(n_chunk)[:, np.newaxis]
+                )
+                positions = np.minimum(positions, n_train - 1)
+                pred[start : start + n_chunk, o] = y[order, o][positions]
+
+        return pred[:, 0] if n_outputs == 1 else pred
+
+    def _predict_forest(
+        self,
+        wave: Any,
+        forest: RandomForestQuantileRegressor,
+        X: pd.DataFrame,
+        quantiles: List[float],
+        oob_score: bool = False,
+    ) -> np.ndarray:
+        """Predict quantiles from one forest, weighted if it has weights.
+
+        Raises:
+            ValueError: If out-of-bag predictions are requested from a
+                forest fitted with weights.
+        """
+        if wave not in self.leaf_weights:
+            return forest.predict(X, quantiles=quantiles, oob_score=oob_score)
+        if oob_score:
+            raise ValueError(
+                "Out-of-bag predictions are not available with sample weights"
+            )
+        return self._weighted_quantiles(
+            forest, self.leaf_weights[wave], X, quantiles
+        )
+
+    def update(
+        self,
+        X: pd.DataFrame,
+        y: pd.DataFrame,
+        wave: Any,
+        n_estimators: Optional[int] = None,
+        replace_oldest: bool = False,
+        quantiles: List[float] = QUANTILES,
+    ) -> Dict[str, Any]:
+        """Add trees grown on a new data wave to the fitted model.
+
+        The new trees are grown on the new wave only, with the parameters of
+        the previous fit, and kept as a separate forest whose leaves hold the
+        new wave's data. Predictions mix the conditional distributions of all
+        forests, weighted by their number of trees, which is the distribution
+        a single forest made of all the trees would give. The categorical
+        encoding and output columns of the first fit are kept.
+
+        Args:
+            X: Feature DataFrame of the new wave.
+            y: Target DataFrame of the new wave.
+            wave: Label of the new wave (e.g. SCF year).
+            n_estimators: Number of trees to grow on the new wave. Defaults
+                to the number of trees of the latest wave.
+            replace_oldest: Whether to drop the trees of the oldest wave.
+            quantiles: Quantiles the losses are averaged over.
+
+        Returns:
+            Dictionary with the update time, the number of trees, and the
+            average quantile loss on the new wave before and after the update.
+
+        Raises:
+            ValueError: If the model is not fitted, the wave is already in the
+                model, or the output columns differ from the first fit.
+        """
+        if self.qrf is None:
+            raise ValueError("The model must be fitted before it is updated")
+        if not self.forests:
+            self.forests = {None: self.qrf}
+        if wave in self.forests:
+            raise ValueError(f"Wave {wave} is already in the model")
+        if list(y.columns) != list(self.output_columns):
+            raise ValueError(
+                f"Output columns {list(y.columns)} do not match "
+                f"{list(self.output_columns)}"
+            )
+
+        loss_before = self._mean_loss(X, y, quantiles)
+        start = time.time()
+
+        X_encoded = self._encode(X)
+        params = self.qrf.get_params()
+        params["n_estimators"] = n_estimators or params["n_estimators"]
+        params["random_state"] = self.seed + len(self.forests)
+        forest = RandomForestQuantileRegressor(**params)
+        forest.fit(X_encoded, y)
+
+        self.forests[wave] = forest
+        self.qrf = forest
+        if replace_oldest:
+            oldest = next(iter(self.forests))
+            del self.forests[oldest]
+            self.leaf_weights.pop(oldest, None)
+
+        update_time = time.time() - start
+        loss_after = self._mean_loss(X, y, quantiles)
+
+        return {
+            "wave": wave,
+            "update_time": update_time,
+            "n_new_trees": params["n_estimators"],
+            "n_trees": sum(
+                len(forest.estimators_) for forest in self.forests.values()
+            ),
+            "loss_before": loss_before,
+            "loss_after": loss_after,
+            "loss_delta": loss_after - loss_before,
+        }
+
+    def _encode(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Encode features like the training data.
+
+        Numeric data whose columns already match the training columns is
+        returned as is, without a copy. Dummy columns of categories absent
+        from X are filled with 0.
+
+        Args:
+            X: Feature DataFrame.
+
+        Returns:
+            Feature DataFrame with the encoded training columns.
+
+        Raises:
+            KeyError: If X lacks a numeric training column.
+        """
+        if len(self.categorical_columns):
+            X = pd.get_dummies(
+                X, columns=self.categorical_columns, drop_first=True
+            )
+        if X.columns.equals(self.encoded_columns):
+            return X
+        dummy_columns = self.dummy_columns
+        if dummy_columns is None:
+            # Models saved before dummy columns were recorded
+            dummy_columns = [
+                column
+                for column in self.encoded_columns
+                if any(
+                    str(column).startswith(f"{categorical}_")
+                    for categorical in self.categorical_columns
+                )
+            ]
+        missing = [
+            column
+            for column in self.encoded_columns.difference(X.columns)
+            if column not in dummy_columns
+        ]
+        if missing:
+            raise KeyError(f"Columns {missing} are missing from X")
+        return X.reindex(columns=self.encoded_columns, fill_value=0)
+
+    def _mean_loss(
+        self, X: pd.DataFrame, y: pd.DataFrame, quantiles: List[float]
+    ) -> float:
+        """Average quantile loss of the model's predictions.
+
+        Args:
+            X: Feature DataFrame.
+            y: Target DataFrame.
+            quantiles: Quantiles to average the loss over.
+
+        Returns:
+            Mean loss across rows, outputs and quantiles.
+        """
+        predictions = self.predict_quantiles(X, quantiles)
+        y_flat = y.values.flatten()
+        return float(
+            np.mean(
+                [
+                    quantile_loss(
+                        q, y_flat, predictions[q].values.flatten()
+                    ).mean()
+                    for q in quantiles
+                ]
+            )
+        )
+
+    def _forest_quantiles(
+        self, X: pd.DataFrame, quantiles: List[float], oob_score: bool
+    ) -> np.ndarray:
+        """Predict conditional quantiles from all forests of the model.
+
+        Args:
+            X: Encoded feature DataFrame.
+            quantiles: Quantiles to predict.
+            oob_score: Whether to predict from out-of-bag trees only.
+
+        Returns:
+            Array of predictions with quantiles on the last axis.
+
+        Raises:
+            ValueError: If out-of-bag predictions are requested after an
+                update.
+        """
+        if len(self.forests) <= 1:
+            wave = next(iter(self.forests), None)
+            return self._predict_forest(
+                wave, self.qrf, X, quantiles, oob_score
+            )
+        if oob_score:
+            raise ValueError(
+                "Out-of-bag predictions are not available after an update"
+            )
+
+        # Represent each forest's distribution by a grid of quantiles
+        # weighted by its share of trees, then read off the mixture
+        grid = list(np.linspace(0, 1, self.mixture_resolution))
+        samples = []
+        weights = []
+        for wave, forest in self.forests.items():
+            samples.append(self._predict_forest(wave, forest, X, grid))
+            weights.append(
+                np.full(len(grid), len(forest.estimators_) / len(grid))
+            )
+        samples = np.concatenate(samples, axis=-1)
+        weights = np.concatenate(weights)
+
+        order = np.argsort(samples, axis=-1)
+        samples = np.take_along_axis(samples, order, axis=-1)
+        cumulative = np.cumsum(weights[order], axis=-1)
+        cumulative /= cumulative[..., -1:]
+
+        mixture = []
+        for q in quantiles:
+            position = np.minimum(
+                (cumulative < q).sum(axis=-1, keepdims=True),
+                samples.shape[-1] - 1,
+            )
+            mixture.append(np.take_along_axis(samples, position, axis=-1))
+        return np.concatenate(mixture, axis=-1)
 
     def predict(
         self,
         X: pd.DataFrame,
         count_samples: int = 10,
         mean_quantile: float = 0.5,
+        oob_score: bool = False,
     ) -> pd.DataFrame:
         """Make predictions with the Quantile Random Forest model.
 
@@ -63,28 +465,62 @@ class QRF:
             X: Feature DataFrame.
             count_samples: Number of quantile samples.
             mean_quantile: Target quantile for predictions.
+            oob_score: Whether to predict from out-of-bag trees only. X must
+                then be the training data, in training order.
 
         Returns:
             DataFrame with predictions.
         """
-        X = pd.get_dummies(
-            X, columns=self.categorical_columns, drop_first=True
-        )
-        X = X[self.encoded_columns]
-        pred = self.qrf.predict(
-            X, quantiles=list(np.linspace(0, 1, count_samples))
-        )
-        random_generator = np.random.default_rng(self.seed)
-        a = mean_quantile / (1 - mean_quantile)
-        input_quantiles = (
-            random_generator.beta(a, 1, size=len(X)) * count_samples
+        return self.predict_quantiles(
+            X,
+            [mean_quantile],
+            count_samples=count_samples,
+            oob_score=oob_score,
+        )[mean_quantile]
+
+    def predict_quantiles(
+        self,
+        X: pd.DataFrame,
+        mean_quantiles: List[float],
+        count_samples: int = 10,
+        oob_score: bool = False,
+    ) -> Dict[float, pd.DataFrame]:
+        """Make predictions for several target quantiles from one forest pass.
+
+        The forest quantiles are computed once and then sampled for each
+        target quantile, giving the same values as calling predict once per
+        quantile.
+
+        Args:
+            X: Feature DataFrame.
+            mean_quantiles: Target quantiles for predictions.
+            count_samples: Number of quantile samples.
+            oob_score: Whether to predict from out-of-bag trees only. X must
+                then be the training data, in training order.
+
+        Returns:
+            Dictionary mapping target quantiles to DataFrames with predictions.
+        """
+        X = self._encode(X)
+        pred = self._forest_quantiles(
+            X, list(np.linspace(0, 1, count_samples)), oob_score
         )
-        input_quantiles = input_quantiles.astype(int)
-        if len(pred.shape) == 2:
-            predictions = pred[np.arange(len(pred)), input_quantiles]
-        else:
-            predictions = pred[np.arange(len(pred)), :, input_quantiles]
-        return pd.DataFrame(predictions, columns=self.output_columns)
+        predictions = {}
+        for mean_quantile in mean_quantiles:
+            random_generator = np.random.default_rng(self.seed)
+            a = mean_quantile / (1 - mean_quantile)
+            input_quantiles = (
+                random_generator.beta(a, 1, size=len(X)) * count_samples
+            )
+            input_quantiles = input_quantiles.astype(int)
+            if len(pred.shape) == 2:
+                sampled = pred[np.arange(len(pred)), input_quantiles]
+            else:
+                sampled = pred[np.arange(len(pred)), :, input_quantiles]
+            predictions[mean_quantile] = pd.DataFrame(
+                sampled, columns=self.output_columns
+            )
+        return predictions
 
     def save(self, path: str) -> None:
         """Save the model to disk.
@@ -98,8 +534,11 @@ class QRF:
                     "seed": self.seed,
                     "categorical_columns": self.categorical_columns,
                     "encoded_columns": self.encoded_columns,
+                    "dummy_columns": self.dummy_columns,
                     "output_columns": self.output_columns,
                     "qrf": self.qrf,
+                    "forests": self.forests,
+                    "leaf_weights": self.leaf_weights,
                 },
                 f,
             )
@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Any, Optional, Tuple
+
+_attach_lock = threading.Lock()
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """Attach to a shared memory block without tracking it.
+
+    Before Python 3.13, attaching registers the block with the resource
+    tracker of the process, which unlinks it when a worker with its own
+    tracker exits, while the owner still uses it. Only the owner should
+    track and unlink the block.
+
+    Args:
+        name: Name of the shared memory block.
+
+    Returns:
+        The attached block.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedDataset:
+    """Numeric dataset stored once in shared memory or a memory-mapped file.
+
+    The owning process copies the data in once. Pickling a SharedDataset
+    only sends its handle (name, shape and columns), and unpickling attaches
+    to the same memory, so process-pool workers read the data without copies
+    and memory does not grow with the number of workers. The owner frees the
+    memory with unlink, or by using the dataset as a context manager.
+    """
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        path: Optional[str] = None,
+        name: Optional[str] = None,
+    ):
+        """Copy a DataFrame into shared memory.
+
+        Args:
+            data: Numeric DataFrame to share, such as the output of
+                preprocess_data. Values are stored as float64.
+            path: Path of a memory-mapped file to store the data in instead
+                of shared memory, for datasets larger than /dev/shm.
+            name: Name of the shared memory block. Generated if None.
+
+        Raises:
+            ValueError: If data has non-numeric columns.
+        """
+        non_numeric = data.select_dtypes(exclude="number").columns
+        if len(non_numeric):
+            raise ValueError(
+                f"Only numeric columns can be shared: {list(non_numeric)}"
+            )
+
+        self.columns = list(data.columns)
+        self.shape = data.shape
+        self.path = path
+        self._owner = True
+        self._shm = None
+
+        if path is not None:
+            array = np.memmap(
+                path, dtype=np.float64, mode="w+", shape=self.shape
+            )
+            self.name = path
+        else:
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=max(data.size, 1) * 8
+            )
+            array = np.ndarray(self.shape, np.float64, buffer=self._shm.buf)
+            self.name = self._shm.name
+        array[:] = data.to_numpy(dtype=np.float64)
+        if path is not None:
+            array.flush()
+        self._array: Optional[np.ndarray] = array
+
+    @property
+    def handle(self) -> Dict[str, Any]:
+        """Picklable description used to attach to the dataset."""
+        return {
+            "name": self.name,
+            "path": self.path,
+            "shape": self.shape,
+            "columns": self.columns,
+        }
+
+    @classmethod
+    def attach(cls, handle: Dict[str, Any]) -> "SharedDataset":
+        """Attach to a dataset created in another process.
+
+        Args:
+            handle: Handle of the dataset, as returned by the handle property.
+
+        Returns:
+            SharedDataset reading the same memory, which does not own it.
+        """
+        dataset = cls.__new__(cls)
+        dataset.columns = handle["columns"]
+        dataset.shape = tuple(handle["shape"])
+        dataset.path = handle["path"]
+        dataset.name = handle["name"]
+        dataset._owner = False
+        dataset._shm = None
+
+        if dataset.path is not None:
+            dataset._array = np.memmap(
+                dataset.path, dtype=np.float64, mode="r", shape=dataset.shape
+            )
+        else:
+            dataset._shm = _attach_untracked(dataset.name)
+            dataset._array = np.ndarray(
+                dataset.shape, np.float64, buffer=dataset._shm.buf
+            )
+            dataset._array.flags.writeable = False
+        return dataset
+
+    def __reduce__(self) -> Tuple[Any, Tuple[Dict[str, Any]]]:
+        return SharedDataset.attach, (self.handle,)
+
+    @property
+    def array(self) -> np.ndarray:
+        """Array view of the shared data."""
+        if self._array is None:
+            raise ValueError(f"Dataset {self.name} is closed")
+        return self._array
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """DataFrame view of the shared data, without copying it."""
+        return pd.DataFrame(self.array, columns=self.columns, copy=False)
+
+    def rows(self, positions: np.ndarray) -> pd.DataFrame:
+        """Return a copy of some rows, as a DataFrame.
+
+        Args:
+            positions: Row positions to select.
+
+        Returns:
+            DataFrame of the selected rows, indexed by their positions.
+        """
+        return pd.DataFrame(
+            self.array[positions], index=positions, columns=self.columns
+        )
+
+    def close(self) -> None:
+        """Detach from the shared data in this process."""
+        self._array = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                # Views of the data are still alive; the mapping is released
+                # when they are garbage collected
+                pass
+            self._shm = None
+
+    def unlink(self) -> None:
+        """Close the dataset and free its memory. Only the owner may unlink.
+
+        Raises:
+            ValueError: If the dataset was attached rather than created.
+        """
+        if not self._owner:
+            raise ValueError(
+                "Only the process that created the dataset can free it"
+            )
+        shm = self._shm
+        self.close()
+        if shm is not None:
+            shm.unlink()
+        elif self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self) -> "SharedDataset":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._owner:
+            self.unlink()
+        else:
+            self.close()
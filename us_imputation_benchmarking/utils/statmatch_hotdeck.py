@@ -1,13 +1,18 @@
 import numpy as np
 import pandas as pd
 import logging
+import math
 import os
 import rpy2
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from rpy2.robjects.packages import importr
 from rpy2.robjects import pandas2ri
 import rpy2.robjects as ro
 from rpy2.robjects import numpy2ri
 from typing import List, Dict, Optional, Union, Any, Tuple
+from us_imputation_benchmarking.execution import get_execution_context
 
 # Enable R-Python DataFrame and array conversion
 pandas2ri.activate()
@@ -115,7 +120,7 @@ def nnd_hotdeck_using_rpy2(
         
         # If we have a 1D array with strings, convert to integers
         if mtc_array.dtype.kind in ['U', 'S']:
-            mtc_array = np.array([int(x) for x in mtc_array])
+            mtc_array = mtc_array.astype(int)
         
         # If the mtc.ids array has 2 values per recipient (recipient_idx, donor_idx pairs)
         if len(mtc_array) == 2 * len(receiver):
@@ -167,3 +172,310 @@ def nnd_hotdeck_using_rpy2(
     )
 
     return fused_0, fused_1
+
+
+# Runs NND.hotdeck and maps mtc.ids back to 1-based row positions in R, so
+# only an integer vector crosses the R/Python boundary
+_nnd_donor_positions = ro.r(
+    """
+    function(data.rec, data.don, match.vars, don.class = NULL) {
+        out <- StatMatch::NND.hotdeck(
+            data.rec = data.rec,
+            data.don = data.don,
+            match.vars = match.vars,
+            don.class = don.class
+        )
+        pos <- integer(nrow(data.rec))
+        pos[match(out$mtc.ids[, 1], rownames(data.rec))] <-
+            match(out$mtc.ids[, 2], rownames(data.don))
+        pos
+    }
+    """
+)
+
+
+def nnd_hotdeck_indices_using_rpy2(
+    receiver: Optional[pd.DataFrame] = None,
+    donor: Optional[pd.DataFrame] = None,
+    matching_variables: Optional[List[str]] = None,
+    donor_classes: Optional[Union[str, List[str]]] = None,
+) -> np.ndarray:
+    """Find the nearest neighbor donor of each recipient using R's StatMatch.
+
+    Unlike nnd_hotdeck_using_rpy2, no fused dataset is built: only the
+    matching (and donor class) columns are sent to R, and only the donor
+    positions are returned, so the donation can be done in NumPy.
+
+    Args:
+        receiver: DataFrame containing recipient data.
+        donor: DataFrame containing donor data.
+        matching_variables: List of column names to use for matching.
+        donor_classes: Column name(s) used to define classes in the donor data.
+
+    Returns:
+        Array with the 0-based row position in donor of the donor matched to
+        each recipient, in recipient order.
+
+    Raises:
+        AssertionError: If receiver, donor, or matching_variables are not provided.
+        ValueError: If a recipient is not matched to a donor.
+    """
+    assert (
+        receiver is not None and donor is not None
+    ), "Receiver and donor must be provided"
+    assert (
+        matching_variables is not None
+    ), "Matching variables must be provided"
+
+    if isinstance(donor_classes, str):
+        donor_classes = [donor_classes]
+    class_variables = list(donor_classes) if donor_classes else []
+    for class_variable in class_variables:
+        assert class_variable in receiver, "Donor class not present in receiver"
+        assert class_variable in donor, "Donor class not present in donor"
+
+    # Positional row names let R report matches as row positions
+    columns = list(matching_variables) + class_variables
+    receiver = receiver[columns].reset_index(drop=True)
+    donor = donor[columns].reset_index(drop=True)
+
+    positions = _nnd_donor_positions(
+        receiver,
+        donor,
+        ro.StrVector(matching_variables),
+        ro.StrVector(class_variables) if class_variables else ro.NULL,
+    )
+    positions = np.asarray(positions, dtype=np.intp)
+
+    # R reports 0 for recipients it did not match
+    if (positions == 0).any():
+        raise ValueError(
+            f"{(positions == 0).sum()} recipients were not matched to a donor"
+        )
+    return positions - 1
+
+
+# State of a ShardedHotdeck worker process, set once by its initializer
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_hotdeck_worker(
+    donor: pd.DataFrame,
+    matching_variables: List[str],
+    donor_groups: Dict[Any, np.ndarray],
+) -> None:
+    """Keep the donor data in a worker process for later shards.
+
+    Args:
+        donor: DataFrame with the donor matching variables.
+        matching_variables: List of column names to use for matching.
+        donor_groups: Mapping from donor class to donor row positions.
+    """
+    _worker_state["donor"] = donor
+    _worker_state["matching_variables"] = matching_variables
+    _worker_state["donor_groups"] = donor_groups
+    _worker_state["r_donors"] = {}
+
+
+def _match_hotdeck_shard(
+    receiver: pd.DataFrame, donor_class: Any
+) -> np.ndarray:
+    """Match a block of recipients against the donors of one class.
+
+    The donor block is converted to R on first use and cached, so later
+    shards of the same class only convert the recipients.
+
+    Args:
+        receiver: DataFrame with the recipient matching variables.
+        donor_class: Key of the donor class to match against, or None to
+            match against all donors.
+
+    Returns:
+        Array with the 0-based position in the full donor data of the donor
+        matched to each recipient.
+
+    Raises:
+        ValueError: If a recipient is not matched to a donor.
+    """
+    r_donors = _worker_state["r_donors"]
+    matching_variables = _worker_state["matching_variables"]
+
+    if donor_class not in r_donors:
+        positions = _worker_state["donor_groups"][donor_class]
+        donor = _worker_state["donor"].iloc[positions]
+        r_donors[donor_class] = (
+            pandas2ri.py2rpy(donor.reset_index(drop=True)),
+            positions,
+        )
+    r_donor, positions = r_donors[donor_class]
+
+    local_positions = np.asarray(
+        _nnd_donor_positions(
+            receiver.reset_index(drop=True),
+            r_donor,
+            ro.StrVector(matching_variables),
+            ro.NULL,
+        ),
+        dtype=np.intp,
+    )
+    # R reports 0 for recipients it did not match
+    if (local_positions == 0).any():
+        raise ValueError(
+            f"{(local_positions == 0).sum()} recipients of donor class "
+            f"{donor_class} were not matched to a donor"
+        )
+    return positions[local_positions - 1]
+
+
+class ShardedHotdeck:
+    """Nearest neighbor hot deck matching spread over R worker processes.
+
+    Recipients are split into shards (within each donor class, when donor
+    classes are given), and each shard is matched by NND.hotdeck in one of
+    a pool of worker processes, each running its own R session. Workers
+    receive the donor data once and cache its R conversion, so the pool can
+    be reused across calls to match. Each recipient is still matched against
+    exactly the donors StatMatch would use, so results equal those of a
+    single NND.hotdeck call, except where StatMatch breaks distance ties at
+    random.
+
+    The pool is shut down by close, on leaving a with block, or when the
+    object is garbage collected or the interpreter exits.
+    """
+
+    def __init__(
+        self,
+        donor: pd.DataFrame,
+        matching_variables: List[str],
+        donor_classes: Optional[Union[str, List[str]]] = None,
+        n_workers: Optional[int] = None,
+        shard_size: Optional[int] = None,
+        donor_groups: Optional[Dict[Any, np.ndarray]] = None,
+    ):
+        """Start the worker pool.
+
+        Args:
+            donor: DataFrame containing donor data.
+            matching_variables: List of column names to use for matching.
+            donor_classes: Column name(s) used to define classes in the donor
+                data. Recipients are only matched to donors of their class.
+            n_workers: Number of R worker processes. Defaults to the outer
+                jobs of the active execution context, or the number of CPUs.
+            shard_size: Maximum number of recipients per shard. Defaults to
+                an even split of the recipients over the workers.
+            donor_groups: Precomputed mapping from class keys to donor row
+                positions, used instead of donor_classes. Groups may overlap.
+        """
+        if isinstance(donor_classes, str):
+            donor_classes = [donor_classes]
+        self.matching_variables = list(matching_variables)
+        self.donor_classes = list(donor_classes) if donor_classes else []
+        context = get_execution_context()
+        if context is not None:
+            n_workers = n_workers or context.outer_jobs
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+
+        donor = donor[self.matching_variables + self.donor_classes]
+        donor = donor.reset_index(drop=True)
+        if donor_groups is None:
+            donor_groups = self._group_positions(donor)
+        self.donor_groups = donor_groups
+
+        # Workers are spawned rather than forked, so each one starts its
+        # own embedded R instead of sharing the parent's
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_hotdeck_worker,
+            initargs=(
+                donor[self.matching_variables],
+                self.matching_variables,
+                self.donor_groups,
+            ),
+        )
+        # The finalizer holds the executor, not self, so it does not keep
+        # a dropped instance alive
+        self._finalizer = weakref.finalize(
+            self, self._executor.shutdown, wait=False, cancel_futures=True
+        )
+
+    def _group_positions(self, data: pd.DataFrame) -> Dict[Any, np.ndarray]:
+        """Map each donor class to the row positions belonging to it.
+
+        Args:
+            data: DataFrame with the donor class columns.
+
+        Returns:
+            Dictionary mapping class keys to row positions, with a single
+            None key when no donor classes are used.
+        """
+        if not self.donor_classes:
+            return {None: np.arange(len(data))}
+        return data.groupby(
+            self.donor_classes, sort=False, dropna=False
+        ).indices
+
+    def match(
+        self,
+        receiver: pd.DataFrame,
+        receiver_groups: Optional[Dict[Any, np.ndarray]] = None,
+    ) -> np.ndarray:
+        """Find the nearest neighbor donor of each recipient.
+
+        Args:
+            receiver: DataFrame containing recipient data.
+            receiver_groups: Precomputed mapping from class keys to recipient
+                row positions, used instead of the donor class columns.
+
+        Returns:
+            Array with the 0-based row position in donor of the donor matched
+            to each recipient, in recipient order.
+
+        Raises:
+            ValueError: If a recipient class has no donors, or a recipient
+                is not matched to a donor.
+        """
+        receiver = receiver[self.matching_variables + self.donor_classes]
+        receiver = receiver.reset_index(drop=True)
+        if receiver_groups is None:
+            receiver_groups = self._group_positions(receiver)
+
+        missing = set(receiver_groups) - set(self.donor_groups)
+        if missing:
+            raise ValueError(f"No donors available for classes {missing}")
+
+        shard_size = self.shard_size or max(
+            math.ceil(len(receiver) / self.n_workers), 1
+        )
+        shards = []
+        for donor_class, positions in receiver_groups.items():
+            for start in range(0, len(positions), shard_size):
+                shard = positions[start : start + shard_size]
+                shards.append((donor_class, shard))
+
+        futures = [
+            self._executor.submit(
+                _match_hotdeck_shard,
+                receiver.iloc[positions][self.matching_variables],
+                donor_class,
+            )
+            for donor_class, positions in shards
+        ]
+
+        # Merge shard results back into recipient order
+        donor_positions = np.empty(len(receiver), dtype=np.intp)
+        for (_, positions), future in zip(shards, futures):
+            donor_positions[positions] = future.result()
+        return donor_positions
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self._finalizer.detach()
+        self._executor.shutdown()
+
+    def __enter__(self) -> "ShardedHotdeck":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()